@@ -0,0 +1,29 @@
+"""Add FULLTEXT index on books title and description
+
+Revision ID: 3f9d2c7b1e54
+Revises: a8c42403377f
+Create Date: 2026-10-18 10:12:40.118304
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9d2c7b1e54'
+down_revision: Union[str, None] = 'a8c42403377f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # FULLTEXT is MySQL only; other backends search with the in-process index
+    if op.get_bind().dialect.name == 'mysql':
+        op.create_index('ix_books_title_description_fulltext', 'books', ['title', 'description'], unique=False, mysql_prefix='FULLTEXT')
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'mysql':
+        op.drop_index('ix_books_title_description_fulltext', table_name='books')
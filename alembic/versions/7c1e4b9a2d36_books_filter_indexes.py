@@ -0,0 +1,31 @@
+"""Add composite indexes for filtered book queries
+
+Revision ID: 7c1e4b9a2d36
+Revises: 3f9d2c7b1e54
+Create Date: 2026-10-18 11:02:17.554120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1e4b9a2d36'
+down_revision: Union[str, None] = '3f9d2c7b1e54'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_books_author_id_publish_date', 'books', ['author_id', 'publish_date'], unique=False)
+    op.create_index('ix_books_publish_date_id', 'books', ['publish_date', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_books_publish_date_id', table_name='books')
+    # MySQL needs an index on the foreign key column; recreate the one implied by the constraint first
+    if op.get_bind().dialect.name == 'mysql':
+        op.create_index('author_id', 'books', ['author_id'], unique=False)
+    op.drop_index('ix_books_author_id_publish_date', table_name='books')
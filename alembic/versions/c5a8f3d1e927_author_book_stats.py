@@ -0,0 +1,37 @@
+"""Add denormalized book stats to authors
+
+Revision ID: c5a8f3d1e927
+Revises: 7c1e4b9a2d36
+Create Date: 2026-10-18 11:48:05.207631
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5a8f3d1e927'
+down_revision: Union[str, None] = '7c1e4b9a2d36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('authors', sa.Column('book_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('authors', sa.Column('first_publish_date', sa.Date(), nullable=True))
+    op.add_column('authors', sa.Column('last_publish_date', sa.Date(), nullable=True))
+    # Backfill from existing books; from here on crud.refresh_author_stats keeps them current
+    op.execute(
+        "UPDATE authors SET "
+        "book_count = (SELECT COUNT(*) FROM books WHERE books.author_id = authors.id), "
+        "first_publish_date = (SELECT MIN(publish_date) FROM books WHERE books.author_id = authors.id), "
+        "last_publish_date = (SELECT MAX(publish_date) FROM books WHERE books.author_id = authors.id)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('authors', 'last_publish_date')
+    op.drop_column('authors', 'first_publish_date')
+    op.drop_column('authors', 'book_count')
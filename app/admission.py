@@ -0,0 +1,46 @@
+# admission.py
+"""Load shedding: answer 503 with Retry-After instead of letting requests pile up.
+
+When ``admission_max_waiting`` checkouts are already queued for a connection of the
+primary or the replica, a new request would only wait behind them (up to ``db_pool_timeout``)
+and most likely time out at the client anyway. Rejecting it up front keeps the
+latency of admitted requests bounded and tells well-behaved clients when to retry.
+"""
+from fastapi.responses import JSONResponse
+from app import database, metrics
+from app.config import settings
+
+# Health checks and scrapes must keep answering while the API sheds load
+EXEMPT_PATHS = {"/", "/ready", "/metrics"}
+BUSY_DETAIL = "Server is busy, retry later"
+
+def busy_response() -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": BUSY_DETAIL},
+        headers={"Retry-After": str(settings.admission_retry_after)},
+    )
+
+def overloaded() -> bool:
+    if settings.admission_max_waiting <= 0:
+        return False
+    waiting = max(stats.get("waiting", 0) for stats in database.all_pool_stats().values())
+    return waiting >= settings.admission_max_waiting
+
+class AdmissionControlMiddleware:
+    """ASGI middleware rejecting requests while a database pool's wait queue is at the threshold."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] not in EXEMPT_PATHS and overloaded():
+            metrics.REQUESTS_SHED.labels("pool_queue").inc()
+            await busy_response()(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+async def pool_timeout_handler(request, exc):
+    """A checkout that waited the full ``db_pool_timeout`` is overload too, not a server error."""
+    metrics.REQUESTS_SHED.labels("pool_timeout").inc()
+    return busy_response()
@@ -0,0 +1,61 @@
+# breaker.py
+import logging
+import time
+from app import metrics
+
+logger = logging.getLogger(__name__)
+
+class CircuitBreaker:
+    """Stops calling a failing dependency for a while instead of waiting on it every time.
+
+    Closed: calls go through, and ``failure_threshold`` failures in a row open the
+    breaker. Open: ``allow()`` says no until ``cooldown`` seconds have passed. Half-open:
+    one probe call is let through; its success closes the breaker, its failure opens
+    it for another cooldown. Single event loop only, so no locking.
+    """
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+    STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int, cooldown: float, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._set_state(self.CLOSED)
+
+    def _set_state(self, state: str):
+        if getattr(self, "state", None) not in (None, state):
+            logger.warning("Circuit breaker %s is now %s", self.name, state)
+        self.state = state
+        metrics.BREAKER_STATE.labels(self.name).set(self.STATE_VALUES[state])
+
+    def allow(self) -> bool:
+        """Whether to make a call now; in half-open state only the first caller probes."""
+        if self.state == self.OPEN and self.clock() - self.opened_at >= self.cooldown:
+            self._set_state(self.HALF_OPEN)
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self._probing = False
+        if self.state != self.CLOSED:
+            self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = self.clock()
+            self._set_state(self.OPEN)
+
+    def release(self):
+        """The allowed call ended without an answer (cancelled): let another caller probe."""
+        self._probing = False
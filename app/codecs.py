@@ -0,0 +1,97 @@
+# codecs.py
+import gzip
+import json
+
+try:
+    import zstandard
+except ImportError:  # Optional: pip install zstandard
+    zstandard = None
+
+try:
+    import msgpack
+except ImportError:  # Optional: pip install msgpack
+    msgpack = None
+
+class JSONCodec:
+    """Stores the JSON response body as is.
+
+    Codecs turn a JSON body into the bytes kept in the cache (``encode``) and back
+    (``decode``). ``media_type``/``content_encoding`` describe the stored bytes so a
+    cache hit can be sent to clients that accept them without decoding.
+    """
+    name = "json"
+    media_type = "application/json"
+    content_encoding = None
+
+    def encode(self, body: bytes) -> bytes:
+        return body
+
+    def decode(self, data: bytes) -> bytes:
+        return data
+
+class GzipCodec(JSONCodec):
+    name = "gzip"
+    content_encoding = "gzip"
+
+    def __init__(self, level: int = 6):
+        self.level = level
+
+    def encode(self, body: bytes) -> bytes:
+        return gzip.compress(body, compresslevel=self.level, mtime=0)
+
+    def decode(self, data: bytes) -> bytes:
+        return gzip.decompress(data)
+
+class ZstdCodec(JSONCodec):
+    name = "zstd"
+    content_encoding = "zstd"
+
+    def __init__(self, level: int = 3):
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def encode(self, body: bytes) -> bytes:
+        return self._compressor.compress(body)
+
+    def decode(self, data: bytes) -> bytes:
+        return self._decompressor.decompress(data)
+
+class MsgpackCodec(JSONCodec):
+    name = "msgpack"
+    media_type = "application/msgpack"
+
+    def encode(self, body: bytes) -> bytes:
+        return msgpack.packb(json.loads(body))
+
+    def decode(self, data: bytes) -> bytes:
+        return json.dumps(msgpack.unpackb(data), separators=(",", ":")).encode()
+
+CODECS = {}
+
+def register_codec(codec):
+    """Make ``codec`` selectable by name, e.g. through the CACHE_CODEC setting."""
+    CODECS[codec.name] = codec
+
+def get_codec(name: str):
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unknown cache codec {name!r}, expected one of {sorted(CODECS)}")
+
+def accepts(codec, accept: str, accept_encoding: str) -> bool:
+    """Whether a client sending these headers can take the codec's bytes unchanged."""
+    if codec.content_encoding is not None and codec.content_encoding not in _tokens(accept_encoding):
+        return False
+    if codec.media_type != JSONCodec.media_type and codec.media_type not in _tokens(accept):
+        return False
+    return True
+
+def _tokens(header: str) -> set:
+    return {part.split(";")[0].strip().lower() for part in (header or "").split(",")}
+
+register_codec(JSONCodec())
+register_codec(GzipCodec())
+if zstandard is not None:
+    register_codec(ZstdCodec())
+if msgpack is not None:
+    register_codec(MsgpackCodec())
@@ -1,15 +1,52 @@
-from pydantic_settings import BaseSettings
+from typing import List, Optional
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
-    mysql_user: str
-    mysql_password: str
-    mysql_db: str
-    mysql_host: str
-    redis_host: str
-    redis_port: int
-    bearer_token: str
-
-    class Config:
-        env_file = ".env"
+    mysql_user: str = "user"
+    mysql_password: str = "password"
+    mysql_db: str = "management_book"
+    mysql_host: str = "db"
+    redis_host: str = "redis"
+    redis_port: int = 6379
+    bearer_token: Optional[str] = None
+
+    # Database pool (QueuePool backends: MySQL, file SQLite). Connections beyond
+    # db_pool_size + db_max_overflow wait up to db_pool_timeout seconds, then fail.
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: float = 5.0
+    db_pool_recycle: int = 1800  # Seconds; below MySQL's wait_timeout so idle connections aren't dropped under us
+    db_pool_pre_ping: bool = True
+
+    # Redis pool. Connect and read timeouts are tight because every request can fall back to the database.
+    redis_max_connections: int = 50
+    redis_socket_timeout: float = 0.1
+    redis_socket_connect_timeout: float = 0.1
+    redis_health_check_interval: int = 30
+    # Seconds for a whole cache operation, including the wait for a free pool connection
+    redis_command_timeout: float = 0.25
+
+    # Redis circuit breaker (app/breaker.py): after this many failed cache operations in a row,
+    # skip Redis for redis_breaker_cooldown seconds, then let one probe through
+    redis_breaker_failures: int = 5
+    redis_breaker_cooldown: float = 5.0
+
+    # Replica reads: after a successful write, that client's reads go to the primary for this long.
+    # Keep it above the replica's usual replication lag.
+    read_your_writes_seconds: float = 5.0
+
+    # Admission control: answer 503 once this many requests are waiting for a database connection
+    admission_max_waiting: int = 20
+    admission_retry_after: int = 1  # Seconds, sent as Retry-After
+
+    # Startup warm-up (app/warmup.py): connections opened and pages cached before GET /ready says ready
+    warmup_enabled: bool = True
+    warmup_db_connections: int = 5  # Per engine, at most db_pool_size
+    warmup_redis_connections: int = 5
+    warmup_paths: List[str] = ["/authors/", "/books/"]  # From the environment as JSON: '["/authors/", "/books/?sort=-publish_date"]'
+    warmup_timeout: float = 30.0  # Seconds per attempt
+
+    # .env also holds DATABASE_URL, REDIS_URL, ...
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
 settings = Settings()
@@ -0,0 +1,55 @@
+# consistency.py
+"""Read-your-writes for replica reads.
+
+A replica trails the primary, so a client reading right after its own write could
+miss it. Successful writes set a short-lived cookie; while it is valid,
+``database.get_async_read_db`` sends that client's reads to the primary and the
+cache is bypassed (another client may have cached a page from the lagging
+replica right after the write's eviction). Other clients keep reading from the
+replica; ``utils.invalidate_tags`` evicts again once the window has passed, so
+what they cached from the replica is stale for at most that long.
+"""
+import math
+import time
+from starlette.requests import Request
+from app import database
+from app.config import settings
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+def primary_reads_cookie(now: float = None) -> bytes:
+    window = settings.read_your_writes_seconds
+    until = (now or time.time()) + window
+    return (
+        f"{database.PRIMARY_READS_COOKIE}={until:.3f}; Max-Age={math.ceil(window)}; Path=/; HttpOnly; SameSite=Lax"
+    ).encode()
+
+class ReadYourWritesMiddleware:
+    """Adds the primary-reads cookie to successful writes when a replica is configured,
+    and marks reads carrying a valid one (``database.reading_own_writes``)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or database.ReplicaSessionLocal is None
+            or settings.read_your_writes_seconds <= 0
+        ):
+            await self.app(scope, receive, send)
+            return
+        if scope["method"] in SAFE_METHODS:
+            token = database.reading_own_writes.set(database.reads_from_primary(Request(scope)))
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                database.reading_own_writes.reset(token)
+            return
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                message["headers"] = list(message.get("headers", [])) + [(b"set-cookie", primary_reads_cookie())]
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
@@ -1,59 +1,390 @@
-from sqlalchemy.orm import Session
+import base64
+from collections import defaultdict
+from datetime import date
+from sqlalchemy import and_, delete, func, insert, or_, select, update
+from sqlalchemy.dialects import mysql
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased, load_only, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from . import models, schemas
+from .search import book_index
 
-def get_authors(db: Session, skip: int = 0, limit: int = 10):
-    return db.query(models.Author).offset(skip).limit(limit).all()
+def author_query(fields: tuple = None, include_books: bool = False, books_limit: int = None):
+    """SELECT authors reading only ``fields`` (all columns when None).
 
-def get_author(db: Session, author_id: int):
-    return db.query(models.Author).filter(models.Author.id == author_id).first()
+    Books are loaded with one extra IN query (selectinload) when ``include_books`` is
+    set without a ``books_limit``; capped books are attached by ``load_author_books``.
+    """
+    query = select(models.Author)
+    if fields is not None:
+        query = query.options(load_only(*[getattr(models.Author, name) for name in fields], raiseload=True))
+    if include_books and books_limit is None:
+        query = query.options(selectinload(models.Author.books))
+    return query
 
-def create_author(db: Session, author: schemas.AuthorCreate):
-    db_author = models.Author(**author.dict())
+async def load_author_books(db: AsyncSession, authors: list, books_limit: int):
+    """Attach each author's first ``books_limit`` books (by id) with one windowed IN query.
+
+    selectinload can't cap the number of children per parent.
+    """
+    position = func.row_number().over(partition_by=models.Book.author_id, order_by=models.Book.id).label("position")
+    ranked = select(models.Book, position).where(models.Book.author_id.in_([author.id for author in authors])).subquery()
+    book = aliased(models.Book, ranked)
+    result = await db.scalars(select(book).where(ranked.c.position <= books_limit).order_by(ranked.c.author_id, ranked.c.id))
+    books = defaultdict(list)
+    for row in result.all():
+        books[row.author_id].append(row)
+    for author in authors:
+        set_committed_value(author, "books", books[author.id])
+
+async def get_authors(db: AsyncSession, after: int = None, limit: int = 10, fields: tuple = None, include_books: bool = False, books_limit: int = None):
+    """Return one keyset page of authors and the cursor for the next page."""
+    query = author_query(fields, include_books, books_limit).order_by(models.Author.id)
+    if after is not None:
+        query = query.where(models.Author.id > after)
+    result = await db.execute(query.limit(limit + 1))
+    authors = result.scalars().all()
+    next_cursor = authors[limit - 1].id if len(authors) > limit else None
+    authors = authors[:limit]
+    if include_books and books_limit is not None and authors:
+        await load_author_books(db, authors, books_limit)
+    return authors, next_cursor
+
+async def count_authors(db: AsyncSession):
+    return await db.scalar(select(func.count(models.Author.id)))
+
+async def get_author(db: AsyncSession, author_id: int, fields: tuple = None, include_books: bool = False, books_limit: int = None):
+    if fields is None and not include_books:
+        return await db.get(models.Author, author_id)
+    author = await db.scalar(author_query(fields, include_books, books_limit).where(models.Author.id == author_id))
+    if author is not None and include_books and books_limit is not None:
+        await load_author_books(db, [author], books_limit)
+    return author
+
+async def get_authors_by_ids(db: AsyncSession, author_ids: list, fields: tuple = None, include_books: bool = False, books_limit: int = None):
+    """The authors with these ids from one IN query, in no particular order; unknown ids are left out."""
+    authors = (await db.scalars(author_query(fields, include_books, books_limit).where(models.Author.id.in_(author_ids)))).all()
+    if include_books and books_limit is not None and authors:
+        await load_author_books(db, authors, books_limit)
+    return authors
+
+async def create_author(db: AsyncSession, author: schemas.AuthorCreate):
+    db_author = models.Author(**author.model_dump())
     db.add(db_author)
-    db.commit()
-    db.refresh(db_author)
+    await db.commit()
+    await db.refresh(db_author)
     return db_author
 
-def update_author(db: Session, author_id: int, author: schemas.AuthorUpdate):
-    db_author = db.query(models.Author).filter(models.Author.id == author_id).first()
-    for key, value in author.dict(exclude_unset=True).items():
+async def update_author(db: AsyncSession, author_id: int, author: schemas.AuthorUpdate):
+    db_author = await db.get(models.Author, author_id)
+    for key, value in author.model_dump(exclude_unset=True).items():
         setattr(db_author, key, value)
-    db.commit()
-    db.refresh(db_author)
+    await db.commit()
+    await db.refresh(db_author)
     return db_author
 
-def delete_author(db: Session, author_id: int):
-    db_author = db.query(models.Author).filter(models.Author.id == author_id).first()
-    db.delete(db_author)
-    db.commit()
+async def delete_author(db: AsyncSession, author_id: int):
+    db_author = await db.get(models.Author, author_id)
+    await db.delete(db_author)
+    await db.commit()
     return db_author
 
-def get_books(db: Session, skip: int = 0, limit: int = 10):
-    return db.query(models.Book).offset(skip).limit(limit).all()
+def book_filters(author_id: int = None, published_after=None, published_before=None):
+    """WHERE conditions for the book list filters; date bounds are inclusive."""
+    conditions = []
+    if author_id is not None:
+        conditions.append(models.Book.author_id == author_id)
+    if published_after is not None:
+        conditions.append(models.Book.publish_date >= published_after)
+    if published_before is not None:
+        conditions.append(models.Book.publish_date <= published_before)
+    return conditions
+
+def after_book(publish_date, book_id: int, descending: bool):
+    """Keyset condition for rows following ``(publish_date, book_id)`` in publish_date order.
+
+    Books without a date sort first ascending and last descending, as in MySQL and SQLite.
+    """
+    book = models.Book
+    if not descending:
+        if publish_date is None:
+            return or_(and_(book.publish_date.is_(None), book.id > book_id), book.publish_date.is_not(None))
+        return or_(book.publish_date > publish_date, and_(book.publish_date == publish_date, book.id > book_id))
+    if publish_date is None:
+        return and_(book.publish_date.is_(None), book.id < book_id)
+    return or_(book.publish_date < publish_date, and_(book.publish_date == publish_date, book.id < book_id), book.publish_date.is_(None))
 
-def get_book(db: Session, book_id: int):
-    return db.query(models.Book).filter(models.Book.id == book_id).first()
+def encode_book_cursor(publish_date, book_id: int) -> str:
+    """The opaque next_cursor of a publish_date-ordered page: the last row's sort key."""
+    raw = f"{publish_date.isoformat() if publish_date is not None else ''}:{book_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
 
-def create_book(db: Session, book: schemas.BookCreate):
-    db_book = models.Book(**book.dict())
+def decode_book_cursor(cursor: str):
+    """``(publish_date, book_id)`` of a cursor from ``encode_book_cursor``; raises ``ValueError`` for anything else."""
+    day, book_id = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split(":")
+    return date.fromisoformat(day) if day else None, int(book_id)
+
+async def get_books(db: AsyncSession, after=None, limit: int = 10, sort: str = "id", **filters):
+    """Return one keyset page of books and the cursor for the next page.
+
+    ``sort`` is ``id`` or ``publish_date``, with a ``-`` prefix for descending order;
+    dates tie-break on id. Id order pages by the id of the last book; date order by an
+    opaque cursor holding its ``(publish_date, id)``, so paging needs no lookup and
+    stays exact when that book is edited or deleted. ``filters`` are passed to
+    ``book_filters``. Raises ``ValueError`` for a cursor of the other kind.
+    """
+    descending = sort.startswith("-")
+    id_order = models.Book.id.desc() if descending else models.Book.id
+    by_date = sort.lstrip("-") == "publish_date"
+    query = select(models.Book).where(*book_filters(**filters))
+    if by_date:
+        query = query.order_by(models.Book.publish_date.desc() if descending else models.Book.publish_date, id_order)
+        if after is not None:
+            query = query.where(after_book(*decode_book_cursor(after), descending))
+    else:
+        query = query.order_by(id_order)
+        if after is not None:
+            after = int(after)
+            query = query.where(models.Book.id < after if descending else models.Book.id > after)
+    result = await db.execute(query.limit(limit + 1))
+    books = result.scalars().all()
+    next_cursor = None
+    if len(books) > limit:
+        last = books[limit - 1]
+        next_cursor = encode_book_cursor(last.publish_date, last.id) if by_date else last.id
+    return books[:limit], next_cursor
+
+async def count_books(db: AsyncSession, **filters):
+    return await db.scalar(select(func.count(models.Book.id)).where(*book_filters(**filters)))
+
+async def get_book(db: AsyncSession, book_id: int):
+    return await db.get(models.Book, book_id)
+
+async def get_books_by_ids(db: AsyncSession, book_ids: list):
+    """The books with these ids from one IN query, in no particular order; unknown ids are left out."""
+    return (await db.scalars(select(models.Book).where(models.Book.id.in_(book_ids)))).all()
+
+async def create_book(db: AsyncSession, book: schemas.BookCreate):
+    db_book = models.Book(**book.model_dump())
     db.add(db_book)
-    db.commit()
-    db.refresh(db_book)
+    await db.flush()
+    await refresh_author_stats(db, {db_book.author_id})
+    await db.commit()
+    await db.refresh(db_book)
+    book_index.update(db_book.id, title=db_book.title, description=db_book.description)
     return db_book
 
-def update_book(db: Session, book_id: int, book: schemas.BookUpdate):
-    db_book = db.query(models.Book).filter(models.Book.id == book_id).first()
-    for key, value in book.dict(exclude_unset=True).items():
+async def update_book(db: AsyncSession, book_id: int, book: schemas.BookUpdate):
+    db_book = await db.get(models.Book, book_id)
+    author_ids = {db_book.author_id}
+    for key, value in book.model_dump(exclude_unset=True).items():
         setattr(db_book, key, value)
-    db.commit()
-    db.refresh(db_book)
+    await db.flush()
+    await refresh_author_stats(db, author_ids | {db_book.author_id})
+    await db.commit()
+    await db.refresh(db_book)
+    book_index.update(db_book.id, title=db_book.title, description=db_book.description)
     return db_book
 
-def delete_book(db: Session, book_id: int):
-    db_book = db.query(models.Book).filter(models.Book.id == book_id).first()
-    db.delete(db_book)
-    db.commit()
+async def delete_book(db: AsyncSession, book_id: int):
+    db_book = await db.get(models.Book, book_id)
+    await db.delete(db_book)
+    await db.flush()
+    await refresh_author_stats(db, {db_book.author_id})
+    await db.commit()
+    book_index.remove(book_id)
     return db_book
 
-def get_books_by_author(db: Session, author_id: int):
-    return db.query(models.Book).filter(models.Book.author_id == author_id).all()
+async def search_books(db: AsyncSession, q: str, offset: int = 0, limit: int = 10):
+    """Rank books by relevance to ``q``; returns ``(books, scores, total)`` for one page.
+
+    MySQL uses the FULLTEXT index on (title, description) in natural language mode.
+    Other backends search the in-process ``book_index``, loading it on first use.
+    """
+    if db.get_bind().dialect.name == "mysql":
+        relevance = mysql.match(models.Book.title, models.Book.description, against=q).in_natural_language_mode()
+        total = await db.scalar(select(func.count()).select_from(models.Book).where(relevance))
+        result = await db.execute(
+            select(models.Book, relevance.label("score")).where(relevance)
+            .order_by(relevance.desc(), models.Book.id).offset(offset).limit(limit)
+        )
+        page = result.all()
+        return [book for book, _ in page], [score for _, score in page], total
+
+    while not book_index.loaded:
+        generation = book_index.generation
+        rows = (await db.execute(select(models.Book.id, models.Book.title, models.Book.description))).all()
+        if book_index.generation == generation:  # Otherwise a write raced the load; read again
+            book_index.load(rows)
+    ranked = book_index.search(q)
+    page = ranked[offset:offset + limit]
+    books = {}
+    if page:
+        result = await db.scalars(select(models.Book).where(models.Book.id.in_([book_id for book_id, _ in page])))
+        books = {book.id: book for book in result.all()}
+    page = [(book_id, score) for book_id, score in page if book_id in books]
+    return [books[book_id] for book_id, _ in page], [score for _, score in page], len(ranked)
+
+async def refresh_author_stats(db: AsyncSession, author_ids):
+    """Recompute the denormalized book stats of ``author_ids``; call before committing a book write.
+
+    Correlated subqueries read each author's range of the (author_id, publish_date)
+    index, so this stays cheap however many books the write touched.
+    """
+    if not author_ids:
+        return
+    book = models.Book
+    of_author = book.author_id == models.Author.id
+    await db.execute(
+        update(models.Author)
+        .where(models.Author.id.in_(author_ids))
+        .values(
+            book_count=select(func.count()).where(of_author).scalar_subquery(),
+            first_publish_date=select(func.min(book.publish_date)).where(of_author).scalar_subquery(),
+            last_publish_date=select(func.max(book.publish_date)).where(of_author).scalar_subquery(),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+async def get_author_stats(db: AsyncSession, author_id: int):
+    result = await db.execute(
+        select(models.Author.id.label("author_id"), models.Author.book_count, models.Author.first_publish_date, models.Author.last_publish_date)
+        .where(models.Author.id == author_id)
+    )
+    return result.first()
+
+async def get_books_by_author(db: AsyncSession, author_id: int):
+    result = await db.execute(select(models.Book).where(models.Book.author_id == author_id))
+    return result.scalars().all()
+
+async def existing_ids(db: AsyncSession, model, ids):
+    """Return which of ``ids`` exist in ``model``'s table, using a single IN query."""
+    if not ids:
+        return set()
+    return set((await db.scalars(select(model.id).where(model.id.in_(ids)))).all())
+
+async def bulk_insert(db: AsyncSession, model, rows: list):
+    """INSERT ``rows`` with one batched statement and return the new ids in order."""
+    if not rows:
+        return []
+    connection = await db.connection()
+    if connection.dialect.insert_executemany_returning_sort_by_parameter_order:
+        result = await db.execute(insert(model).returning(model.id, sort_by_parameter_order=True), rows)
+        return result.scalars().all()
+    # No RETURNING (MySQL): InnoDB gives the rows of one multi-row INSERT consecutive ids
+    result = await db.execute(insert(model).values(rows))
+    return list(range(result.lastrowid, result.lastrowid + len(rows)))
+
+def null_field(values: dict, required: tuple):
+    return next((field for field in required if field in values and values[field] is None), None)
+
+async def bulk_create_authors(db: AsyncSession, authors: list):
+    ids = await bulk_insert(db, models.Author, [author.model_dump() for author in authors])
+    await db.commit()
+    return [schemas.BulkItemResult(index=index, id=author_id, status="created") for index, author_id in enumerate(ids)]
+
+async def bulk_update_authors(db: AsyncSession, authors: list):
+    found = await existing_ids(db, models.Author, {author.id for author in authors})
+    results, rows = [], []
+    for index, author in enumerate(authors):
+        values = author.model_dump(exclude_unset=True)
+        if author.id not in found:
+            results.append(schemas.BulkItemResult(index=index, id=author.id, status="error", detail="Author not found"))
+        elif (field := null_field(values, ("name",))):
+            results.append(schemas.BulkItemResult(index=index, id=author.id, status="error", detail=f"{field} cannot be null"))
+        else:
+            if len(values) > 1:
+                rows.append(values)
+            results.append(schemas.BulkItemResult(index=index, id=author.id, status="updated"))
+    if rows:
+        # ORM bulk UPDATE by primary key: executemany, grouped by the set of columns
+        await db.execute(update(models.Author), rows)
+    await db.commit()
+    return results
+
+async def bulk_delete_authors(db: AsyncSession, author_ids: list):
+    result = await db.execute(select(models.Author.id, models.Author.book_count).where(models.Author.id.in_(set(author_ids))))
+    counts = dict(result.all())
+    found = set(counts)
+    with_books = {author_id for author_id, book_count in counts.items() if book_count}
+    results = []
+    for index, author_id in enumerate(author_ids):
+        if author_id not in found:
+            results.append(schemas.BulkItemResult(index=index, id=author_id, status="error", detail="Author not found"))
+        elif author_id in with_books:
+            results.append(schemas.BulkItemResult(index=index, id=author_id, status="error", detail="Cannot delete author with associated books"))
+        else:
+            results.append(schemas.BulkItemResult(index=index, id=author_id, status="deleted"))
+    deletable = found - with_books
+    if deletable:
+        await db.execute(delete(models.Author).where(models.Author.id.in_(deletable)))
+    await db.commit()
+    return results
+
+async def bulk_create_books(db: AsyncSession, books: list):
+    authors = await existing_ids(db, models.Author, {book.author_id for book in books})
+    results, rows, indexes = [None] * len(books), [], []
+    for index, book in enumerate(books):
+        if book.author_id in authors:
+            rows.append(book.model_dump())
+            indexes.append(index)
+        else:
+            results[index] = schemas.BulkItemResult(index=index, status="error", detail="Author not found")
+    ids = await bulk_insert(db, models.Book, rows)
+    await refresh_author_stats(db, {row["author_id"] for row in rows})
+    await db.commit()
+    for index, book_id, row in zip(indexes, ids, rows):
+        results[index] = schemas.BulkItemResult(index=index, id=book_id, status="created")
+        book_index.update(book_id, title=row["title"], description=row["description"])
+    return results
+
+async def bulk_update_books(db: AsyncSession, books: list):
+    """Apply partial updates; returns the per-item results and every author id touched."""
+    current = dict((await db.execute(select(models.Book.id, models.Book.author_id).where(models.Book.id.in_({book.id for book in books})))).all())
+    authors = await existing_ids(db, models.Author, {book.author_id for book in books if book.author_id is not None})
+    results, rows, author_ids = [], [], set()
+    for index, book in enumerate(books):
+        values = book.model_dump(exclude_unset=True)
+        if book.id not in current:
+            results.append(schemas.BulkItemResult(index=index, id=book.id, status="error", detail="Book not found"))
+        elif (field := null_field(values, ("title", "author_id"))):
+            results.append(schemas.BulkItemResult(index=index, id=book.id, status="error", detail=f"{field} cannot be null"))
+        elif "author_id" in values and values["author_id"] not in authors:
+            results.append(schemas.BulkItemResult(index=index, id=book.id, status="error", detail="Author not found"))
+        else:
+            if len(values) > 1:
+                rows.append(values)
+            author_ids.update({current[book.id], values.get("author_id", current[book.id])})
+            results.append(schemas.BulkItemResult(index=index, id=book.id, status="updated"))
+    if rows:
+        await db.execute(update(models.Book), rows)
+        await refresh_author_stats(db, author_ids)
+    await db.commit()
+    for values in rows:
+        book_index.update(values["id"], **{key: values[key] for key in ("title", "description") if key in values})
+    return results, author_ids
+
+async def bulk_delete_books(db: AsyncSession, book_ids: list):
+    """Delete books by id; returns the per-item results and the authors of the deleted books."""
+    current = dict((await db.execute(select(models.Book.id, models.Book.author_id).where(models.Book.id.in_(set(book_ids))))).all())
+    if current:
+        await db.execute(delete(models.Book).where(models.Book.id.in_(current)))
+        await refresh_author_stats(db, set(current.values()))
+    await db.commit()
+    book_index.remove(*current)
+    results = [
+        schemas.BulkItemResult(index=index, id=book_id, status="deleted") if book_id in current
+        else schemas.BulkItemResult(index=index, id=book_id, status="error", detail="Book not found")
+        for index, book_id in enumerate(book_ids)
+    ]
+    return results, set(current.values())
+
+async def stream_rows(db: AsyncSession, columns: list, since: int = None, batch_size: int = 1000):
+    """Yield ``columns`` in id order, ``batch_size`` rows at a time, through a server-side cursor."""
+    table = columns[0].table
+    query = select(*columns).order_by(table.c.id)
+    if since is not None:
+        query = query.where(table.c.id > since)
+    result = await db.stream(query.execution_options(yield_per=batch_size))
+    async for rows in result.partitions():
+        yield rows
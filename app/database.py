@@ -1,24 +1,176 @@
 import os
+import time
+from contextvars import ContextVar
 import redis.asyncio as aioredis
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from fastapi import Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from dotenv import load_dotenv
+from app import metrics
+from app.config import settings
 from sqlalchemy.orm import declarative_base
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Optional read-only replica for GET handlers; unset, reads use the primary
+REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASE_URL")
 REDIS_URL = os.getenv("REDIS_URL")
 
-engine = create_engine(DATABASE_URL)
+# Async drivers used by the API for each sync driver found in DATABASE_URL
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "mysql+mysqldb": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+def to_async_url(url: str) -> str:
+    """Swap the sync DBAPI in ``url`` for its asyncio counterpart."""
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername)).render_as_string(hide_password=False)
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+
+class WaitTrackingPool:
+    """Pool mixin counting the checkouts currently waiting for a connection.
+
+    QueuePool only blocks in its queue's ``get(block=True)``, once the pool and its
+    overflow are all checked out; opening a new connection isn't waiting for one.
+    So the queue's ``get`` is wrapped, and only blocking calls count towards
+    ``waiting`` and the wait time.
+    """
+    name = "db"  # Metrics label
+    waiting = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        queue_get = self._pool.get
+
+        def get(block=True, timeout=None):
+            if not block:
+                return queue_get(block, timeout)
+            self.waiting += 1
+            metrics.observe_pool(self)
+            start = time.perf_counter()
+            try:
+                return queue_get(block, timeout)
+            finally:
+                self.waiting -= 1
+                metrics.observe_pool(self, wait=time.perf_counter() - start)
+
+        self._pool.get = get
+
+    def _do_get(self):
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe_pool(self)
+
+    def _do_return_conn(self, record):
+        try:
+            super()._do_return_conn(record)
+        finally:
+            metrics.observe_pool(self)
+
+class TrackedQueuePool(WaitTrackingPool, QueuePool):
+    name = "sync"
+
+class TrackedAsyncQueuePool(WaitTrackingPool, AsyncAdaptedQueuePool):
+    name = "async"
+
+class TrackedReplicaPool(TrackedAsyncQueuePool):
+    name = "replica"
+
+def pool_options(url: str, pool_class: type) -> dict:
+    """Sizing and liveness options from settings, for backends that use a QueuePool.
+
+    In-memory SQLite uses a single shared connection (StaticPool/SingletonThreadPool),
+    which takes none of these, so it keeps the dialect's default pool.
+    """
+    url = make_url(url)
+    if not issubclass(url.get_dialect().get_pool_class(url), QueuePool):
+        return {}
+    return {
+        "poolclass": pool_class,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+# Sync engine: kept for Alembic and scripts
+engine = create_engine(DATABASE_URL, **pool_options(DATABASE_URL, TrackedQueuePool))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Async engine: used by the API so queries don't block the event loop
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **pool_options(ASYNC_DATABASE_URL, TrackedAsyncQueuePool))
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+metrics.instrument_engine(engine)
+metrics.instrument_engine(async_engine.sync_engine)
+
+# Replica engine: GET handlers read here through get_async_read_db
+replica_engine = None
+ReplicaSessionLocal = None
+if REPLICA_DATABASE_URL:
+    ASYNC_REPLICA_URL = to_async_url(REPLICA_DATABASE_URL)
+    replica_engine = create_async_engine(ASYNC_REPLICA_URL, **pool_options(ASYNC_REPLICA_URL, TrackedReplicaPool))
+    ReplicaSessionLocal = async_sessionmaker(bind=replica_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    metrics.instrument_engine(replica_engine.sync_engine)
+
+# Set on responses to writes; until it expires, the client's reads go to the primary
+PRIMARY_READS_COOKIE = "read_primary_until"
+# True while handling a read from a client inside its read-your-writes window (set by
+# consistency.ReadYourWritesMiddleware): cached entries may have been built from the
+# replica before it caught up, so the cache is bypassed
+reading_own_writes = ContextVar("reading_own_writes", default=False)
 Base = declarative_base()
 
+class TrackedRedisPool(aioredis.BlockingConnectionPool):
+    """Blocking Redis pool counting the commands waiting for a free connection."""
+    waiting = 0
+
+    async def get_connection(self, *args, **kwargs):
+        if self.can_get_connection():
+            try:
+                return await super().get_connection(*args, **kwargs)
+            finally:
+                metrics.observe_redis_pool(self)
+        self.waiting += 1
+        metrics.observe_redis_pool(self)
+        start = time.perf_counter()
+        try:
+            return await super().get_connection(*args, **kwargs)
+        finally:
+            self.waiting -= 1
+            metrics.observe_redis_pool(self, wait=time.perf_counter() - start)
+
+    async def release(self, connection):
+        try:
+            await super().release(connection)
+        finally:
+            metrics.observe_redis_pool(self)
+
 redis = None
 
 async def init_redis():
     global redis
-    redis = aioredis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
+    # Cached bodies are stored as raw (possibly compressed) bytes.
+    # A blocking pool makes bursts wait briefly for a connection instead of failing at once.
+    pool = TrackedRedisPool.from_url(
+        REDIS_URL,
+        max_connections=settings.redis_max_connections,
+        timeout=settings.redis_command_timeout,
+        socket_timeout=settings.redis_socket_timeout,
+        socket_connect_timeout=settings.redis_socket_connect_timeout,
+        health_check_interval=settings.redis_health_check_interval,
+    )
+    redis = aioredis.Redis(connection_pool=pool)
 
 def get_db():
     db = SessionLocal()
@@ -27,6 +179,61 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def reads_from_primary(request: Request) -> bool:
+    """Whether this client wrote within the read-your-writes window (see consistency.py)."""
+    try:
+        return float(request.cookies.get(PRIMARY_READS_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+async def get_async_read_db(request: Request, primary: AsyncSession = Depends(get_async_db)):
+    """Session for read-only handlers: the replica, or the primary right after this client wrote.
+
+    The primary session comes from ``get_async_db`` so overrides of it (tests) apply here too;
+    sessions connect lazily, so an unused one costs no connection.
+    """
+    if ReplicaSessionLocal is None or reads_from_primary(request):
+        metrics.DB_READ_SESSIONS.labels("primary").inc()
+        yield primary
+        return
+    metrics.DB_READ_SESSIONS.labels("replica").inc()
+    async with ReplicaSessionLocal() as db:
+        yield db
+
+def pool_stats(pool=None) -> dict:
+    """Occupancy of a database pool, the API's primary by default (empty for pools without a fixed size)."""
+    pool = pool or async_engine.pool
+    if not isinstance(pool, QueuePool):
+        return {}
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "waiting": getattr(pool, "waiting", 0),
+    }
+
+def redis_pool_stats() -> dict:
+    """Occupancy of the Redis pool (empty before it's created, or for other pool classes)."""
+    pool = getattr(redis, "connection_pool", None)
+    if not isinstance(pool, TrackedRedisPool):
+        return {}
+    return {
+        "max_connections": pool.max_connections,
+        "in_use": len(pool._in_use_connections),
+        "idle": len(pool._available_connections),
+        "waiting": pool.waiting,
+    }
+
+def all_pool_stats() -> dict:
+    stats = {"database": pool_stats()}
+    if replica_engine is not None:
+        stats["replica"] = pool_stats(replica_engine.pool)
+    return stats
+
 async def get_redis():
     if not redis:
         await init_redis()
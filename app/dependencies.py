@@ -1,5 +1,7 @@
-from fastapi import Header, HTTPException, Depends
+from fastapi import Header, HTTPException, Depends, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from typing import List, Optional
+from app import utils
 import os
 
 bearer_scheme = HTTPBearer()
@@ -9,3 +11,16 @@ def get_bearer_token(credentials: HTTPAuthorizationCredentials = Depends(bearer_
     if credentials.credentials != token:
         raise HTTPException(status_code=403, detail="Invalid token")
     return credentials.credentials
+
+def id_list(ids: Optional[str] = Query(None, description=f"Comma-separated ids to fetch in one call (at most {utils.MAX_BATCH_IDS})")) -> Optional[List[int]]:
+    """``?ids=3,1,2`` as distinct ids in the order given; ``None`` without the parameter."""
+    if ids is None:
+        return None
+    try:
+        parsed = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=422, detail="ids must be comma-separated integers")
+    parsed = list(dict.fromkeys(parsed))
+    if not parsed or len(parsed) > utils.MAX_BATCH_IDS:
+        raise HTTPException(status_code=422, detail=f"Pass between 1 and {utils.MAX_BATCH_IDS} ids")
+    return parsed
@@ -0,0 +1,191 @@
+# importer.py
+"""Bulk import of authors or books from NDJSON/CSV files.
+
+Used by the /import endpoints and as a CLI::
+
+    python -m app.importer books books.csv --batch-size 5000
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import sys
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import crud, models, schemas, utils
+from app.database import AsyncSessionLocal
+from app.search import book_index
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 5000
+MAX_BATCH_SIZE = 50000
+MAX_REPORTED_ERRORS = 1000
+IMPORT_TARGETS = {
+    "authors": (models.Author, schemas.AuthorCreate),
+    "books": (models.Book, schemas.BookCreate),
+}
+
+def detect_format(filename: str) -> str:
+    return "csv" if (filename or "").lower().endswith(".csv") else "ndjson"
+
+# Open import files with this, so a bad byte fails its record instead of the whole import
+TEXT_ERRORS = "surrogateescape"
+
+def is_utf8(*values) -> bool:
+    """Whether no value holds bytes that ``TEXT_ERRORS`` couldn't decode."""
+    try:
+        for value in values:
+            if isinstance(value, str):
+                value.encode("utf-8")
+    except UnicodeEncodeError:
+        return False
+    return True
+
+def read_records(text, format: str):
+    """Yield ``(line, data, error)`` for each record of a text file object, lazily.
+
+    Undecodable bytes and malformed CSV rows are reported on their record and
+    reading goes on.
+    """
+    if format == "csv":
+        reader = csv.DictReader(text)
+        line = 1
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as exc:
+                # Some errors are raised before line_num counts the offending line
+                line = max(reader.line_num, line + 1)
+                yield line, None, f"Invalid CSV: {exc}"
+                continue
+            except UnicodeDecodeError as exc:
+                # Only without TEXT_ERRORS; the decoder can't resume after this
+                yield line + 1, None, f"Invalid UTF-8: {exc.reason}"
+                return
+            line = reader.line_num
+            if not is_utf8(*row.values()):
+                yield reader.line_num, None, "Invalid UTF-8"
+                continue
+            # Empty cells are missing values, not empty strings
+            yield reader.line_num, {key: value if value != "" else None for key, value in row.items()}, None
+    line = 0
+    while True:
+        try:
+            raw = next(text)
+        except StopIteration:
+            return
+        except UnicodeDecodeError as exc:
+            yield line + 1, None, f"Invalid UTF-8: {exc.reason}"
+            return
+        line += 1
+        if not raw.strip():
+            continue
+        if not is_utf8(raw):
+            yield line, None, "Invalid UTF-8"
+            continue
+        try:
+            yield line, json.loads(raw), None
+        except ValueError as exc:
+            yield line, None, f"Invalid JSON: {exc}"
+
+def read_batches(text, format: str, batch_size: int):
+    batch = []
+    for record in read_records(text, format):
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def add_error(report: schemas.ImportReport, line: int, detail: str):
+    report.failed += 1
+    if len(report.errors) < MAX_REPORTED_ERRORS:
+        report.errors.append(schemas.ImportRowError(line=line, detail=detail))
+
+async def import_batch(db: AsyncSession, target: str, batch: list, report: schemas.ImportReport):
+    """Validate and insert one batch in its own transaction; returns the author ids it touched."""
+    model, schema = IMPORT_TARGETS[target]
+    rows = []
+    for line, data, error in batch:
+        if error is None:
+            try:
+                rows.append((line, schema.model_validate(data).model_dump()))
+                continue
+            except ValidationError as exc:
+                first = exc.errors()[0]
+                error = f"{'.'.join(str(part) for part in first['loc'])}: {first['msg']}"
+        add_error(report, line, error)
+    report.processed += len(batch)
+
+    if target == "books" and rows:
+        # One IN query resolves every author reference of the batch
+        authors = await crud.existing_ids(db, models.Author, {row["author_id"] for _, row in rows})
+        for line, row in rows:
+            if row["author_id"] not in authors:
+                add_error(report, line, f"author_id: Author {row['author_id']} not found")
+        rows = [(line, row) for line, row in rows if row["author_id"] in authors]
+    if not rows:
+        return set()
+
+    try:
+        # Core executemany: no ORM objects and no RETURNING needed here
+        await db.execute(insert(model.__table__), [row for _, row in rows])
+        if target == "books":
+            await crud.refresh_author_stats(db, {row["author_id"] for _, row in rows})
+        await db.commit()
+    except SQLAlchemyError as exc:
+        await db.rollback()
+        for line, _ in rows:
+            add_error(report, line, f"Batch insert failed: {exc.__class__.__name__}")
+        return set()
+    report.inserted += len(rows)
+    if target == "books":
+        book_index.reset()  # Core inserts don't return ids; reload on the next search
+    return {row["author_id"] for _, row in rows} if target == "books" else set()
+
+async def invalidate_after_import(target: str, author_ids: set):
+    if target == "authors":
+        await utils.invalidate_tags(utils.AUTHORS_TAG, utils.AUTHORS_TAIL_TAG)
+    else:
+        await utils.invalidate_tags(utils.BOOKS_TAG, utils.BOOKS_TAIL_TAG, *[utils.author_tag(author_id) for author_id in author_ids])
+
+async def run_import(db: AsyncSession, target: str, path: str, format: str, batch_size: int) -> schemas.ImportReport:
+    report = schemas.ImportReport()
+    author_ids = set()
+    try:
+        with open(path, encoding="utf-8", errors=TEXT_ERRORS, newline="") as text:
+            for batch in read_batches(text, format, batch_size):
+                author_ids |= await import_batch(db, target, batch, report)
+                logger.info("processed=%d inserted=%d failed=%d", report.processed, report.inserted, report.failed)
+    finally:
+        # Batches committed before a failure are already visible
+        try:
+            await invalidate_after_import(target, author_ids)
+        except Exception:
+            logger.warning("Could not invalidate cached %s, entries expire within %ss", target, utils.CACHE_EXPIRE_TIME)
+    return report
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import authors or books from an NDJSON or CSV file.")
+    parser.add_argument("target", choices=sorted(IMPORT_TARGETS))
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["ndjson", "csv"], help="Defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    async with AsyncSessionLocal() as db:
+        report = await run_import(db, args.target, args.path, args.format or detect_format(args.path), args.batch_size)
+    print(report.model_dump_json(indent=2))
+    return 0 if not report.failed else 1
+
+if __name__ == "__main__":
+    # Progress goes to stderr, the report to stdout
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    sys.exit(asyncio.run(main()))
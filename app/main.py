@@ -1,12 +1,25 @@
-from fastapi import FastAPI
-from app.routers import author, book
-from app.database import init_redis
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Response
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from app import admission, consistency, database, dependencies, metrics, tracing, utils, warmup
+from app.routers import author, book, export, imports
 from fastapi.middleware.cors import CORSMiddleware
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    utils.start_invalidation_listener()
+    # In the background: the server accepts connections meanwhile and /ready reports progress
+    warmup.start(app)
+    yield
+    await warmup.stop()
+    await utils.stop_invalidation_listener()
+
 app = FastAPI(
     title="BE Management Book",
     description="This is a BE Management Book.",
-    version="0.0.1"
+    version="0.0.1",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -16,14 +29,39 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-# @app.on_event("startup")
-# async def startup_event():
-#     await init_redis()
+# Passes requests straight through unless QUERY_TRACE=1
+app.add_middleware(tracing.QueryTraceMiddleware)
+# Sets the cookie that keeps a client's reads on the primary just after it wrote
+app.add_middleware(consistency.ReadYourWritesMiddleware)
+# 503 + Retry-After while too many requests are queued for a database connection
+app.add_middleware(admission.AdmissionControlMiddleware)
+app.add_exception_handler(PoolTimeoutError, admission.pool_timeout_handler)
+# Added last so it is outermost and times everything, CORS included
+app.add_middleware(metrics.MetricsMiddleware)
 
 @app.get("/")
 async def index():
     return {"message": "BE Management Book"}
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 503 until the startup warm-up has finished."""
+    return JSONResponse(status_code=200 if warmup.state.ready else 503, content=warmup.state.report())
+
+@app.get("/cache/stats")
+async def cache_stats(token: str = Depends(dependencies.get_bearer_token)):
+    return {"local": utils.local_cache_stats()}
+
+@app.get("/pool/stats")
+async def pool_stats(token: str = Depends(dependencies.get_bearer_token)):
+    return {**database.all_pool_stats(), "redis": database.redis_pool_stats()}
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
 app.include_router(author.router)
 app.include_router(book.router)
+app.include_router(export.router)
+app.include_router(imports.router)
@@ -0,0 +1,214 @@
+# metrics.py
+"""Prometheus collectors for requests, database queries and the Redis cache.
+
+Everything here runs on the hot path, so an observation is a label lookup and an
+in-memory increment, and label values come from small fixed sets (route templates,
+SQL verbs, cache key families). Served at ``/metrics``; with several worker
+processes set PROMETHEUS_MULTIPROC_DIR and each scrape aggregates all of them.
+"""
+import os
+import re
+import time
+from sqlalchemy import event
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+# Database and Redis calls are much faster than whole requests
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request until its response body was sent",
+    ["method", "route", "status"],
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "Requests being handled",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds",
+    "SQL statement execution time; the _count series counts queries",
+    ["operation"],
+    buckets=FAST_BUCKETS,
+)
+REDIS_LATENCY = Histogram(
+    "redis_command_duration_seconds",
+    "Redis round trip time of cache operations",
+    ["operation"],
+    buckets=FAST_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total",
+    "Cache lookups by key family and result (local_hit, hit, miss, unavailable while Redis is down, or bypass for read-your-writes)",
+    ["family", "result"],
+)
+REDIS_ERRORS = Counter(
+    "redis_errors_total",
+    "Cache operations that failed with a Redis connection error or timeout",
+    ["operation"],
+)
+REDIS_SKIPPED = Counter(
+    "redis_skipped_total",
+    "Cache operations not sent to Redis because its circuit breaker was open",
+    ["operation"],
+)
+BREAKER_STATE = Gauge(
+    "circuit_breaker_state",
+    "Circuit breaker state: 0 closed, 1 half-open, 2 open",
+    ["name"],
+    multiprocess_mode="livemax",
+)
+
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "Database connections in use",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow",
+    "Connections open beyond the pool size",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_WAITING = Gauge(
+    "db_pool_waiting",
+    "Checkouts waiting for a free connection",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds",
+    "Time a checkout blocked until a connection was returned (checkouts that didn't block aren't observed)",
+    ["pool"],
+    buckets=FAST_BUCKETS,
+)
+REDIS_POOL_IN_USE = Gauge(
+    "redis_pool_in_use",
+    "Redis connections in use",
+    multiprocess_mode="livesum",
+)
+REDIS_POOL_WAITING = Gauge(
+    "redis_pool_waiting",
+    "Redis commands waiting for a free connection",
+    multiprocess_mode="livesum",
+)
+REDIS_POOL_WAIT = Histogram(
+    "redis_pool_wait_seconds",
+    "Time a Redis command blocked until a connection was free",
+    buckets=FAST_BUCKETS,
+)
+DB_READ_SESSIONS = Counter(
+    "db_read_sessions_total",
+    "Sessions opened by read-only handlers, by target (replica, or primary for read-your-writes)",
+    ["target"],
+)
+REQUESTS_SHED = Counter(
+    "http_requests_shed_total",
+    "Requests answered 503 instead of queueing (pool_queue: admission control, pool_timeout: checkout timed out)",
+    ["reason"],
+)
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency per route template and requests in flight.
+
+    Plain ASGI rather than BaseHTTPMiddleware: no extra task per request, and
+    streamed responses are timed until their last chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        status = "500"
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_progress.dec()
+            # The template (/authors/{id}), not the path, keeps the label set bounded
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(method, getattr(route, "path", "unmatched"), status).observe(time.perf_counter() - start)
+
+def instrument_engine(engine):
+    """Time every statement run on ``engine`` (a sync Engine, or an AsyncEngine's ``sync_engine``)."""
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def stop_timer(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        DB_QUERY_LATENCY.labels(sql_operation(statement)).observe(elapsed)
+
+    @event.listens_for(engine, "handle_error")
+    def drop_timer(context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+def observe_pool(pool, wait: float = None):
+    """Refresh the gauges of a QueuePool after a checkout or return; ``wait`` is the checkout's wait."""
+    DB_POOL_CHECKED_OUT.labels(pool.name).set(pool.checkedout())
+    DB_POOL_OVERFLOW.labels(pool.name).set(max(pool.overflow(), 0))
+    DB_POOL_WAITING.labels(pool.name).set(pool.waiting)
+    if wait is not None:
+        DB_POOL_WAIT.labels(pool.name).observe(wait)
+
+def observe_redis_pool(pool, wait: float = None):
+    REDIS_POOL_IN_USE.set(len(pool._in_use_connections))
+    REDIS_POOL_WAITING.set(pool.waiting)
+    if wait is not None:
+        REDIS_POOL_WAIT.observe(wait)
+
+_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+
+def sql_operation(statement: str) -> str:
+    verb = statement.lstrip()[:6].upper()
+    return verb if verb in _OPERATIONS else "OTHER"
+
+_ID_SEGMENT = re.compile(r"^\d+$")
+
+def key_family(key: str) -> str:
+    """Group cache keys by shape: ``author:7:books`` -> ``author:{id}:books``, ``books_list:after=0:limit=50`` -> ``books_list``.
+
+    Everything from the first ``name=value`` segment on is dropped, since values such
+    as cursors and search terms come from clients and may contain ``:`` themselves.
+    Count keys keep their ``:count`` suffix.
+    """
+    parts = []
+    for part in key.split(":"):
+        if "=" in part:
+            break
+        parts.append("{id}" if _ID_SEGMENT.match(part) else part)
+    family = ":".join(parts)
+    return family + ":count" if key.endswith(":count") and parts[-1] != "count" else family
+
+def redis_timer(operation: str):
+    return REDIS_LATENCY.labels(operation).time()
+
+def record_lookup(key: str, result: str):
+    CACHE_LOOKUPS.labels(key_family(key), result).inc()
+
+def render():
+    """The body and content type of a scrape."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, ForeignKey
+from sqlalchemy import Column, Integer, String, Date, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -9,7 +9,13 @@ class Author(Base):
     name = Column(String(255), nullable=False)
     bio = Column(String(255), nullable=True)
     birth_date = Column(Date, nullable=True)
-    books = relationship("Book", back_populates="author", lazy='joined')  # Eager loading here if needed
+    # Denormalized from books by crud.refresh_author_stats, in the same transaction as the book write
+    book_count = Column(Integer, nullable=False, default=0, server_default="0")
+    first_publish_date = Column(Date, nullable=True)
+    last_publish_date = Column(Date, nullable=True)
+    # Not loaded with the author: ask for them with crud.author_query(include_books=True).
+    # raise_on_sql turns an accidental lazy load (a query per author) into an error.
+    books = relationship("Book", back_populates="author", lazy="raise_on_sql")
 
 class Book(Base):
     __tablename__ = "books"
@@ -20,3 +26,11 @@ class Book(Base):
     publish_date = Column(Date, nullable=True)
     author_id = Column(Integer, ForeignKey("authors.id"), nullable=False)
     author = relationship("Author", back_populates="books")
+
+    __table_args__ = (
+        # Filtered/sorted GET /books/ and /authors/{id}/books (see crud.book_filters)
+        Index("ix_books_author_id_publish_date", "author_id", "publish_date"),
+        Index("ix_books_publish_date_id", "publish_date", "id"),
+        # Backs GET /books/search on MySQL; SQLite uses the in-process index in app/search.py
+        Index("ix_books_title_description_fulltext", "title", "description", mysql_prefix="FULLTEXT").ddl_if(dialect="mysql"),
+    )
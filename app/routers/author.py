@@ -1,75 +1,186 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app import models, schemas, dependencies, utils
-from app.database import get_db
-from typing import List
-from sqlalchemy.orm import joinedload
+from fastapi import APIRouter, BackgroundTasks, Body, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import crud, schemas, dependencies, utils
+from app.database import get_async_db, get_async_read_db
+from typing import List, Literal, NamedTuple, Optional, Union
 
 router = APIRouter(
     prefix="/authors",
     tags=["authors"]
 )
 
-@router.get("/", response_model=List[schemas.Author])
-async def get_authors(db: Session = Depends(get_db), token: str = Depends(dependencies.get_bearer_token)):
-    # await utils.set_cache("authors_list", None)
-    cache_key = "authors_list"
-    cached_authors = await utils.get_cache(cache_key)
-    if cached_authors:
-        return cached_authors
-    authors = db.query(models.Author).options(joinedload(models.Author.books)).all()
-    await utils.set_cache(cache_key, authors)
-    return authors
+class AuthorView(NamedTuple):
+    """What an author response contains, from the ?fields=, ?include= and ?books_limit= parameters."""
+    fields: Optional[tuple]
+    include_books: bool
+    books_limit: Optional[int]
+
+    @property
+    def schema(self):
+        return schemas.author_schema(self.fields, self.include_books)
+
+    def cache_key(self, key: str) -> str:
+        fields = ",".join(self.fields) if self.fields else None
+        return utils.filtered_collection(key, fields=fields, include="books" if self.include_books else None, books_limit=self.books_limit)
+
+def author_view(
+    fields: Optional[str] = Query(None, description=f"Comma-separated subset of {','.join(schemas.AUTHOR_FIELDS)}; id is always included"),
+    include: Optional[Literal["books"]] = Query(None, description="Nest each author's books"),
+    books_limit: Optional[int] = Query(None, ge=1, le=utils.MAX_PAGE_SIZE, description="With include=books, at most this many books per author (lowest ids first)"),
+) -> AuthorView:
+    selected = None
+    if fields:
+        names = {name.strip() for name in fields.split(",") if name.strip()}
+        unknown = sorted(names - set(schemas.AUTHOR_FIELDS))
+        if unknown or not names:
+            raise HTTPException(status_code=422, detail=f"Unknown fields {unknown}, expected some of {list(schemas.AUTHOR_FIELDS)}")
+        # Canonical order, so equivalent requests share a schema and a cache entry
+        selected = tuple(name for name in schemas.AUTHOR_FIELDS if name in names or name == "id")
+    include_books = include == "books"
+    return AuthorView(selected, include_books, books_limit if include_books else None)
+
+async def load_authors_page(db: AsyncSession, after: Optional[int], limit: int, view: AuthorView):
+    authors, next_cursor = await crud.get_authors(db, after=after, limit=limit, **view._asdict())
+    return schemas.author_page_schema(view.schema)(
+        items=[view.schema.model_validate(author, from_attributes=True) for author in authors],
+        next_cursor=next_cursor,
+    )
+
+def author_page_tags(page) -> list:
+    # New authors only ever land on the last page
+    tags = [utils.author_tag(author.id) for author in page.items]
+    return tags + [utils.AUTHORS_TAIL_TAG] if page.next_cursor is None else tags
+
+@router.get("/", response_model=Union[schemas.AuthorPage, schemas.AuthorBatch])
+async def get_authors(
+    request: Request,
+    ids: Optional[List[int]] = Depends(dependencies.id_list),
+    after: Optional[int] = Query(None, ge=0, description="Return authors with an id greater than this cursor"),
+    limit: int = Query(utils.DEFAULT_PAGE_SIZE, ge=1, le=utils.MAX_PAGE_SIZE),
+    view: AuthorView = Depends(author_view),
+    db: AsyncSession = Depends(get_async_read_db),
+    token: str = Depends(dependencies.get_bearer_token)
+):
+    if ids is not None:
+        # Same entries as GET /authors/{id} with the same view parameters
+        entries = await utils.get_or_set_cache_many(
+            ids,
+            lambda id: view.cache_key(utils.author_cache_key(id)),
+            lambda missing: crud.get_authors_by_ids(db, missing, **view._asdict()),
+            view.schema,
+            tags=lambda id: [utils.author_tag(id)],
+            version_tag=utils.author_tag,
+        )
+        return utils.batch_response(entries, ids)
+    # Nested books are covered by the author tags: book writes evict their author's tag
+    entry = await utils.get_or_build_cache(
+        utils.page_cache_key(view.cache_key("authors_list"), after, limit),
+        lambda session: load_authors_page(session, after, limit, view),
+        db,
+        schema=schemas.author_page_schema(view.schema),
+        tags=author_page_tags,
+        version_tag=utils.AUTHORS_TAG,
+        codec=utils.PAGE_CODEC,
+    )
+    count = await utils.get_or_build_count("authors_list", crud.count_authors, db, tags=[utils.AUTHORS_TAG], version_tag=utils.AUTHORS_TAG)
+    return utils.page_response(entry, count, request)
 
 @router.post("/", response_model=schemas.Author)
-async def create_author(author: schemas.AuthorCreate, db: Session = Depends(get_db), token: str = Depends(dependencies.get_bearer_token)):
-    new_author = models.Author(**author.dict())
-    db.add(new_author)
-    db.commit()
-    db.refresh(new_author)
-    await utils.set_cache("authors_list", None)
+async def create_author(author: schemas.AuthorCreate, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_db), token: str = Depends(dependencies.get_bearer_token)):
+    new_author = await crud.create_author(db, author)
+    # Counts and the last page change; existing rows don't
+    background_tasks.add_task(utils.invalidate_tags, utils.AUTHORS_TAG, utils.AUTHORS_TAIL_TAG)
     return new_author
 
+@router.post("/bulk", response_model=schemas.BulkResult)
+async def create_authors_bulk(
+    background_tasks: BackgroundTasks,
+    authors: List[schemas.AuthorCreate] = Body(..., min_length=1, max_length=utils.MAX_BULK_ITEMS),
+    db: AsyncSession = Depends(get_async_db),
+    token: str = Depends(dependencies.get_bearer_token)
+):
+    results = await crud.bulk_create_authors(db, authors)
+    background_tasks.add_task(utils.invalidate_tags, utils.AUTHORS_TAG, utils.AUTHORS_TAIL_TAG)
+    return schemas.BulkResult(results=results)
+
+@router.patch("/bulk", response_model=schemas.BulkResult)
+async def update_authors_bulk(
+    background_tasks: BackgroundTasks,
+    authors: List[schemas.AuthorBulkUpdate] = Body(..., min_length=1, max_length=utils.MAX_BULK_ITEMS),
+    db: AsyncSession = Depends(get_async_db),
+    token: str = Depends(dependencies.get_bearer_token)
+):
+    results = await crud.bulk_update_authors(db, authors)
+    updated = [result.id for result in results if result.status == "updated"]
+    background_tasks.add_task(utils.invalidate_tags, *[utils.author_tag(author_id) for author_id in updated])
+    return schemas.BulkResult(results=results)
+
+@router.delete("/bulk", response_model=schemas.BulkResult)
+async def delete_authors_bulk(
+    background_tasks: BackgroundTasks,
+    author_ids: List[int] = Body(..., min_length=1, max_length=utils.MAX_BULK_ITEMS),
+    db: AsyncSession = Depends(get_async_db),
+    token: str = Depends(dependencies.get_bearer_token)
+):
+    results = await crud.bulk_delete_authors(db, author_ids)
+    deleted = [result.id for result in results if result.status == "deleted"]
+    background_tasks.add_task(utils.invalidate_tags, utils.AUTHORS_TAG, *[utils.author_tag(author_id) for author_id in deleted])
+    return schemas.BulkResult(results=results)
+
 @router.get("/{id}", response_model=schemas.Author)
-async def get_author(id: int, db: Session = Depends(get_db), token: str = Depends(dependencies.get_bearer_token)):
-    author = db.query(models.Author).filter(models.Author.id == id).first()
-    if not author:
+async def get_author(id: int, request: Request, view: AuthorView = Depends(author_view), db: AsyncSession = Depends(get_async_read_db), token: str = Depends(dependencies.get_bearer_token)):
+    entry = await utils.get_or_set_cache(
+        view.cache_key(utils.author_cache_key(id)),
+        lambda: crud.get_author(db, id, **view._asdict()),
+        view.schema,
+        tags=[utils.author_tag(id)],
+        version_tag=utils.author_tag(id),
+    )
+    if not entry:
         raise HTTPException(status_code=404, detail="Author not found")
-    return author
+    return utils.conditional_response(entry, request)
 
 @router.put("/{id}", response_model=schemas.Author)
-async def update_author(id: int, author: schemas.AuthorCreate, db: Session = Depends(get_db), token: str = Depends(dependencies.get_bearer_token)):
-    db_author = db.query(models.Author).filter(models.Author.id == id).first()
-    if not db_author:
+async def update_author(id: int, author: schemas.AuthorCreate, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_db), token: str = Depends(dependencies.get_bearer_token)):
+    if not await crud.get_author(db, id):
         raise HTTPException(status_code=404, detail="Author not found")
-    for key, value in author.dict().items():
-        setattr(db_author, key, value)
-    db.commit()
-    db.refresh(db_author)
-    await utils.set_cache("authors_list", None)
+    db_author = await crud.update_author(db, id, author)
+    background_tasks.add_task(utils.invalidate_tags, utils.author_tag(id))
     return db_author
 
 @router.delete("/{author_id}")
-async def delete_author(author_id: int, db: Session = Depends(get_db)):
-    author = db.query(models.Author).filter(models.Author.id == author_id).first()
+async def delete_author(author_id: int, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_db)):
+    author = await crud.get_author(db, author_id)
     if not author:
         raise HTTPException(status_code=404, detail="Author not found")
-    if author.books:
+    if author.book_count:
         raise HTTPException(status_code=400, detail="Cannot delete author with associated books")
-    db.delete(author)
-    db.commit()
+    await crud.delete_author(db, author_id)
+    background_tasks.add_task(utils.invalidate_tags, utils.AUTHORS_TAG, utils.author_tag(author_id))
     return {"detail": "Author deleted successfully"}
 
+@router.get("/{id}/stats", response_model=schemas.AuthorStats)
+async def get_author_stats(id: int, request: Request, db: AsyncSession = Depends(get_async_read_db), token: str = Depends(dependencies.get_bearer_token)):
+    # Book writes evict the author's tag along with its other entries
+    entry = await utils.get_or_set_cache(utils.author_stats_cache_key(id), lambda: crud.get_author_stats(db, id), schemas.AuthorStats, tags=[utils.author_tag(id)], version_tag=utils.author_tag(id))
+    if not entry:
+        raise HTTPException(status_code=404, detail="Author not found")
+    return utils.conditional_response(entry, request)
+
 @router.get("/{id}/books", response_model=List[schemas.Book])
 async def get_books_by_author(
     id: int, 
-    db: Session = Depends(get_db), 
+    request: Request,
+    db: AsyncSession = Depends(get_async_read_db), 
     token: str = Depends(dependencies.get_bearer_token)
 ):
-    # Fetch books written by the author with the given ID
-    books = db.query(models.Book).filter(models.Book.author_id == id).all()
+    async def load_books():
+        # Fetch books written by the author with the given ID; an empty result isn't cached
+        return await crud.get_books_by_author(db, id) or None
+
+    entry = await utils.get_or_set_cache(utils.author_books_cache_key(id), load_books, List[schemas.Book], tags=[utils.author_tag(id)], version_tag=utils.author_tag(id))
     
-    if not books:
+    if not entry:
         raise HTTPException(status_code=404, detail="No books found for this author")
     
-    return books
\ No newline at end of file
+    return utils.conditional_response(entry, request)
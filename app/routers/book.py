@@ -1,70 +1,181 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app import models, schemas, dependencies, utils
-from app.database import get_db
-from typing import List
-from sqlalchemy.orm import joinedload
+from fastapi import APIRouter, BackgroundTasks, Body, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import crud, schemas, dependencies, utils
+from app.database import get_async_db, get_async_read_db
+from datetime import date
+from typing import List, Literal, Optional, Union
 
 router = APIRouter(
     prefix="/books",
     tags=["books"]
 )
 
-@router.get("/", response_model=List[schemas.Book])
-async def get_books(db: Session = Depends(get_db), token: str = Depends(dependencies.get_bearer_token)):
-    cache_key = "books_list"
-    cached_books = await utils.get_cache(cache_key)
-    if cached_books:
-        return cached_books
-    books = db.query(models.Book).options(joinedload(models.Book.author)).all() 
-    serialized_books = [schemas.Book.from_orm(book) for book in books]  
-    await utils.set_cache(cache_key, serialized_books)
-    return serialized_books
+async def load_books_page(db: AsyncSession, after: Optional[str], limit: int, sort: str, filters: dict):
+    try:
+        books, next_cursor = await crud.get_books(db, after=after, limit=limit, sort=sort, **filters)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor for this sort order, restart from the first page")
+    return schemas.BookPageItems(
+        items=[schemas.Book.model_validate(book, from_attributes=True) for book in books],
+        next_cursor=next_cursor,
+    )
 
+@router.get("/", response_model=Union[schemas.BookPage, schemas.BookBatch])
+async def get_books(
+    request: Request,
+    ids: Optional[List[int]] = Depends(dependencies.id_list),
+    after: Optional[str] = Query(None, max_length=100, description="Cursor: the next_cursor of the previous page"),
+    limit: int = Query(utils.DEFAULT_PAGE_SIZE, ge=1, le=utils.MAX_PAGE_SIZE),
+    author_id: Optional[int] = Query(None, description="Only books by this author"),
+    published_after: Optional[date] = Query(None, description="Only books published on or after this date"),
+    published_before: Optional[date] = Query(None, description="Only books published on or before this date"),
+    sort: Literal["id", "-id", "publish_date", "-publish_date"] = Query("id", description="Prefix with - for descending order"),
+    db: AsyncSession = Depends(get_async_read_db),
+    token: str = Depends(dependencies.get_bearer_token)
+):
+    if ids is not None:
+        # Paging, filter and sort parameters don't apply; entries are shared with GET /books/{id}
+        entries = await utils.get_or_set_cache_many(
+            ids, utils.book_cache_key, lambda missing: crud.get_books_by_ids(db, missing), schemas.Book,
+            tags=lambda id: [utils.book_tag(id)], version_tag=utils.book_tag,
+        )
+        return utils.batch_response(entries, ids)
+    filters = {"author_id": author_id, "published_after": published_after, "published_before": published_before}
+    collection = utils.filtered_collection("books_list", **filters, sort=sort if sort != "id" else None)
+    filtered = any(value is not None for value in filters.values())
+
+    def page_tags(page) -> list:
+        tags = [utils.book_tag(book.id) for book in page.items]
+        if filtered or sort.endswith("publish_date"):
+            # Pages that filter or order by column values can gain or lose rows on any write
+            return tags + [utils.BOOKS_TAG, utils.BOOK_QUERIES_TAG]
+        if (sort == "id" and page.next_cursor is None) or (sort == "-id" and after is None):
+            # New books only ever land on this page
+            return tags + [utils.BOOKS_TAIL_TAG]
+        return tags
+
+    entry = await utils.get_or_build_cache(
+        utils.page_cache_key(collection, after, limit),
+        lambda session: load_books_page(session, after, limit, sort, filters),
+        db,
+        schema=schemas.BookPageItems,
+        tags=page_tags,
+        version_tag=utils.BOOKS_TAG,
+        codec=utils.PAGE_CODEC,
+    )
+    count = await utils.get_or_build_count(
+        utils.filtered_collection("books_list", **filters),
+        lambda session: crud.count_books(session, **filters),
+        db,
+        tags=[utils.BOOKS_TAG, utils.BOOK_QUERIES_TAG] if filtered else [utils.BOOKS_TAG],
+        version_tag=utils.BOOKS_TAG,
+    )
+    return utils.page_response(entry, count, request)
+
+async def load_search_page(db: AsyncSession, q: str, offset: int, limit: int):
+    books, scores, total = await crud.search_books(db, q, offset=offset, limit=limit)
+    return schemas.BookSearchPage(
+        items=[schemas.BookSearchHit(**schemas.Book.model_validate(book, from_attributes=True).model_dump(), score=score) for book, score in zip(books, scores)],
+        next_offset=offset + limit if offset + limit < total else None,
+        total=total,
+    )
+
+@router.get("/search", response_model=schemas.BookSearchPage)
+async def search_books(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200, description="Words to look for in titles and descriptions"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(utils.DEFAULT_PAGE_SIZE, ge=1, le=utils.MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_read_db),
+    token: str = Depends(dependencies.get_bearer_token)
+):
+    # Hot queries are served from the cache; create/delete evict BOOKS_TAG and edits BOOK_QUERIES_TAG
+    entry = await utils.get_or_build_cache(
+        utils.search_cache_key(q, offset, limit),
+        lambda session: load_search_page(session, q, offset, limit),
+        db,
+        schema=schemas.BookSearchPage,
+        tags=[utils.BOOKS_TAG, utils.BOOK_QUERIES_TAG],
+        version_tag=utils.BOOKS_TAG,
+    )
+    return utils.conditional_response(entry, request)
 
 @router.post("/", response_model=schemas.Book)
 async def create_book(
     book: schemas.BookCreate, 
-    db: Session = Depends(get_db), 
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db), 
     token: str = Depends(dependencies.get_bearer_token)):
-    author = db.query(models.Author).filter(models.Author.id == book.author_id).first()
+    author = await crud.get_author(db, book.author_id)
     if not author:
         raise HTTPException(status_code=404, detail="Author not found")
-    new_book = models.Book(**book.dict())
-    db.add(new_book)
-    db.commit()
-    db.refresh(new_book)
-    await utils.set_cache("books_list", None)
-    await utils.set_cache("authors_list", None)
+    new_book = await crud.create_book(db, book)
+    # The author's nested books change along with the book counts; existing pages don't
+    background_tasks.add_task(utils.invalidate_tags, utils.BOOKS_TAG, utils.BOOKS_TAIL_TAG, utils.author_tag(book.author_id))
     return new_book
 
+@router.post("/bulk", response_model=schemas.BulkResult)
+async def create_books_bulk(
+    background_tasks: BackgroundTasks,
+    books: List[schemas.BookCreate] = Body(..., min_length=1, max_length=utils.MAX_BULK_ITEMS),
+    db: AsyncSession = Depends(get_async_db),
+    token: str = Depends(dependencies.get_bearer_token)
+):
+    results = await crud.bulk_create_books(db, books)
+    author_ids = {books[result.index].author_id for result in results if result.status == "created"}
+    background_tasks.add_task(utils.invalidate_tags, utils.BOOKS_TAG, utils.BOOKS_TAIL_TAG, *[utils.author_tag(author_id) for author_id in author_ids])
+    return schemas.BulkResult(results=results)
+
+@router.patch("/bulk", response_model=schemas.BulkResult)
+async def update_books_bulk(
+    background_tasks: BackgroundTasks,
+    books: List[schemas.BookBulkUpdate] = Body(..., min_length=1, max_length=utils.MAX_BULK_ITEMS),
+    db: AsyncSession = Depends(get_async_db),
+    token: str = Depends(dependencies.get_bearer_token)
+):
+    results, author_ids = await crud.bulk_update_books(db, books)
+    tags = [utils.BOOK_QUERIES_TAG] + [utils.book_tag(result.id) for result in results if result.status == "updated"]
+    tags += [utils.author_tag(author_id) for author_id in author_ids]
+    background_tasks.add_task(utils.invalidate_tags, *tags)
+    return schemas.BulkResult(results=results)
+
+@router.delete("/bulk", response_model=schemas.BulkResult)
+async def delete_books_bulk(
+    background_tasks: BackgroundTasks,
+    book_ids: List[int] = Body(..., min_length=1, max_length=utils.MAX_BULK_ITEMS),
+    db: AsyncSession = Depends(get_async_db),
+    token: str = Depends(dependencies.get_bearer_token)
+):
+    results, author_ids = await crud.bulk_delete_books(db, book_ids)
+    tags = [utils.BOOKS_TAG] + [utils.book_tag(result.id) for result in results if result.status == "deleted"]
+    tags += [utils.author_tag(author_id) for author_id in author_ids]
+    background_tasks.add_task(utils.invalidate_tags, *tags)
+    return schemas.BulkResult(results=results)
+
 @router.get("/{id}", response_model=schemas.Book)
-async def get_book(id: int, db: Session = Depends(get_db), token: str = Depends(dependencies.get_bearer_token)):
-    book = db.query(models.Book).filter(models.Book.id == id).first()
-    if not book:
+async def get_book(id: int, request: Request, db: AsyncSession = Depends(get_async_read_db), token: str = Depends(dependencies.get_bearer_token)):
+    entry = await utils.get_or_set_cache(utils.book_cache_key(id), lambda: crud.get_book(db, id), schemas.Book, tags=[utils.book_tag(id)], version_tag=utils.book_tag(id))
+    if not entry:
         raise HTTPException(status_code=404, detail="Book not found")
-    return book
+    return utils.conditional_response(entry, request)
 
 @router.put("/{id}", response_model=schemas.Book)
-async def update_book(id: int, book: schemas.BookCreate, db: Session = Depends(get_db), token: str = Depends(dependencies.get_bearer_token)):
-    db_book = db.query(models.Book).filter(models.Book.id == id).first()
+async def update_book(id: int, book: schemas.BookCreate, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_db), token: str = Depends(dependencies.get_bearer_token)):
+    db_book = await crud.get_book(db, id)
     if not db_book:
         raise HTTPException(status_code=404, detail="Book not found")
-    for key, value in book.dict().items():
-        setattr(db_book, key, value)
-    db.commit()
-    db.refresh(db_book)
-    await utils.set_cache("books_list", None)
-    await utils.set_cache("authors_list", None)
+    # Both the previous and the new author embed this book
+    tags = [utils.book_tag(id), utils.author_tag(db_book.author_id), utils.author_tag(book.author_id), utils.BOOK_QUERIES_TAG]
+    db_book = await crud.update_book(db, id, book)
+    background_tasks.add_task(utils.invalidate_tags, *tags)
     return db_book
 
 @router.delete("/{id}")
-async def delete_book(id: int, db: Session = Depends(get_db), token: str = Depends(dependencies.get_bearer_token)):
-    db_book = db.query(models.Book).filter(models.Book.id == id).first()
+async def delete_book(id: int, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_db), token: str = Depends(dependencies.get_bearer_token)):
+    db_book = await crud.get_book(db, id)
     if not db_book:
         raise HTTPException(status_code=404, detail="Book not found")
-    db.delete(db_book)
-    db.commit()
-    await utils.set_cache("books_list", None)
-    await utils.set_cache("authors_list", None)
+    tags = [utils.BOOKS_TAG, utils.book_tag(id), utils.author_tag(db_book.author_id)]
+    await crud.delete_book(db, id)
+    background_tasks.add_task(utils.invalidate_tags, *tags)
     return {"message": "Book deleted successfully"}
@@ -0,0 +1,74 @@
+import csv
+import io
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import crud, models, dependencies, utils
+from app.database import get_async_read_db
+from typing import Literal, Optional
+
+router = APIRouter(
+    prefix="/export",
+    tags=["export"]
+)
+
+EXPORT_BATCH_SIZE = 1000  # Rows fetched from the server-side cursor per chunk
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+def select_columns(model, columns: Optional[str]):
+    available = {column.name: column for column in model.__table__.columns}
+    if not columns:
+        return list(available.values())
+    names = [name.strip() for name in columns.split(",") if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown or not names:
+        raise HTTPException(status_code=422, detail=f"Unknown columns {unknown}, expected some of {list(available)}")
+    return [available[name] for name in names]
+
+def ndjson_chunk(names: list, rows) -> str:
+    return "".join(json.dumps(dict(zip(names, utils.serialize_value(list(row))))) + "\n" for row in rows)
+
+def csv_chunk(rows) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+def export_response(model, format: str, since: Optional[int], columns: Optional[str], db: AsyncSession):
+    selected = select_columns(model, columns)
+    names = [column.name for column in selected]
+
+    async def stream():
+        # Memory stays flat: only one batch of rows is held at a time. The session is
+        # closed by get_async_read_db once the whole body has been sent.
+        if format == "csv":
+            yield csv_chunk([names])
+        async for rows in crud.stream_rows(db, selected, since, EXPORT_BATCH_SIZE):
+            yield csv_chunk(rows) if format == "csv" else ndjson_chunk(names, rows)
+
+    filename = f"{model.__tablename__}.{format}"
+    return StreamingResponse(
+        stream(),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.get("/authors")
+async def export_authors(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    since: Optional[int] = Query(None, ge=0, description="Only export authors with an id greater than this (the last id of a previous export)"),
+    columns: Optional[str] = Query(None, description="Comma-separated columns, e.g. id,name"),
+    db: AsyncSession = Depends(get_async_read_db),
+    token: str = Depends(dependencies.get_bearer_token)
+):
+    return export_response(models.Author, format, since, columns, db)
+
+@router.get("/books")
+async def export_books(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    since: Optional[int] = Query(None, ge=0, description="Only export books with an id greater than this (the last id of a previous export)"),
+    columns: Optional[str] = Query(None, description="Comma-separated columns, e.g. id,title,author_id"),
+    db: AsyncSession = Depends(get_async_read_db),
+    token: str = Depends(dependencies.get_bearer_token)
+):
+    return export_response(models.Book, format, since, columns, db)
@@ -0,0 +1,56 @@
+import io
+from fastapi import APIRouter, Depends, File, Query, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import dependencies, importer, schemas
+from app.database import get_async_db
+from typing import Literal, Optional
+
+router = APIRouter(
+    prefix="/import",
+    tags=["import"]
+)
+
+def import_response(target: str, file: UploadFile, format: Optional[str], batch_size: int, db: AsyncSession):
+    text = io.TextIOWrapper(file.file, encoding="utf-8", errors=importer.TEXT_ERRORS, newline="")
+    batches = importer.read_batches(text, format or importer.detect_format(file.filename), batch_size)
+
+    async def progress():
+        # One NDJSON progress line per committed batch, then the full report
+        report = schemas.ImportReport()
+        author_ids = set()
+        try:
+            while True:
+                # Parsing reads the spooled upload from disk; keep it off the event loop
+                batch = await run_in_threadpool(next, batches, None)
+                if batch is None:
+                    break
+                author_ids |= await importer.import_batch(db, target, batch, report)
+                yield report.model_dump_json(exclude={"errors"}) + "\n"
+        finally:
+            # Also when the import fails or the client disconnects: earlier batches are committed
+            await importer.invalidate_after_import(target, author_ids)
+        yield report.model_dump_json() + "\n"
+
+    return StreamingResponse(progress(), media_type="application/x-ndjson")
+
+@router.post("/authors")
+async def import_authors(
+    file: UploadFile = File(..., description="NDJSON or CSV with name, bio, birth_date"),
+    format: Optional[Literal["ndjson", "csv"]] = Query(None, description="Defaults to the file extension"),
+    batch_size: int = Query(importer.DEFAULT_BATCH_SIZE, ge=1, le=importer.MAX_BATCH_SIZE),
+    db: AsyncSession = Depends(get_async_db),
+    token: str = Depends(dependencies.get_bearer_token)
+):
+    return import_response("authors", file, format, batch_size, db)
+
+@router.post("/books")
+async def import_books(
+    file: UploadFile = File(..., description="NDJSON or CSV with title, description, publish_date, author_id"),
+    format: Optional[Literal["ndjson", "csv"]] = Query(None, description="Defaults to the file extension"),
+    batch_size: int = Query(importer.DEFAULT_BATCH_SIZE, ge=1, le=importer.MAX_BATCH_SIZE),
+    db: AsyncSession = Depends(get_async_db),
+    token: str = Depends(dependencies.get_bearer_token)
+):
+    return import_response("books", file, format, batch_size, db)
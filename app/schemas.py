@@ -1,5 +1,6 @@
-from pydantic import BaseModel
-from typing import List, Optional
+import functools
+from pydantic import BaseModel, ConfigDict, create_model
+from typing import List, Optional, Union
 from datetime import date
 
 class BookBase(BaseModel):
@@ -11,11 +12,39 @@ class BookBase(BaseModel):
 class BookCreate(BookBase):
     pass
 
+class BookUpdate(BookBase):
+    pass
+
 class Book(BookBase):
     id: int
-    class Config:
-        orm_mode = True
-        from_attributes = True  
+    model_config = ConfigDict(from_attributes=True)
+
+class BookBulkUpdate(BaseModel):
+    id: int
+    title: Optional[str] = None
+    description: Optional[str] = None
+    publish_date: Optional[date] = None
+    author_id: Optional[int] = None
+
+class BookPageItems(BaseModel):
+    """What a cached page holds; responses add ``total`` from the cached count."""
+    items: List[Book]
+    next_cursor: Optional[Union[int, str]] = None  # An id, or opaque when sorting by date
+
+class BookPage(BookPageItems):
+    total: int
+
+class BookBatch(BaseModel):
+    items: List[Book]
+    missing: List[int]
+
+class BookSearchHit(Book):
+    score: float
+
+class BookSearchPage(BaseModel):
+    items: List[BookSearchHit]
+    next_offset: Optional[int] = None
+    total: int
 
 class AuthorBase(BaseModel):
     name: str
@@ -25,9 +54,84 @@ class AuthorBase(BaseModel):
 class AuthorCreate(AuthorBase):
     pass
 
+class AuthorUpdate(AuthorBase):
+    pass
+
 class Author(AuthorBase):
     id: int
+    book_count: int = 0
+
+    model_config = ConfigDict(from_attributes=True)
+
+class AuthorWithBooks(Author):
     books: List[Book] = []
 
-    class Config:
-        orm_mode = True
+# Columns ?fields= can pick from; id is always included
+AUTHOR_FIELDS = ("id", "name", "bio", "birth_date", "book_count")
+
+class AuthorBulkUpdate(BaseModel):
+    id: int
+    name: Optional[str] = None
+    bio: Optional[str] = None
+    birth_date: Optional[date] = None
+
+class AuthorStats(BaseModel):
+    author_id: int
+    book_count: int
+    first_publish_date: Optional[date]
+    last_publish_date: Optional[date]
+
+    model_config = ConfigDict(from_attributes=True)
+
+class AuthorPageItems(BaseModel):
+    """What a cached page holds; responses add ``total`` from the cached count."""
+    items: List[Author]
+    next_cursor: Optional[int] = None
+
+class AuthorPage(AuthorPageItems):
+    total: int
+
+class AuthorBatch(BaseModel):
+    items: List[Author]
+    missing: List[int]
+
+@functools.lru_cache(maxsize=None)
+def author_schema(fields: tuple = None, with_books: bool = False):
+    """Author response model with only ``fields`` (all when None), plus nested ``books`` if asked for."""
+    if fields is None:
+        return AuthorWithBooks if with_books else Author
+    definitions = {name: (Author.model_fields[name].annotation, ...) for name in fields}
+    if with_books:
+        definitions["books"] = (List[Book], [])
+    name = "Author_" + "_".join(fields) + ("_books" if with_books else "")
+    return create_model(name, __config__=ConfigDict(from_attributes=True), **definitions)
+
+@functools.lru_cache(maxsize=None)
+def author_page_schema(item_schema):
+    """Cached page model for ``item_schema``, without the total (see ``AuthorPageItems``)."""
+    if item_schema is Author:
+        return AuthorPageItems
+    return create_model(
+        f"{item_schema.__name__}PageItems",
+        items=(List[item_schema], ...),
+        next_cursor=(Optional[int], None),
+    )
+
+class BulkItemResult(BaseModel):
+    index: int
+    id: Optional[int] = None
+    status: str  # created, updated, deleted or error
+    detail: Optional[str] = None
+
+class BulkResult(BaseModel):
+    results: List[BulkItemResult]
+
+class ImportRowError(BaseModel):
+    line: int
+    detail: str
+
+class ImportReport(BaseModel):
+    processed: int = 0
+    inserted: int = 0
+    failed: int = 0
+    errors: List[ImportRowError] = []  # The first MAX_REPORTED_ERRORS only
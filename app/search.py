@@ -0,0 +1,88 @@
+# search.py
+import math
+import re
+from collections import Counter, defaultdict
+
+TITLE_WEIGHT = 2  # A term in the title counts as much as two in the description
+_TOKEN = re.compile(r"\w+")
+
+def tokenize(text: str) -> list:
+    return _TOKEN.findall((text or "").lower())
+
+class BookSearchIndex:
+    """In-process inverted index over book titles and descriptions.
+
+    Stands in for the MySQL FULLTEXT index when the database is SQLite (tests, local
+    development). It is filled from the database on the first search (``load``) and
+    then kept current by the book write paths in ``crud``; until it is loaded, updates
+    are ignored. Ranking is tf-idf with title terms weighted by ``TITLE_WEIGHT``;
+    like MySQL's natural language mode, a book matches if it has any query term.
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self.generation = 0  # Bumped by every update, so a load can detect concurrent writes
+        self._fields = {}  # book_id -> (title, description)
+        self._postings = defaultdict(dict)  # term -> {book_id: weighted term frequency}
+
+    def load(self, rows):
+        """Replace the contents with ``(id, title, description)`` rows."""
+        self._fields.clear()
+        self._postings.clear()
+        for book_id, title, description in rows:
+            self._add(book_id, title, description)
+        self.loaded = True
+
+    def reset(self):
+        """Forget everything; the next search reloads from the database."""
+        self.loaded = False
+        self.generation += 1
+        self._fields.clear()
+        self._postings.clear()
+
+    def update(self, book_id: int, **fields):
+        """Index a new book or re-index the given ``title``/``description`` of an existing one."""
+        self.generation += 1
+        if not self.loaded:
+            return
+        title, description = self._fields.get(book_id, (None, None))
+        self.remove(book_id)
+        self._add(book_id, fields.get("title", title), fields.get("description", description))
+
+    def remove(self, *book_ids: int):
+        self.generation += 1
+        for book_id in book_ids:
+            fields = self._fields.pop(book_id, None)
+            if fields is None:
+                continue
+            for term in self._terms(*fields):
+                postings = self._postings[term]
+                postings.pop(book_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def search(self, query: str):
+        """Return ``[(book_id, score)]`` for every matching book, best first (ties by id)."""
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + len(self._fields) / len(postings))
+            for book_id, frequency in postings.items():
+                scores[book_id] += frequency * idf
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def _add(self, book_id: int, title: str, description: str):
+        self._fields[book_id] = (title, description)
+        for term, frequency in self._terms(title, description).items():
+            self._postings[term][book_id] = frequency
+
+    @staticmethod
+    def _terms(title: str, description: str) -> Counter:
+        terms = Counter(tokenize(description))
+        for term in tokenize(title):
+            terms[term] += TITLE_WEIGHT
+        return terms
+
+book_index = BookSearchIndex()
@@ -0,0 +1,108 @@
+# tracing.py
+"""Opt-in per-request SQL tracing (QUERY_TRACE=1), for development and debugging.
+
+Every statement run while a request is handled is counted and timed; responses get
+``X-Query-Count`` and ``X-DB-Time`` (milliseconds) headers, and slow statements or
+the same statement repeated many times in one request (the N+1 pattern) are logged.
+"""
+import logging
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+QUERY_TRACE = os.getenv("QUERY_TRACE", "0") == "1"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+# The same SQL this many times in one request is reported as a likely N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+class QueryTrace:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0  # Seconds
+        self.statements = Counter()  # SQL text (parameters are bound separately) -> executions
+        self.slow = []  # (milliseconds, statement)
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.duration += elapsed
+        self.statements[statement] += 1
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            self.slow.append((elapsed * 1000, statement))
+
+    def repeated(self) -> list:
+        return [(statement, count) for statement, count in self.statements.most_common() if count >= N_PLUS_ONE_THRESHOLD]
+
+    def summary(self) -> str:
+        return "\n".join(f"{count}x {statement}" for statement, count in self.statements.most_common())
+
+_current_trace = ContextVar("query_trace", default=None)
+
+@contextmanager
+def trace_queries():
+    """Record the statements run in this context (SQLAlchemy's greenlets share it)."""
+    trace = QueryTrace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+# Listening on the Engine class covers every engine, including ones created by tests.
+# Outside a trace the cost is a single ContextVar lookup.
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    if _current_trace.get() is not None and context is not None:
+        context._trace_start = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _stop_timer(conn, cursor, statement, parameters, context, executemany):
+    trace = _current_trace.get()
+    start = getattr(context, "_trace_start", None)
+    if trace is not None and start is not None:
+        trace.record(statement, time.perf_counter() - start)
+
+def log_trace(request_line: str, trace: QueryTrace):
+    for elapsed, statement in trace.slow:
+        logger.warning("Slow query (%.1f ms) in %s: %s", elapsed, request_line, statement)
+    for statement, count in trace.repeated():
+        logger.warning("Possible N+1 in %s: %d executions of %s", request_line, count, statement)
+
+# Called with (request line, trace) after each traced request; tests add collectors
+REPORTERS = [log_trace]
+
+class QueryTraceMiddleware:
+    """Trace each request's SQL when QUERY_TRACE is on; otherwise pass requests straight through.
+
+    Headers are sent before a streamed body, so they cover only the statements run
+    up to that point; the reporters see the whole request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not QUERY_TRACE:
+            await self.app(scope, receive, send)
+            return
+
+        with trace_queries() as trace:
+            async def send_with_headers(message):
+                if message["type"] == "http.response.start":
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-query-count", str(trace.count).encode()),
+                        (b"x-db-time", f"{trace.duration * 1000:.3f}".encode()),
+                    ]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_headers)
+            finally:
+                request_line = f"{scope['method']} {scope['path']}"
+                for report in REPORTERS:
+                    report(request_line, trace)
@@ -1,9 +1,57 @@
 # utils.py
+import asyncio
+import functools
 import json
+import logging
+import os
+import time
+import uuid
 from datetime import date, datetime
+from typing import NamedTuple, Optional
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from redis.exceptions import ConnectionError as RedisConnectionError, RedisError, TimeoutError as RedisTimeoutError
+from app import codecs, database, metrics
+from app.breaker import CircuitBreaker
+from app.config import settings
 from app.database import get_redis
+from app.local_cache import LocalCache
 
-CACHE_EXPIRE_TIME = 60 * 5  # Cache expires after 5 minutes
+logger = logging.getLogger(__name__)
+
+CACHE_EXPIRE_TIME = 60 * 5  # Cache expires after 5 minutes (hard TTL)
+# Soft TTL for rebuildable entries: once passed, the stale value is served while one
+# background task rebuilds it. 0 disables stale-while-revalidate.
+CACHE_SOFT_TTL = int(os.getenv("CACHE_SOFT_TTL", "0"))
+REBUILD_LOCK_TIMEOUT = 10  # Seconds a worker may hold a rebuild lock
+REBUILD_WAIT_TIMEOUT = 2  # Seconds to wait for another worker's rebuild before querying ourselves
+REBUILD_POLL_INTERVAL = 0.05
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_BULK_ITEMS = 5000  # Per request on the /bulk endpoints
+MAX_BATCH_IDS = 100  # Per ?ids= multi-get
+# How cached bodies are stored and served: json, gzip, zstd or msgpack (see app/codecs.py)
+CACHE_CODEC = os.getenv("CACHE_CODEC", "json")
+# List pages and counts get a total spliced in on every hit, so they stay plain JSON
+PAGE_CODEC = codecs.JSONCodec.name
+
+# Optional in-process tier in front of Redis. LOCAL_CACHE_SIZE=0 (default) disables it.
+LOCAL_CACHE_SIZE = int(os.getenv("LOCAL_CACHE_SIZE", "0"))
+LOCAL_CACHE_MAX_BYTES = int(os.getenv("LOCAL_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+LOCAL_CACHE_TTL = float(os.getenv("LOCAL_CACHE_TTL", "30"))
+CACHE_INVALIDATION_CHANNEL = "cache:invalidate"
+WORKER_ID = uuid.uuid4().hex  # Lets a worker ignore its own invalidation messages
+
+local_cache = LocalCache(LOCAL_CACHE_SIZE, LOCAL_CACHE_MAX_BYTES, LOCAL_CACHE_TTL) if LOCAL_CACHE_SIZE else None
+_invalidation_listener = None
+
+# Redis is an optimization: when it's slow or down, requests go to the database instead
+redis_breaker = CircuitBreaker("redis", settings.redis_breaker_failures, settings.redis_breaker_cooldown)
+UNAVAILABLE = object()  # What redis_call returns by default when Redis didn't answer
+REDIS_FAILURES = (RedisConnectionError, RedisTimeoutError, OSError, asyncio.TimeoutError)
+# Tags whose eviction failed while Redis was unreachable, evicted once it answers again
+MAX_MISSED_TAGS = 10000
+_missed_tags = set()
 
 def serialize_value(value):
     """Recursively convert dates and datetimes to ISO format strings."""
@@ -15,33 +63,672 @@ def serialize_value(value):
         return value.isoformat()  # Convert date / datetime to ISO format string
     return value
 
-async def get_cache(key: str):
-    redis = await get_redis()
-    cached_data = await redis.get(key)
-    if cached_data:
-        return json.loads(cached_data)
-    return None
+class CachedEntry(NamedTuple):
+    """A cached response body: the codec-encoded bytes and when they were built.
 
-async def set_cache(key: str, value):
-    redis = await get_redis()
-    if value is not None:
+    ``version`` is the counter of ``version_tag`` read before the body was built; it
+    is the entry's ETag (see ``entry_etag``), so the ETag always matches the body.
+    ``clock`` is its collection's clock at that moment, used once to guard the store
+    and not cached.
+    """
+    body: bytes
+    codec: str
+    built_at: float
+    version_tag: Optional[str] = None
+    version: Optional[str] = None
+    clock: Optional[str] = None
+
+@functools.lru_cache(maxsize=None)
+def type_adapter(schema):
+    return TypeAdapter(schema)
+
+def encode_entry(value, schema=None, built_at: float = None, version_tag: str = None, version: str = None, codec: str = None, clock: str = None) -> CachedEntry:
+    """Encode ``value`` into the final response bytes with ``codec`` (default: the configured one).
+
+    With a ``schema`` (e.g. ``schemas.Author`` or ``List[schemas.Book]``) pydantic
+    validates ORM objects and dumps JSON in one pass; other values go through
+    ``serialize_value``.
+    """
+    if schema is not None:
+        adapter = type_adapter(schema)
+        body = adapter.dump_json(adapter.validate_python(value, from_attributes=True))
+    else:
         if isinstance(value, list):
             value_to_cache = [serialize_value(item_to_dict(item)) for item in value]
         else:
             value_to_cache = serialize_value(item_to_dict(value))
+        body = json.dumps(value_to_cache).encode()
+    codec = codecs.get_codec(codec or CACHE_CODEC)
+    return CachedEntry(codec.encode(body), codec.name, time.time() if built_at is None else built_at, version_tag, version, clock)
 
-        await redis.set(key, json.dumps(value_to_cache))
-        await redis.expire(key, CACHE_EXPIRE_TIME)
+def decode_entry(entry: CachedEntry):
+    return json.loads(codecs.get_codec(entry.codec).decode(entry.body))
+
+def pack_entry(entry: CachedEntry) -> bytes:
+    return f"{entry.codec} {entry.built_at!r} {entry.version_tag or '-'} {entry.version or '-'}\n".encode() + entry.body
+
+def unpack_entry(data: bytes) -> CachedEntry:
+    header, body = data.split(b"\n", 1)
+    codec, built_at, *version = header.decode().split(" ")
+    version_tag, version = [None if part == "-" else part for part in version] or [None, None]
+    return CachedEntry(body, codec, float(built_at), version_tag, version)
+
+def cached_response(entry: CachedEntry, request: Request, etag: str = None) -> Response:
+    """Send a cached body without re-validating it, decoding only if the client can't take it as stored."""
+    codec = codecs.get_codec(entry.codec)
+    headers = {"ETag": etag} if etag else {}
+    if codecs.accepts(codec, request.headers.get("accept"), request.headers.get("accept-encoding")):
+        body, media_type = entry.body, codec.media_type
+        if codec.content_encoding:
+            headers["Content-Encoding"] = codec.content_encoding
     else:
-        await redis.delete(key)
+        body, media_type = codec.decode(entry.body), codecs.JSONCodec.media_type
+    if codec.name != codecs.JSONCodec.name:
+        headers["Vary"] = "Accept, Accept-Encoding"
+    return Response(content=body, media_type=media_type, headers=headers)
+
+async def redis_call(operation: str, command, default=UNAVAILABLE):
+    """Await ``command(redis)`` through the breaker, within ``redis_command_timeout``.
+
+    Returns ``default`` instead of raising when Redis can't be reached or is too slow,
+    and without calling it at all while the breaker is open.
+    """
+    if not redis_breaker.allow():
+        metrics.REDIS_SKIPPED.labels(operation).inc()
+        return default
+    try:
+        with metrics.redis_timer(operation):
+            result = await asyncio.wait_for(command(await get_redis()), settings.redis_command_timeout)
+    except REDIS_FAILURES as exc:
+        redis_breaker.record_failure()
+        metrics.REDIS_ERRORS.labels(operation).inc()
+        logger.warning("Redis %s failed, using the database: %r", operation, exc)
+        return default
+    except BaseException:
+        redis_breaker.release()
+        raise
+    redis_breaker.record_success()
+    if _missed_tags:
+        _replay_missed_invalidations()
+    return result
+
+async def get_cache(key: str):
+    if database.reading_own_writes.get():
+        metrics.record_lookup(key, "bypass")
+        return None
+    if local_cache is not None:
+        entry = local_cache.get(key)
+        if entry is not None:
+            metrics.record_lookup(key, "local_hit")
+            return entry
+    cached_data = await redis_call("get", lambda redis: redis.get(key))
+    if cached_data is UNAVAILABLE:
+        metrics.record_lookup(key, "unavailable")
+        return None
+    if cached_data:
+        metrics.record_lookup(key, "hit")
+        entry = unpack_entry(cached_data)
+        if local_cache is not None:
+            local_cache.set(key, entry, len(entry.body))
+        return entry
+    metrics.record_lookup(key, "miss")
+    return None
+
+async def get_cache_many(keys: list) -> list:
+    """``get_cache`` for several keys: the entries (``None`` for misses) in the order of ``keys``.
+
+    Keys not in the local tier are read with a single MGET.
+    """
+    if database.reading_own_writes.get():
+        for key in keys:
+            metrics.record_lookup(key, "bypass")
+        return [None] * len(keys)
+    entries = [local_cache.get(key) if local_cache is not None else None for key in keys]
+    remote = []
+    for index, (key, entry) in enumerate(zip(keys, entries)):
+        if entry is not None:
+            metrics.record_lookup(key, "local_hit")
+        else:
+            remote.append(index)
+    if not remote:
+        return entries
+    values = await redis_call("mget", lambda redis: redis.mget([keys[index] for index in remote]))
+    if values is UNAVAILABLE:
+        for index in remote:
+            metrics.record_lookup(keys[index], "unavailable")
+        return entries
+    for index, cached_data in zip(remote, values):
+        if cached_data:
+            metrics.record_lookup(keys[index], "hit")
+            entries[index] = unpack_entry(cached_data)
+            if local_cache is not None:
+                local_cache.set(keys[index], entries[index], len(entries[index].body))
+        else:
+            metrics.record_lookup(keys[index], "miss")
+    return entries
+
+async def set_cache(key: str, value, tags=(), schema=None):
+    """Cache ``value`` (a ``CachedEntry`` or anything ``encode_entry`` takes); ``None`` deletes the key.
+
+    ``tags`` name the rows the entry was built from (see ``author_tag``/``book_tag``);
+    ``invalidate_tags`` evicts every entry carrying one of them.
+    """
+    if value is not None:
+        entry = value if isinstance(value, CachedEntry) else encode_entry(value, schema)
+        await set_cache_many({key: (entry, tags)})
+        return entry
+    else:
+        await redis_call("delete", lambda redis: redis.delete(key))
+        await publish_invalidation(key)
+
+# Stores an entry and adds it to its tag sets, unless one of those tags was invalidated
+# after the build read its collection's clock: the write may have landed after the rows
+# were read. Writes to other rows of the collection don't hold the entry back.
+# KEYS: entry, epoch, invalidation marks..., tag sets...
+# ARGV: packed entry, TTL, epoch ('' to skip the check), clock, number of marks
+SET_ENTRY_SCRIPT = """
+local mark_count = tonumber(ARGV[5])
+if ARGV[3] ~= '' then
+    if redis.call('get', KEYS[2]) ~= ARGV[3] then
+        return 0
+    end
+    local clock = tonumber(ARGV[4])
+    for i = 3, 2 + mark_count do
+        if tonumber(redis.call('get', KEYS[i]) or '0') > clock then
+            return 0
+        end
+    end
+end
+redis.call('set', KEYS[1], ARGV[1], 'EX', ARGV[2])
+for i = 3 + mark_count, #KEYS do
+    redis.call('sadd', KEYS[i], KEYS[1])
+    redis.call('expire', KEYS[i], ARGV[2])
+end
+return 1
+"""
+
+async def set_cache_many(entries: dict):
+    """Store ``{key: (CachedEntry, tags)}`` with one pipelined round trip.
+
+    Entries built with a ``clock`` are dropped rather than cached over a write's
+    eviction when one of their tags was invalidated during the build.
+    """
+    async def write(redis):
+        async with redis.pipeline(transaction=False) as pipe:
+            for key, (entry, tags) in entries.items():
+                epoch, clock = entry.clock.split(".") if entry.clock else ("", "")
+                marks = [invalidated_key(tag) for tag in tags] if entry.clock else []
+                tag_keys = [tag_members_key(tag) for tag in tags]
+                pipe.eval(
+                    SET_ENTRY_SCRIPT, 2 + len(marks) + len(tag_keys), key, VERSION_EPOCH_KEY, *marks, *tag_keys,
+                    pack_entry(entry), CACHE_EXPIRE_TIME, epoch, clock, len(marks),
+                )
+            return await pipe.execute()
+
+    # Without Redis other workers couldn't be told to evict them, so keep them out of the local tier too
+    stored = await redis_call("set", write) if entries else UNAVAILABLE
+    if stored is UNAVAILABLE:
+        return
+    stored = {key: entry for (key, (entry, _)), ok in zip(entries.items(), stored) if ok}
+    await publish_invalidation(*stored)
+    if local_cache is not None:
+        for key, entry in stored.items():
+            local_cache.set(key, entry, len(entry.body))
+
+async def publish_invalidation(*keys: str):
+    """Drop ``keys`` from the local tier of this and every other worker."""
+    if local_cache is None or not keys:
+        return
+    local_cache.delete(*keys)
+    message = json.dumps({"origin": WORKER_ID, "keys": list(keys)})
+    await redis_call("publish", lambda redis: redis.publish(CACHE_INVALIDATION_CHANNEL, message))
+
+async def listen_for_invalidations():
+    """Evict keys published by other workers until cancelled, resubscribing on errors."""
+    while True:
+        try:
+            redis = await get_redis()
+            pubsub = redis.pubsub()
+            await pubsub.subscribe(CACHE_INVALIDATION_CHANNEL)
+            try:
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    data = json.loads(message["data"])
+                    if data["origin"] != WORKER_ID:
+                        local_cache.delete(*data["keys"])
+            finally:
+                await pubsub.aclose()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Cache invalidation listener failed, resubscribing")
+        # Messages may have been missed while disconnected
+        local_cache.clear()
+        await asyncio.sleep(1)
+
+def start_invalidation_listener():
+    global _invalidation_listener
+    if local_cache is not None and _invalidation_listener is None:
+        _invalidation_listener = asyncio.create_task(listen_for_invalidations())
+
+async def stop_invalidation_listener():
+    global _invalidation_listener
+    if _invalidation_listener is not None:
+        _invalidation_listener.cancel()
+        try:
+            await _invalidation_listener
+        except asyncio.CancelledError:
+            pass
+        _invalidation_listener = None
+
+def local_cache_stats() -> dict:
+    if local_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **local_cache.stats()}
+
+async def get_or_set_cache(key: str, loader, schema=None, tags=(), version_tag: str = None):
+    """Read-through lookup: return the cached entry or await ``loader()`` and cache its result.
+
+    Returns ``None`` without caching anything when the loader finds nothing. With a
+    ``version_tag`` the entry carries that tag's version, read before loading.
+    """
+    cached = await get_cache(key)
+    if cached is not None:
+        return cached
+    version, clock = (await build_versions(version_tag))[0] if version_tag else (None, None)
+    value = await loader()
+    if value is None:
+        return None
+    entry = encode_entry(value, schema, version_tag=version_tag, version=version, clock=clock)
+    await set_cache(key, entry, tags=tags)
+    return entry
+
+async def get_or_set_cache_many(ids: list, cache_key, loader, schema=None, tags=None, version_tag=None) -> dict:
+    """Multi-get read-through: ``{id: CachedEntry}`` for those of ``ids`` that exist.
+
+    One MGET reads the per-id entries (the same keys as the single-item endpoints),
+    ``loader(missing_ids)`` loads all misses at once (one ``IN`` query), and one
+    pipeline caches them. ``cache_key(id)``, ``tags(id)`` and ``version_tag(id)``
+    name each entry, its tags and the tag it takes its version from.
+    """
+    keys = [cache_key(id) for id in ids]
+    entries = dict(zip(ids, await get_cache_many(keys)))
+    missing = [id for id, entry in entries.items() if entry is None]
+    if missing:
+        version_tags = {id: version_tag(id) for id in missing} if version_tag else {}
+        versions = dict(zip(version_tags, await build_versions(*version_tags.values()))) if version_tags else {}
+        built = {}
+        for row in await loader(missing):
+            version, clock = versions.get(row.id, (None, None))
+            built[row.id] = encode_entry(row, schema, version_tag=version_tags.get(row.id), version=version, clock=clock)
+        await set_cache_many({cache_key(id): (entry, tags(id) if tags else ()) for id, entry in built.items()})
+        entries.update(built)
+    return {id: entry for id, entry in entries.items() if entry is not None}
+
+def batch_response(entries: dict, ids: list) -> Response:
+    """``{"items": [...], "missing": [...]}`` in the order of ``ids``, spliced from the cached bodies."""
+    items = b",".join(codecs.get_codec(entries[id].codec).decode(entries[id].body) for id in ids if id in entries)
+    missing = json.dumps([id for id in ids if id not in entries]).encode()
+    return Response(content=b'{"items":[' + items + b'],"missing":' + missing + b"}", media_type=codecs.JSONCodec.media_type)
+
+# Rebuilds running in this process, keyed by cache key
+_inflight = {}
+_background_tasks = set()
+
+async def get_or_build_cache(key: str, loader, db, schema=None, tags=(), version_tag: str = None, codec: str = None) -> CachedEntry:
+    """Single-flight read-through for entries that are expensive to rebuild.
+
+    ``loader(db)`` runs at most once per key at a time: concurrent requests in this
+    process await the same future, and other workers wait on a Redis lock and pick
+    up the rebuilt entry. With ``CACHE_SOFT_TTL`` set, entries older than the soft
+    TTL are still served while a background task rebuilds them. ``tags`` may be a
+    callable that derives the tags from the loaded value. With a ``version_tag`` the
+    entry carries that tag's version, read before loading. ``codec`` overrides
+    ``CACHE_CODEC`` for this entry.
+    """
+    async def build(session):
+        version, clock = (await build_versions(version_tag))[0] if version_tag else (None, None)
+        value = await loader(session)
+        entry = encode_entry(value, schema, version_tag=version_tag, version=version, codec=codec, clock=clock)
+        return entry, tags(value) if callable(tags) else tags
+
+    if database.reading_own_writes.get():
+        # Read from the primary, replacing whatever was cached from the replica. Not
+        # single-flight: a concurrent rebuild in this process may be reading the replica.
+        entry, entry_tags = await build(db)
+        metrics.record_lookup(key, "bypass")
+        await set_cache(key, entry, tags=entry_tags)
+        return entry
+    entry = await get_cache(key)
+    if entry is not None:
+        if CACHE_SOFT_TTL and time.time() - entry.built_at > CACHE_SOFT_TTL:
+            schedule_refresh(key, build)
+        return entry
+    return await _single_flight(key, lambda: build(db))
+
+def schedule_refresh(key: str, build):
+    """Rebuild ``key`` in the background with its own session, unless a rebuild is running."""
+    if key in _inflight:
+        return
+    task = asyncio.create_task(_refresh(key, build))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+async def _refresh(key: str, build):
+    try:
+        # Another worker is already rebuilding it (or Redis is down, and the result couldn't be cached)
+        if await redis_call("exists", lambda redis: redis.exists(rebuild_lock_key(key)), default=True):
+            return
+        async with database.AsyncSessionLocal() as db:
+            await _single_flight(key, lambda: build(db))
+    except Exception:
+        logger.exception("Background refresh of %s failed", key)
+
+async def _single_flight(key: str, build):
+    future = _inflight.get(key)
+    if future is not None:
+        return await asyncio.shield(future)
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        value = await _rebuild(key, build)
+        future.set_result(value)
+        return value
+    except BaseException as exc:
+        future.set_exception(exc)
+        future.exception()  # Waiters re-raise it; don't warn when there are none
+        raise
+    finally:
+        del _inflight[key]
+
+def rebuild_lock_key(key: str) -> str:
+    return f"lock:{key}"
+
+# Deletes the lock only if it still holds our token, in one step: the lock may have
+# expired and been taken by another worker between a GET and a DELETE.
+# KEYS: lock  ARGV: token
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+async def _rebuild(key: str, build):
+    lock_key = rebuild_lock_key(key)
+    token = uuid.uuid4().hex.encode()
+    acquired = await redis_call("lock", lambda redis: redis.set(lock_key, token, nx=True, ex=REBUILD_LOCK_TIMEOUT))
+    if acquired is UNAVAILABLE:
+        # Nothing to share the result through: serve it straight from the database
+        entry, _ = await build()
+        return entry
+    if acquired:
+        try:
+            entry, tags = await build()
+            await set_cache(key, entry, tags=tags)
+            return entry
+        finally:
+            await redis_call("lock", lambda redis: redis.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token))
+    # Another worker holds the lock: wait for its result rather than hitting the database too
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + REBUILD_WAIT_TIMEOUT
+    while loop.time() < deadline:
+        await asyncio.sleep(REBUILD_POLL_INTERVAL)
+        entry = await get_cache(key)
+        if entry is not None:
+            return entry
+        if redis_breaker.state == CircuitBreaker.OPEN:
+            break  # Its result can't reach us through Redis anyway
+    entry, _ = await build()
+    return entry
+
+def author_cache_key(author_id: int) -> str:
+    return f"author:{author_id}"
+
+def author_books_cache_key(author_id: int) -> str:
+    return f"author:{author_id}:books"
+
+def author_stats_cache_key(author_id: int) -> str:
+    return f"author:{author_id}:stats"
+
+def book_cache_key(book_id: int) -> str:
+    return f"book:{book_id}"
+
+def page_cache_key(collection: str, after, limit: int) -> str:
+    """Cache key of a single keyset page, e.g. ``authors_list:after=0:limit=50``."""
+    return f"{collection}:after={after or 0}:limit={limit}"
+
+def filtered_collection(collection: str, **filters) -> str:
+    """Name a filtered view of a collection, e.g. ``books_list:author_id=3``; unset filters are left out."""
+    return ":".join([collection] + [f"{name}={value}" for name, value in filters.items() if value is not None])
+
+def search_cache_key(q: str, offset: int, limit: int) -> str:
+    """Queries differing only in case or spacing share an entry."""
+    return f"books_search:q={' '.join(q.lower().split())}:offset={offset}:limit={limit}"
+
+# Tags. Entries built from a row carry its tag; entries that depend on the set of rows
+# (counts, searches, filtered pages) carry the collection tag, evicted on create/delete.
+# Plain id-ordered pages don't: their total is spliced in from the cached count, and
+# only the page that new rows land on carries the collection's tail tag.
+AUTHORS_TAG = "authors"
+BOOKS_TAG = "books"
+AUTHORS_TAIL_TAG = "authors:tail"
+BOOKS_TAIL_TAG = "books:tail"
+
+# Search results and filtered or date-sorted pages depend on column values, so any book
+# edit can change them, not only create/delete
+BOOK_QUERIES_TAG = "books:queries"
+
+def author_tag(author_id: int) -> str:
+    return f"author:{author_id}"
+
+def book_tag(book_id: int) -> str:
+    return f"book:{book_id}"
+
+def tag_members_key(tag: str) -> str:
+    return f"tag:{tag}"
+
+# Evicts every entry in the tag sets, drops the sets, bumps the version counters and
+# marks each tag with its collection's new clock in one round trip, then tells the local
+# tiers. The entry keys come from the sets rather than KEYS, so this needs a single
+# Redis node, as the SUNION it runs always did.
+# KEYS: tag sets..., version counters..., invalidation marks...
+# ARGV: number of tag sets, number of counters, channel ('' for none), worker id,
+#       then for each mark the position of its collection's counter
+INVALIDATE_SCRIPT = """
+local tag_count = tonumber(ARGV[1])
+local counter_count = tonumber(ARGV[2])
+local keys = {}
+-- In chunks: unpack can't spread more than about 8000 values
+for first = 1, tag_count, 1000 do
+    local last = math.min(first + 999, tag_count)
+    local members = redis.call('sunion', unpack(KEYS, first, last))
+    for i = 1, #members, 1000 do
+        redis.call('del', unpack(members, i, math.min(i + 999, #members)))
+    end
+    redis.call('del', unpack(KEYS, first, last))
+    for _, key in ipairs(members) do
+        keys[#keys + 1] = key
+    end
+end
+local counters = {}
+for i = 1, counter_count do
+    counters[i] = redis.call('incr', KEYS[tag_count + i])
+    keys[#keys + 1] = KEYS[tag_count + i]
+end
+for i = tag_count + counter_count + 1, #KEYS do
+    redis.call('set', KEYS[i], counters[tonumber(ARGV[4 + i - tag_count - counter_count])])
+end
+if ARGV[3] ~= '' then
+    redis.call('publish', ARGV[3], cjson.encode({origin = ARGV[4], keys = keys}))
+end
+return keys
+"""
+
+async def invalidate_tags(*tags: str, repeat: bool = True):
+    """Evict every entry carrying any of ``tags``, with one script call.
+
+    Write handlers schedule this as a background task so it runs after the response
+    is sent. With a replica, the eviction runs again once the read-your-writes window
+    has passed, dropping entries rebuilt from the replica before it caught up.
+    """
+    if not tags:
+        return
+    if repeat and database.ReplicaSessionLocal is not None and settings.read_your_writes_seconds > 0:
+        task = asyncio.create_task(_invalidate_later(tags, settings.read_your_writes_seconds))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    tag_keys = sorted(tag_members_key(tag) for tag in set(tags))
+    # Local tiers also hold the version counters
+    counters = sorted(version_keys(*tags))
+    marked = sorted(set(tags))
+    clocks = [counters.index(version_key(tag_collection(tag))) + 1 for tag in marked]
+    channel = CACHE_INVALIDATION_CHANNEL if local_cache is not None else ""
+    try:
+        evicted = await redis_call("invalidate", lambda redis: redis.eval(
+            INVALIDATE_SCRIPT, len(tag_keys) + len(counters) + len(marked),
+            *tag_keys, *counters, *[invalidated_key(tag) for tag in marked],
+            len(tag_keys), len(counters), channel, WORKER_ID, *clocks,
+        ))
+    except RedisError:
+        # Redis answered, so this isn't an outage, but the entries are just as stale
+        logger.exception("Evicting %d cache tags failed, retrying later", len(tags))
+        evicted = UNAVAILABLE
+    if evicted is UNAVAILABLE:
+        remember_missed_tags(tags)
+    elif local_cache is not None:
+        local_cache.delete(*[key.decode() for key in evicted])
+
+async def _invalidate_later(tags, delay: float):
+    await asyncio.sleep(delay)
+    await invalidate_tags(*tags, repeat=False)
+
+def remember_missed_tags(tags):
+    """Keep tags whose eviction failed, so entries Redis still holds aren't served stale once it's back."""
+    if len(_missed_tags) + len(tags) > MAX_MISSED_TAGS:
+        logger.warning("Too many missed cache invalidations; entries may be stale for up to %ss", CACHE_EXPIRE_TIME)
+        return
+    _missed_tags.update(tags)
+
+def _replay_missed_invalidations():
+    tags = list(_missed_tags)
+    _missed_tags.clear()
+    task = asyncio.create_task(invalidate_tags(*tags, repeat=False))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+# Versions. Every invalidated tag bumps its own counter and its collection's, so
+# version:author:{id} changes with that author (and its books) and version:authors with
+# any author. An entry stores the version it was built at, which becomes its ETag.
+# The collection's counter is also its clock: invalidated:{tag} records the clock at
+# the tag's last invalidation, which is what guards a store (see SET_ENTRY_SCRIPT).
+VERSION_EPOCH_KEY = "version:epoch"
+TAG_COLLECTIONS = {"author": AUTHORS_TAG, "authors": AUTHORS_TAG, "book": BOOKS_TAG, "books": BOOKS_TAG}
+
+def version_key(tag: str) -> str:
+    return f"version:{tag}"
+
+def invalidated_key(tag: str) -> str:
+    return f"invalidated:{tag}"
+
+def tag_collection(tag: str) -> str:
+    """The collection whose counter clocks ``tag``; a tag outside any collection is its own."""
+    return TAG_COLLECTIONS.get(tag.split(":")[0], tag)
+
+def version_keys(*tags: str) -> set:
+    return {key for tag in tags for key in (version_key(tag), version_key(tag_collection(tag)))}
+
+# Creates the epoch if Redis lost it, then reads it and the counters: one round trip.
+# KEYS: epoch, version counters...  ARGV: a new epoch
+READ_VERSIONS_SCRIPT = """
+redis.call('set', KEYS[1], ARGV[1], 'NX')
+return redis.call('mget', unpack(KEYS))
+"""
+
+async def current_versions(*tags: str) -> list:
+    """The versions of ``tags``, e.g. ``"3f9c1a2b.42"``, from the local tier or one script call.
+
+    Counters start at 0 again if Redis loses them, so a version also carries a random
+    epoch that is lost (and replaced) along with them. ``None`` for each tag while
+    Redis is unavailable: entries built then have no ETag.
+    """
+    versions = [local_cache.get(version_key(tag)) if local_cache is not None else None for tag in tags]
+    remote = [index for index, version in enumerate(versions) if version is None]
+    if not remote:
+        return versions
+    keys = [version_key(tags[index]) for index in remote]
+    values = await redis_call("versions", lambda redis: redis.eval(READ_VERSIONS_SCRIPT, 1 + len(keys), VERSION_EPOCH_KEY, *keys, uuid.uuid4().hex[:8]))
+    if values is UNAVAILABLE:
+        return versions
+    epoch = values[0].decode()
+    for index, key, counter in zip(remote, keys, values[1:]):
+        versions[index] = f"{epoch}.{int(counter or 0)}"
+        if local_cache is not None:
+            local_cache.set(key, versions[index], len(versions[index]))
+    return versions
+
+async def build_versions(*tags: str) -> list:
+    """``(version, clock)`` for each of ``tags``, read before a build.
+
+    The version becomes the entry's ETag, the clock of the tag's collection guards its
+    store. An entry's tags must all belong to that collection.
+    """
+    clocks = sorted({tag_collection(tag) for tag in tags})
+    values = await current_versions(*tags, *clocks)
+    clock_values = dict(zip(clocks, values[len(tags):]))
+    return [(version, clock_values[tag_collection(tag)]) for tag, version in zip(tags, values)]
+
+def entry_etag(entry: CachedEntry) -> Optional[str]:
+    return f'W/"{entry.version}"' if entry.version else None
+
+def etag_matches(request: Request, etag: Optional[str]) -> bool:
+    """Whether ``If-None-Match`` lists ``etag``, using the weak comparison of RFC 9110."""
+    header = request.headers.get("if-none-match")
+    if not header or etag is None:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in header.split(","))
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+def conditional_response(entry: CachedEntry, request: Request) -> Response:
+    """``cached_response`` with the entry's ETag, or 304 when the client already has that version."""
+    etag = entry_etag(entry)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return cached_response(entry, request, etag)
+
+async def get_or_build_count(collection: str, count_query, db, tags=(), version_tag: str = None) -> CachedEntry:
+    """The row count entry cached under ``{collection}:count``, running ``count_query(db)`` only on a miss."""
+    return await get_or_build_cache(f"{collection}:count", count_query, db, tags=tags, version_tag=version_tag, codec=PAGE_CODEC)
+
+def page_response(page: CachedEntry, count: CachedEntry, request: Request) -> Response:
+    """Send a cached keyset page with ``total`` spliced in from its separately cached count.
+
+    Pages don't embed the total, so creating a row evicts the count and the tail page
+    instead of every page. Both are stored as ``PAGE_CODEC`` JSON, so the splice is a
+    byte concatenation with nothing to decompress or re-encode, and the ETag covers the
+    versions of both entries.
+    """
+    etag = f'W/"{page.version}+{count.version}"' if page.version and count.version else None
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    # decode() is a no-op for JSON; it only matters for entries cached before a codec change
+    body = codecs.get_codec(page.codec).decode(page.body)[:-1] + b',"total":' + codecs.get_codec(count.codec).decode(count.body) + b"}"
+    return cached_response(CachedEntry(body, codecs.JSONCodec.name, page.built_at), request, etag)
 
 def item_to_dict(item):
     """Convert a Pydantic or SQLAlchemy model to a dictionary."""
-    if hasattr(item, 'dict'):
-        return item.dict() 
-    else:
+    if hasattr(item, 'model_dump'):
+        return item.model_dump()
+    elif hasattr(item, '__table__'):
         item_dict = {col.name: getattr(item, col.name) for col in item.__table__.columns}
         if hasattr(item, 'books'):
             item_dict['books'] = [item_to_dict(book) for book in item.books]
         return item_dict
+    return item
 
@@ -0,0 +1,123 @@
+# warmup.py
+"""Startup warm-up, so the first requests after a deploy don't pay for cold pools and caches.
+
+Runs in the background once the app has started: it opens Redis and database
+connections up to the configured minimums, then requests the hottest pages
+(``warmup_paths``) through the app itself, which runs their queries and fills
+their cache entries with exactly the keys real requests use. ``GET /ready``
+answers 503 until this has finished, so a rolling deploy only sends traffic to
+warm workers. A failed attempt (database unreachable) is retried; Redis being
+down doesn't hold readiness back, since requests then fall back to the database.
+"""
+import asyncio
+import logging
+import os
+import time
+import httpx
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+from sqlalchemy import text
+from app import database
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+RETRY_SECONDS = 2
+
+class WarmupState:
+    def __init__(self):
+        self.ready = False
+        self.started_at = None
+        self.finished_at = None
+        self.attempts = 0
+        self.error = None
+        self.pages = {}  # path -> status code
+
+    def report(self) -> dict:
+        duration = self.finished_at - self.started_at if self.finished_at else None
+        return {
+            "status": "ready" if self.ready else "warming_up",
+            "attempts": self.attempts,
+            "duration_s": round(duration, 3) if duration is not None else None,
+            "error": self.error,
+            "pages": self.pages,
+        }
+
+state = WarmupState()
+_task = None
+
+async def open_redis_connections(count: int):
+    # Concurrent commands each take a connection, so the pool ends up holding ``count``
+    redis = await database.get_redis()
+    await asyncio.gather(*(redis.ping() for _ in range(count)))
+
+async def open_db_connections(engine, count: int):
+    """Check out ``count`` connections at once, so the pool keeps them open afterwards."""
+    connections = []
+    try:
+        for _ in range(count):
+            connection = await engine.connect()
+            connections.append(connection)
+            await connection.execute(text("SELECT 1"))
+    finally:
+        for connection in connections:
+            await connection.close()
+
+async def prefetch_pages(app, paths: list) -> dict:
+    """GET each path through the app: runs the representative queries and caches the results."""
+    headers = {"Authorization": f"Bearer {os.getenv('BEARER_TOKEN')}"}
+    statuses = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://warmup") as client:
+        for path in paths:
+            statuses[path] = (await client.get(path, headers=headers)).status_code
+            if statuses[path] != 200:
+                logger.warning("Warm-up request GET %s answered %s", path, statuses[path])
+    return statuses
+
+async def warm_up(app, engines=None, paths=None):
+    engines = engines if engines is not None else [engine for engine in (database.async_engine, database.replica_engine) if engine is not None]
+    paths = paths if paths is not None else settings.warmup_paths
+    try:
+        await open_redis_connections(settings.warmup_redis_connections)
+    except (RedisConnectionError, RedisTimeoutError, OSError) as exc:
+        logger.warning("Warm-up could not reach Redis, continuing without it: %r", exc)
+    for engine in engines:
+        # More than the pool keeps idle would just be closed again
+        await open_db_connections(engine, min(settings.warmup_db_connections, settings.db_pool_size))
+    state.pages = await prefetch_pages(app, paths)
+
+async def run(app, **kwargs):
+    """Warm up until an attempt succeeds, then mark the app ready."""
+    state.started_at = time.perf_counter()
+    while True:
+        state.attempts += 1
+        try:
+            await asyncio.wait_for(warm_up(app, **kwargs), settings.warmup_timeout)
+            break
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            state.error = f"{exc.__class__.__name__}: {exc}"
+            logger.warning("Warm-up attempt %d failed, retrying in %ss: %s", state.attempts, RETRY_SECONDS, state.error)
+            await asyncio.sleep(RETRY_SECONDS)
+    state.error = None
+    state.finished_at = time.perf_counter()
+    state.ready = True
+    logger.info("Warm-up finished in %.2fs", state.finished_at - state.started_at)
+
+def start(app):
+    global _task
+    if not settings.warmup_enabled:
+        state.ready = True
+        return
+    if _task is None:
+        _task = asyncio.create_task(run(app))
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
@@ -0,0 +1,154 @@
+"""Generate a synthetic catalog of authors and books for scale testing.
+
+    python -m benchmarks.dataset --authors 100000 --books 5000000 --database-url sqlite:///big.db
+
+Rows are written straight into the ``authors`` and ``books`` tables of ``app/models.py``
+with Core executemany in large batches, bypassing the API, so millions of rows take
+minutes. Books per author follow a Zipf distribution (``--skew``; a few prolific
+authors and a long tail), and publish dates fall within each author's career, which
+starts uniformly or increasingly often towards ``--end`` (``--dates recent``). Ids
+continue after the existing rows and author stats are written with the authors.
+Cached pages are not invalidated: flush Redis after loading into a live database.
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import date
+from sqlalchemy import create_engine, event, func, insert, select
+from app import database, models
+from benchmarks.load_profiles import WORDS
+
+DEFAULT_BATCH_SIZE = 20000
+AUTHOR_BLOCK = 1000  # Authors generated together; their books are shuffled so ids interleave authors
+
+def book_counts(rng: random.Random, authors: int, books: int, skew: float, max_per_author: int) -> list:
+    """Split ``books`` over ``authors`` with Zipf weights ``1 / rank ** skew``, in random author order."""
+    if authors * max_per_author < books:
+        raise ValueError(f"{authors} authors with at most {max_per_author} books each cannot have {books} books")
+    weights = [1 / rank ** skew for rank in range(1, authors + 1)]
+    total = sum(weights)
+    counts = [min(int(books * weight / total), max_per_author) for weight in weights]
+    # Rounding and the cap leave some books over: hand them out from the top of the ranking
+    leftover = books - sum(counts)
+    while leftover:
+        for rank, count in enumerate(counts):
+            if leftover and count < max_per_author:
+                counts[rank] += 1
+                leftover -= 1
+    rng.shuffle(counts)
+    return counts
+
+class DateRange:
+    def __init__(self, start: date, end: date, distribution: str, career_years: int):
+        self.start, self.end = start.toordinal(), end.toordinal()
+        self.distribution = distribution
+        self.career_days = career_years * 365
+
+    def career(self, rng: random.Random) -> tuple:
+        if self.distribution == "recent":
+            first = int(rng.triangular(self.start, self.end, self.end))
+        else:
+            first = rng.randint(self.start, self.end)
+        return first, min(first + rng.randint(0, self.career_days), self.end)
+
+def generate(rng: random.Random, counts: list, first_author_id: int, first_book_id: int, dates: DateRange, missing: float):
+    """Yield ``(author rows, book rows)`` per block of ``AUTHOR_BLOCK`` authors."""
+    book_id = first_book_id
+    for block_start in range(0, len(counts), AUTHOR_BLOCK):
+        authors, books = [], []
+        for offset, count in enumerate(counts[block_start:block_start + AUTHOR_BLOCK]):
+            author_id = first_author_id + block_start + offset
+            first, last = dates.career(rng)
+            publish_dates = sorted(date.fromordinal(rng.randint(first, last)) for _ in range(count))
+            authors.append({
+                "id": author_id,
+                "name": f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {author_id}",
+                "bio": None if rng.random() < missing else " ".join(rng.choices(WORDS, k=8)),
+                "birth_date": date.fromordinal(first - rng.randint(20 * 365, 45 * 365)),
+                "book_count": count,
+                "first_publish_date": publish_dates[0] if count else None,
+                "last_publish_date": publish_dates[-1] if count else None,
+            })
+            books.extend(
+                {
+                    "title": " ".join(rng.choices(WORDS, k=rng.randint(1, 4))).title(),
+                    "description": None if rng.random() < missing else " ".join(rng.choices(WORDS, k=12)),
+                    "publish_date": publish_date,
+                    "author_id": author_id,
+                }
+                for publish_date in publish_dates
+            )
+        rng.shuffle(books)
+        for book in books:
+            book["id"] = book_id
+            book_id += 1
+        yield authors, books
+
+def tune_for_bulk_load(engine):
+    """Trade durability and per-row checks for load speed on this engine's connections only."""
+    @event.listens_for(engine, "connect")
+    def configure(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if engine.dialect.name == "sqlite":
+            cursor.execute("PRAGMA synchronous = OFF")
+            cursor.execute("PRAGMA journal_mode = MEMORY")
+        elif engine.dialect.name == "mysql":
+            cursor.execute("SET SESSION foreign_key_checks = 0, unique_checks = 0")
+        cursor.close()
+
+def load(engine, counts: list, rng: random.Random, dates: DateRange, missing: float = 0.1, batch_size: int = DEFAULT_BATCH_SIZE) -> tuple:
+    """Insert the generated catalog; returns ``(authors, books)`` inserted."""
+    with engine.connect() as connection:
+        first_author_id = (connection.scalar(select(func.max(models.Author.id))) or 0) + 1
+        first_book_id = (connection.scalar(select(func.max(models.Book.id))) or 0) + 1
+    inserted_authors = inserted_books = 0
+    start = time.perf_counter()
+    with engine.connect() as connection:
+        for authors, books in generate(rng, counts, first_author_id, first_book_id, dates, missing):
+            # Authors first: their ids are the books' foreign keys
+            connection.execute(insert(models.Author.__table__), authors)
+            for offset in range(0, len(books), batch_size):
+                connection.execute(insert(models.Book.__table__), books[offset:offset + batch_size])
+            connection.commit()
+            inserted_authors += len(authors)
+            inserted_books += len(books)
+            elapsed = time.perf_counter() - start
+            print(f"authors={inserted_authors} books={inserted_books} ({inserted_books / elapsed:,.0f} books/s)", file=sys.stderr)
+    return inserted_authors, inserted_books
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk-load a synthetic catalog of authors and books.")
+    parser.add_argument("--authors", type=int, default=100000)
+    parser.add_argument("--books", type=int, default=5000000)
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent of books per author; 0 spreads them evenly")
+    parser.add_argument("--max-books-per-author", type=int, default=5000)
+    parser.add_argument("--start", type=date.fromisoformat, default=date(1950, 1, 1), help="Earliest publish date")
+    parser.add_argument("--end", type=date.fromisoformat, default=date(2024, 12, 31), help="Latest publish date")
+    parser.add_argument("--dates", choices=["uniform", "recent"], default="recent", help="How careers start between --start and --end")
+    parser.add_argument("--career-years", type=int, default=30, help="Longest span of an author's publish dates")
+    parser.add_argument("--missing", type=float, default=0.1, help="Share of bios and descriptions left NULL")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--database-url", default=database.DATABASE_URL, help="A sync URL; defaults to DATABASE_URL")
+    parser.add_argument("--create-tables", action="store_true", help="Create missing tables (use Alembic for MySQL)")
+    args = parser.parse_args(argv)
+
+    engine = create_engine(args.database_url)
+    tune_for_bulk_load(engine)
+    if args.create_tables:
+        models.Base.metadata.create_all(engine)
+    rng = random.Random(args.seed)
+    try:
+        counts = book_counts(rng, args.authors, args.books, args.skew, args.max_books_per_author)
+    except ValueError as exc:
+        parser.error(str(exc))
+    dates = DateRange(args.start, args.end, args.dates, args.career_years)
+    start = time.perf_counter()
+    authors, books = load(engine, counts, rng, dates, args.missing, args.batch_size)
+    engine.dispose()
+    print(f"Inserted {authors} authors and {books} books in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
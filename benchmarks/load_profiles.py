@@ -0,0 +1,152 @@
+"""Load-test profiles, seed data and SLO checks shared by ``locustfile.py`` and ``benchmarks.loadtest``.
+
+Nothing here imports Locust (it monkey-patches the process with gevent), so the
+profiles and the SLO evaluation can be unit tested and reused on their own.
+"""
+import json
+import random
+from typing import NamedTuple, Optional
+
+# Titles and descriptions are drawn from a small vocabulary so searches have hits
+WORDS = [
+    "river", "garden", "shadow", "empire", "winter", "letters", "machine", "ocean", "silent", "kingdom",
+    "forest", "stranger", "memory", "night", "island", "glass", "journey", "fire", "city", "mirror",
+    "secret", "storm", "paper", "mountain", "harbor", "summer", "stone", "lantern", "desert", "orchard",
+]
+PERCENTILES = {"p50_ms": 0.50, "p95_ms": 0.95, "p99_ms": 0.99}
+TOTAL = "Aggregated"  # Locust's name for the row summing every endpoint
+
+class Profile(NamedTuple):
+    name: str
+    description: str
+    weights: dict  # Task name (a method of the Locust user) -> share of the mix
+    wait: tuple  # Seconds between tasks, (min, max)
+    authors: int  # Seeded catalog size
+    books_per_author: int
+    hot_ids: Optional[int]  # Reads go to this many ids 90% of the time; None spreads them uniformly
+    cold: bool  # Vary cursors and search terms so requests rarely repeat and most miss the cache
+    slos: dict  # {"p95_ms": {"GET /books/{id}": 100, "*": 300}, "error_rate": {"*": 0.01}}
+
+    @property
+    def books(self) -> int:
+        return self.authors * self.books_per_author
+
+READ_TASKS = {
+    "list_authors": 10, "get_author": 15, "author_stats": 5, "author_books": 10,
+    "list_books": 15, "filter_books": 10, "search_books": 10, "get_book": 25,
+}
+
+PROFILES = {profile.name: profile for profile in [
+    Profile(
+        name="read-heavy",
+        description="Browsing traffic: 95% reads concentrated on a hot set, so the cache stays warm",
+        weights={**READ_TASKS, "create_book": 2, "update_book": 2, "delete_book": 1},
+        wait=(0.5, 1.5),
+        authors=1000,
+        books_per_author=10,
+        hot_ids=100,
+        cold=False,
+        slos={"p95_ms": {"*": 150}, "p99_ms": {"*": 500}, "error_rate": {"*": 0.01}},
+    ),
+    Profile(
+        name="write-burst",
+        description="Half the requests write, invalidating cached pages while readers hit them",
+        weights={"list_books": 10, "get_book": 15, "get_author": 10, "filter_books": 10, "list_authors": 5,
+                 "create_author": 5, "create_book": 20, "update_book": 15, "delete_book": 10},
+        wait=(0.05, 0.25),
+        authors=1000,
+        books_per_author=10,
+        hot_ids=100,
+        cold=False,
+        slos={"p95_ms": {"*": 400}, "p99_ms": {"*": 1000}, "error_rate": {"*": 0.01}},
+    ),
+    Profile(
+        name="cache-cold",
+        description="Reads spread over the whole catalog with varying cursors and terms; measures the database path",
+        weights=READ_TASKS,
+        wait=(0.5, 1.5),
+        authors=5000,
+        books_per_author=10,
+        hot_ids=None,
+        cold=True,
+        slos={"p95_ms": {"*": 500}, "p99_ms": {"*": 1500}, "error_rate": {"*": 0.01}},
+    ),
+    Profile(
+        name="large-catalog",
+        description="List, filter and search pages over 200k books",
+        weights={"list_authors": 10, "list_books": 20, "filter_books": 25, "search_books": 25, "get_book": 10, "author_stats": 10},
+        wait=(0.5, 1.5),
+        authors=10000,
+        books_per_author=20,
+        hot_ids=None,
+        cold=True,
+        slos={"p95_ms": {"*": 800, "GET /books/search": 1500}, "p99_ms": {"*": 2500}, "error_rate": {"*": 0.01}},
+    ),
+]}
+
+def schedule(weights: dict, seed) -> list:
+    """The task order one user cycles through: exactly ``weight`` of each task, shuffled by ``seed``.
+
+    Unlike Locust's weighted random choice, the mix over a cycle is exact and the
+    same seed replays the same order.
+    """
+    tasks = [name for name, weight in sorted(weights.items()) for _ in range(weight)]
+    random.Random(seed).shuffle(tasks)
+    return tasks
+
+def pick_id(rng: random.Random, ids: list, hot_ids: Optional[int]):
+    if hot_ids and rng.random() < 0.9:
+        return ids[rng.randrange(min(hot_ids, len(ids)))]
+    return ids[rng.randrange(len(ids))]
+
+def words(rng: random.Random, count: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+def book_record(rng: random.Random, author_id: int) -> dict:
+    return {
+        "title": words(rng, 3).title(),
+        "description": words(rng, 12),
+        "publish_date": f"{rng.randint(1950, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "author_id": author_id,
+    }
+
+def author_records(profile: Profile, seed: int):
+    rng = random.Random(f"{seed}:authors")
+    for i in range(profile.authors):
+        yield {"name": f"Load Author {i}", "bio": words(rng, 8), "birth_date": f"{rng.randint(1920, 2000)}-01-01"}
+
+def book_records(profile: Profile, seed: int, author_ids: list):
+    rng = random.Random(f"{seed}:books")
+    for author_id in author_ids[:profile.authors]:
+        for _ in range(profile.books_per_author):
+            yield book_record(rng, author_id)
+
+def ndjson(records) -> bytes:
+    return "".join(json.dumps(record) + "\n" for record in records).encode()
+
+def load_slos(path: Optional[str], profile: Profile) -> dict:
+    """The profile's SLOs, with any metric given in the JSON file at ``path`` replacing the profile's."""
+    slos = dict(profile.slos)
+    if path:
+        with open(path) as slo_file:
+            slos.update(json.load(slo_file))
+    return slos
+
+def evaluate_slos(endpoints: dict, slos: dict) -> list:
+    """Return a message for every SLO an endpoint breached.
+
+    ``endpoints`` maps ``"GET /books/{id}"`` (and ``TOTAL``) to the stats written in the
+    report: ``requests``, ``error_rate`` and each of ``PERCENTILES``. A limit is looked up
+    by endpoint name and falls back to ``"*"``.
+    """
+    breaches = []
+    if not endpoints.get(TOTAL, {}).get("requests"):
+        return ["No requests were made"]
+    for name, stats in sorted(endpoints.items()):
+        if not stats["requests"]:
+            continue
+        for metric, limits in sorted(slos.items()):
+            limit = limits.get(name, limits.get("*"))
+            if limit is not None and stats[metric] > limit:
+                breaches.append(f"{name}: {metric} {stats[metric]:g} > {limit:g}")
+    return breaches
@@ -0,0 +1,92 @@
+"""Headless load test that fails when a profile's SLOs are breached, for release gates.
+
+    python -m benchmarks.loadtest --profile read-heavy --host http://localhost:8000 \\
+        --users 50 --spawn-rate 10 --run-time 120 --output report.json [--slo slo.json]
+
+Runs a profile of ``locustfile.py`` in-process (seeding the catalog first), writes
+request counts, error rate and p50/p95/p99 per endpoint as JSON and exits 1 on any
+breach. An SLO file replaces the profile's limits metric by metric, e.g.
+``{"p95_ms": {"*": 200, "GET /books/search": 600}, "error_rate": {"*": 0.001}}``.
+"""
+import argparse
+import json
+import sys
+import time
+from argparse import Namespace
+import gevent
+from locust import events
+from locust.env import Environment
+from benchmarks.load_profiles import PERCENTILES, PROFILES, TOTAL, evaluate_slos, load_slos
+import locustfile
+
+def endpoint_stats(entry) -> dict:
+    stats = {
+        "requests": entry.num_requests,
+        "failures": entry.num_failures,
+        "error_rate": round(entry.fail_ratio, 4),
+    }
+    for metric, percentile in PERCENTILES.items():
+        stats[metric] = entry.get_response_time_percentile(percentile) if entry.num_requests else 0
+    return stats
+
+def run_profile(profile_name: str, host: str, users: int, spawn_rate: float, run_time: float, seed: int, skip_seed: bool = False) -> dict:
+    """Run the profile for ``run_time`` seconds and return the stats per ``"METHOD /route"`` plus ``TOTAL``."""
+    environment = Environment(
+        user_classes=[locustfile.BookApiUser],
+        host=host,
+        events=events,  # The locustfile's listeners (seeding) are registered on the global hooks
+        parsed_options=Namespace(load_profile=profile_name, seed=seed, skip_seed=skip_seed),
+    )
+    runner = environment.create_local_runner()
+    # Seeded here rather than by the test_start listener so a failure stops the run with its traceback
+    locustfile.seed_catalog(environment)
+    runner.start(users, spawn_rate=spawn_rate)
+    gevent.spawn_later(run_time, runner.quit)
+    runner.greenlet.join()
+    endpoints = {f"{entry.method} {entry.name}": endpoint_stats(entry) for entry in environment.stats.entries.values()}
+    endpoints[TOTAL] = endpoint_stats(environment.stats.total)
+    return endpoints
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run a load-test profile headless and check its SLOs.")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default=locustfile.DEFAULT_PROFILE)
+    parser.add_argument("--host", default="http://localhost:8000")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--spawn-rate", type=float, default=10, help="Users started per second")
+    parser.add_argument("--run-time", type=float, default=120, help="Seconds, after seeding")
+    parser.add_argument("--seed", type=int, default=locustfile.DEFAULT_SEED)
+    parser.add_argument("--skip-seed", action="store_true", help="Use whatever data the database already has")
+    parser.add_argument("--slo", help="JSON file overriding the profile's SLOs")
+    parser.add_argument("--output", default="-", help="Where to write the JSON report (- for stdout)")
+    args = parser.parse_args(argv)
+
+    profile = PROFILES[args.profile]
+    slos = load_slos(args.slo, profile)
+    endpoints = run_profile(profile.name, args.host, args.users, args.spawn_rate, args.run_time, args.seed, args.skip_seed)
+    breaches = evaluate_slos(endpoints, slos)
+    report = {
+        "profile": profile.name,
+        "seed": args.seed,
+        "users": args.users,
+        "run_time_s": args.run_time,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "slos": slos,
+        "endpoints": endpoints,
+        "breaches": breaches,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+
+    for name, stats in sorted(endpoints.items()):
+        print(f"{stats['requests']:8d} req {stats['error_rate']:7.2%} err  "
+              f"p50 {stats['p50_ms']:6g}  p95 {stats['p95_ms']:6g}  p99 {stats['p99_ms']:6g} ms  {name}", file=sys.stderr)
+    for breach in breaches:
+        print(f"SLO BREACH  {breach}", file=sys.stderr)
+    return 1 if breaches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
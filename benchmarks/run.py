@@ -0,0 +1,217 @@
+"""Offline microbenchmarks for the serialization and cache hot paths.
+
+    python -m benchmarks.run --rows 1000,10000,100000 --output results.json
+    python -m benchmarks.run --baseline results.json  # exits 1 on a regression
+
+Runs against in-memory SQLite and fakeredis, so neither MySQL nor Redis is needed.
+Results are JSON: seconds per call (median and min over several samples) per benchmark.
+Baseline comparisons use the min, which is the least sensitive to machine noise.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+# Before app.database creates its engines from the environment (.env points at MySQL)
+os.environ["DATABASE_URL"] = "sqlite://"
+os.environ.setdefault("BEARER_TOKEN", "benchmark")
+
+import httpx
+import sqlalchemy
+from fakeredis import FakeAsyncRedis, FakeServer
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from app import database, models, schemas, utils
+from app.database import get_async_db
+from app.main import app
+
+DEFAULT_ROWS = [1000, 10000, 100000]
+DEFAULT_SAMPLES = 5
+DEFAULT_MIN_TIME = 0.05  # Seconds per sample; fast calls are looped until a sample takes this long
+DEFAULT_THRESHOLD = 0.2  # A min this much slower than the baseline is a regression
+SEED_CHUNK = 10000
+
+async def measure(fn, samples: int, min_time: float) -> dict:
+    """Time ``fn`` (sync, or a coroutine function) and return seconds per call."""
+    is_async = asyncio.iscoroutinefunction(fn)
+
+    async def run(loops: int) -> float:
+        start = time.perf_counter()
+        for _ in range(loops):
+            if is_async:
+                await fn()
+            else:
+                fn()
+        return time.perf_counter() - start
+
+    loops = 1
+    elapsed = await run(loops)
+    while elapsed < min_time:
+        loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9)))
+        elapsed = await run(loops)
+    times = [await run(loops) / loops for _ in range(samples)]
+    return {"median_s": statistics.median(times), "min_s": min(times), "loops": loops, "samples": samples}
+
+def sample_books(count: int, author_id: int = 1, first_id: int = 1) -> list:
+    return [
+        {"id": first_id + i, "title": f"Book {i}", "description": "A description long enough to matter " * 2,
+         "publish_date": date(2000, 1, 1) + timedelta(days=i), "author_id": author_id}
+        for i in range(count)
+    ]
+
+def sample_author(author_id: int, books: int) -> dict:
+    return {"id": author_id, "name": f"Author {author_id}", "bio": "Bio", "birth_date": date(1970, 1, 1),
+            "book_count": books, "books": sample_books(books, author_id, author_id * books)}
+
+def orm_author(data: dict):
+    books = [models.Book(**book) for book in data["books"]]
+    return models.Author(**{key: value for key, value in data.items() if key != "books"}, books=books)
+
+async def bench_functions(bench) -> None:
+    items = [sample_author(i, 5) for i in range(1, 201)]
+    await bench("utils.serialize_value[200 authors x 5 books]", lambda: utils.serialize_value(items))
+
+    authors = [orm_author(sample_author(i, 20)) for i in range(1, 51)]
+    await bench("utils.item_to_dict[50 authors x 20 books]", lambda: [utils.item_to_dict(author) for author in authors])
+
+    for books in (10, 100, 1000):
+        data = sample_author(1, books)
+        author = orm_author(data)
+        await bench(f"schemas.AuthorWithBooks.validate[dict, {books} books]", lambda data=data: schemas.AuthorWithBooks.model_validate(data))
+        await bench(f"schemas.AuthorWithBooks.validate[orm, {books} books]", lambda author=author: schemas.AuthorWithBooks.model_validate(author))
+
+    page = schemas.AuthorPage(items=[schemas.Author.model_validate(sample_author(i, 0)) for i in range(1, 51)], total=50)
+    entry = utils.encode_entry(page, schemas.AuthorPage)
+
+    async def round_trip():
+        await utils.set_cache("bench:page", entry, tags=[utils.AUTHORS_TAG])
+        await utils.get_cache("bench:page")
+    await bench(f"cache.set_get_round_trip[authors page, {len(entry.body)} bytes]", round_trip)
+    await bench("cache.encode_entry[authors page]", lambda: utils.encode_entry(page, schemas.AuthorPage))
+
+async def seed(session_factory, rows: int) -> None:
+    async with session_factory() as db:
+        for start in range(0, rows, SEED_CHUNK):
+            ids = range(start + 1, min(start + SEED_CHUNK, rows) + 1)
+            await db.execute(insert(models.Author), [
+                {"id": i, "name": f"Author {i}", "bio": None, "birth_date": date(1970, 1, 1),
+                 "book_count": 1, "first_publish_date": date(2000, 1, 1), "last_publish_date": date(2000, 1, 1)}
+                for i in ids
+            ])
+            await db.execute(insert(models.Book), [
+                {"id": i, "title": f"Book {i}", "description": None, "publish_date": date(2000, 1, 1), "author_id": i}
+                for i in ids
+            ])
+        await db.commit()
+
+async def bench_handlers(bench, rows: int, redis) -> None:
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    async with engine.begin() as connection:
+        await connection.run_sync(models.Base.metadata.create_all)
+    session_factory = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    await seed(session_factory, rows)
+
+    async def override_get_async_db():
+        async with session_factory() as db:
+            yield db
+
+    previous = app.dependency_overrides.get(get_async_db)
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    headers = {"Authorization": f"Bearer {os.environ['BEARER_TOKEN']}"}
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            for path in ("/authors/", "/books/"):
+                url = f"{path}?limit={utils.MAX_PAGE_SIZE}"
+
+                async def cold(url=url):
+                    await redis.flushall()
+                    assert (await client.get(url, headers=headers)).status_code == 200
+
+                async def warm(url=url):
+                    assert (await client.get(url, headers=headers)).status_code == 200
+
+                await bench(f"GET {path} cache miss[{rows} rows]", cold)
+                await bench(f"GET {path} cache hit[{rows} rows]", warm)
+    finally:
+        if previous is None:
+            app.dependency_overrides.pop(get_async_db, None)
+        else:
+            app.dependency_overrides[get_async_db] = previous
+        await engine.dispose()
+
+async def run_benchmarks(rows: list, samples: int = DEFAULT_SAMPLES, min_time: float = DEFAULT_MIN_TIME, only: str = None) -> dict:
+    results = {}
+
+    async def bench(name, fn):
+        if only and only not in name:
+            return
+        results[name] = await measure(fn, samples, min_time)
+        print(f"{name}: {results[name]['median_s'] * 1000:.3f} ms", file=sys.stderr)
+
+    # A server of its own: flushing it must not touch anyone else's fakeredis data
+    previous_redis, database.redis = database.redis, FakeAsyncRedis(server=FakeServer())
+    try:
+        await bench_functions(bench)
+        for count in rows:
+            await bench_handlers(bench, count, database.redis)
+    finally:
+        database.redis = previous_redis
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "platform": platform.platform(),
+            "cache_codec": utils.CACHE_CODEC,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "results": results,
+    }
+
+def compare(results: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> list:
+    """Return ``(name, baseline_s, current_s, ratio, regressed)`` for benchmarks present in both runs."""
+    rows = []
+    for name, current in results["results"].items():
+        previous = baseline["results"].get(name)
+        if previous is None:
+            continue
+        ratio = current["min_s"] / previous["min_s"]
+        rows.append((name, previous["min_s"], current["min_s"], ratio, ratio > 1 + threshold))
+    return rows
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run the offline microbenchmarks.")
+    parser.add_argument("--rows", default=",".join(map(str, DEFAULT_ROWS)), help="Table sizes for the handler benchmarks")
+    parser.add_argument("--samples", type=int, default=DEFAULT_SAMPLES)
+    parser.add_argument("--min-time", type=float, default=DEFAULT_MIN_TIME, help="Minimum seconds per sample")
+    parser.add_argument("--only", help="Run only benchmarks whose name contains this")
+    parser.add_argument("--output", default="-", help="Where to write the JSON results (- for stdout)")
+    parser.add_argument("--baseline", help="Results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown, 0.2 = 20%%")
+    args = parser.parse_args(argv)
+
+    rows = [int(count) for count in args.rows.split(",") if count]
+    results = asyncio.run(run_benchmarks(rows, args.samples, args.min_time, args.only))
+    text = json.dumps(results, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as baseline_file:
+        comparison = compare(results, json.load(baseline_file), args.threshold)
+    for name, previous, current, ratio, regressed in comparison:
+        flag = "REGRESSION" if regressed else "ok"
+        print(f"{flag:>10}  {ratio:6.2f}x  {previous * 1000:10.3f} ms -> {current * 1000:10.3f} ms  {name}", file=sys.stderr)
+    return 1 if any(regressed for *_, regressed in comparison) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
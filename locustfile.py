@@ -1,194 +1,193 @@
-from locust import HttpUser, task, between
-import json
+"""Load-test profiles for the API.
 
-class FastAPIUser(HttpUser):
-    # Simulates the wait time between tasks
-    wait_time = between(1, 5)
+    locust --load-profile read-heavy  # web UI on http://localhost:8089
+    python -m benchmarks.loadtest --profile write-burst --users 50 --run-time 120  # headless, with SLO checks
+
+Profiles (read-heavy, write-burst, cache-cold, large-catalog) are defined in
+benchmarks/load_profiles.py. Before the first user starts, the catalog is seeded
+through /import from a fixed random seed (skipped when the database already holds
+enough authors and books), so runs with the same seed see the same data and each
+user replays the same task order.
+"""
+import itertools
+import os
+import random
+import requests
+from locust import HttpUser, events, task
+from locust.exception import StopUser
+from locust.runners import WorkerRunner
+from benchmarks.load_profiles import PROFILES, book_record, author_records, book_records, ndjson, pick_id, schedule, words
+
+DEFAULT_PROFILE = os.getenv("LOAD_PROFILE", "read-heavy")
+DEFAULT_SEED = int(os.getenv("LOAD_SEED", "42"))
+TOKEN = os.getenv("BEARER_TOKEN", "supersecrettoken123")
+HEADERS = {"Authorization": f"Bearer {TOKEN}"}
+PAGE_SIZE = 500
+
+@events.init_command_line_parser.add_listener
+def add_arguments(parser):
+    parser.add_argument("--load-profile", choices=sorted(PROFILES), default=DEFAULT_PROFILE, help="Traffic profile")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="Seed for the catalog and the task order")
+    parser.add_argument("--skip-seed", action="store_true", help="Use whatever data the database already has")
+
+def options(environment):
+    parsed = environment.parsed_options
+    return (
+        PROFILES[getattr(parsed, "load_profile", DEFAULT_PROFILE)],
+        getattr(parsed, "seed", DEFAULT_SEED),
+        getattr(parsed, "skip_seed", False),
+    )
+
+def collect_ids(session: requests.Session, host: str, path: str) -> list:
+    """Every id in a keyset-paginated collection."""
+    ids, after = [], None
+    while True:
+        params = {"limit": PAGE_SIZE, **({"after": after} if after is not None else {})}
+        if path == "/authors/":
+            params["fields"] = "id"
+        page = session.get(f"{host}{path}", params=params)
+        page.raise_for_status()
+        page = page.json()
+        ids.extend(item["id"] for item in page["items"])
+        after = page["next_cursor"]
+        if after is None:
+            return ids
+
+def import_records(session: requests.Session, host: str, target: str, body: bytes):
+    response = session.post(f"{host}/import/{target}", files={"file": (f"{target}.ndjson", body)})
+    response.raise_for_status()
+
+def total(session: requests.Session, host: str, path: str) -> int:
+    response = session.get(f"{host}{path}", params={"limit": 1})
+    response.raise_for_status()
+    return response.json()["total"]
+
+@events.test_start.add_listener
+def seed_catalog(environment, **kwargs):
+    """Seed the catalog (once, not on workers) and give every user the ids to request."""
+    if getattr(environment, "catalog", None) is not None:
+        return
+    profile, seed, skip_seed = options(environment)
+    host = environment.host
+    with requests.Session() as session:
+        session.headers.update(HEADERS)
+        seeding = not skip_seed and not isinstance(environment.runner, WorkerRunner)
+        # A partly seeded database gets only the missing records
+        existing = total(session, host, "/authors/")
+        if seeding and existing < profile.authors:
+            import_records(session, host, "authors", ndjson(itertools.islice(author_records(profile, seed), existing, None)))
+        author_ids = collect_ids(session, host, "/authors/")
+        existing = total(session, host, "/books/")
+        if seeding and existing < profile.books:
+            import_records(session, host, "books", ndjson(itertools.islice(book_records(profile, seed, author_ids), existing, None)))
+        environment.catalog = {"authors": author_ids, "books": collect_ids(session, host, "/books/")}
+
+class BookApiUser(HttpUser):
+    """Cycles through its profile's task schedule; requests are named by route so stats group per endpoint."""
+    numbers = itertools.count()
 
     def on_start(self):
-        """This is run when the simulated user starts."""
-        self.token = self.get_auth_token()
-        self.author_id = None
-        self.book_id = None
+        profile, seed, _ = options(self.environment)
+        number = next(self.numbers)
+        self.profile = profile
+        self.rng = random.Random(f"{seed}:user:{number}")
+        self.tasks_order = itertools.cycle(schedule(profile.weights, f"{seed}:{number}"))
+        self.catalog = getattr(self.environment, "catalog", None)
+        if self.catalog is None:
+            raise StopUser()  # Seeding failed; the error is in the log
+        self.created_authors = []
+        self.created_books = []
 
-    def get_auth_token(self):
-        # Replace this with an actual call to obtain the token if your API requires authentication
-        return "supersecrettoken123"
+    def on_stop(self):
+        # Leave the seeded catalog as it was for the next run
+        for book_id in self.created_books:
+            self.client.delete(f"/books/{book_id}", headers=HEADERS, name="/books/{id}")
+        for author_id in self.created_authors:
+            self.client.delete(f"/authors/{author_id}", headers=HEADERS, name="/authors/{id}")
 
-    # Author-related tasks
-    @task
-    def create_author(self):
-        headers = {
-            "Authorization": f"Bearer {self.token}",
-            "Content-Type": "application/json"
-        }
-        
-        # Create a new author
-        author_payload = {
-            "name": "New Author",
-            "bio": "Temporary author for testing",
-            "birth_date": "1980-01-01"
-        }
-        
-        response = self.client.post("/authors/", json=author_payload, headers=headers)
-        
-        if response.status_code == 200:
-            new_author = response.json()
-            self.author_id = new_author['id']
-            # print(f"Created author: {self.author_id}")
-            pass
-        else:
-            print(f"Failed to create author - {response.status_code}")
+    def wait_time(self):
+        return self.rng.uniform(*self.profile.wait)
 
     @task
-    def get_authors(self):
-        headers = {
-            "Authorization": f"Bearer {self.token}"
-        }
-        
-        # Retrieve a list of all authors
-        response = self.client.get("/authors/", headers=headers)
-        if response.status_code == 200:
-            # print("Retrieved authors:", response.json())
-            pass
-        else:
-            print(f"Failed to retrieve authors - {response.status_code}")
+    def step(self):
+        getattr(self, next(self.tasks_order))()
 
-    @task
-    def get_single_author(self):
-        if self.author_id:
-            headers = {
-                "Authorization": f"Bearer {self.token}"
-            }
-            # Retrieve details of a specific author
-            response = self.client.get(f"/authors/{self.author_id}", headers=headers)
-            if response.status_code == 200:
-                # print(f"Retrieved author with ID {self.author_id}: {response.json()}")
-                pass
-            else:
-                print(f"Failed to retrieve author {self.author_id} - {response.status_code}")
+    def author_id(self) -> int:
+        return pick_id(self.rng, self.catalog["authors"], self.profile.hot_ids)
 
-    @task
-    def update_author(self):
-        if self.author_id:
-            headers = {
-                "Authorization": f"Bearer {self.token}",
-                "Content-Type": "application/json"
-            }
-            # Update an existing author
-            payload = {
-                "name": "Updated Author",
-                "bio": "Updated bio",
-                "birth_date": "1985-05-15"
-            }
-            response = self.client.put(f"/authors/{self.author_id}", json=payload, headers=headers)
-            if response.status_code == 200:
-                # print(f"Successfully updated author: {self.author_id}")
-                pass
-            else:
-                print(f"Failed to update author {self.author_id} - {response.status_code}")
+    def book_id(self) -> int:
+        return pick_id(self.rng, self.catalog["books"], self.profile.hot_ids)
 
-    @task
-    def delete_author(self):
-        if self.author_id:
-            headers = {
-                "Authorization": f"Bearer {self.token}"
-            }
-            # Delete an author
-            response = self.client.delete(f"/authors/{self.author_id}", headers=headers)
-            if response.status_code == 200:
-                print(f"Successfully deleted author: {self.author_id}")
-                self.author_id = None  # Reset author_id after deletion
-            else:
-                print(f"Failed to delete author {self.author_id} - {response.status_code}")
-
-    # Book-related tasks
-    @task
-    def create_book(self):
-        if self.author_id:
-            headers = {
-                "Authorization": f"Bearer {self.token}",
-                "Content-Type": "application/json"
-            }
-            # Create a new book for the created author
-            from datetime import datetime
-
-            # Create a valid publish date
-            publish_date = datetime.now().date().isoformat()  # e.g., '2024-01-01'
-            book_payload = {
-                "title": "New Test Book",
-                "description": "A brief description for the test book.",
-                "publish_date": publish_date,
-                "author_id": self.author_id
-            }
-            response = self.client.post("/books/", json=book_payload, headers=headers)
-            if response.status_code == 200:
-                new_book = response.json()
-                self.book_id = new_book['id']
-                # print(f"Successfully created book: {self.book_id}")
-                pass
-            else:
-                print(f"Failed to create book - {response}")
+    def page_params(self, ids: list) -> dict:
+        # Cold runs start pages at random cursors; warm runs keep requesting the first pages
+        if self.profile.cold:
+            return {"after": self.rng.choice(ids)}
+        page = self.rng.randrange(3)
+        return {"after": ids[page * 50 - 1]} if page and len(ids) >= 100 else {}
 
-    @task
-    def get_books(self):
-        headers = {
-            "Authorization": f"Bearer {self.token}"
-        }
-        # Retrieve a list of all books
-        response = self.client.get("/books/", headers=headers)
-        if response.status_code == 200:
-            # print("Retrieved books:", response.json())
-            pass
-        else:
-            print(f"Failed to retrieve books - {response.status_code}")
+    def request(self, method: str, path: str, name: str = None, **kwargs):
+        """Send a request that counts as failed unless it returns 200; returns the response JSON or None."""
+        with self.client.request(method, path, headers=HEADERS, name=name, catch_response=True, **kwargs) as response:
+            if response.status_code != 200:
+                response.failure(f"{response.status_code}: {response.text[:200]}")
+                return None
+            return response.json()
 
-    @task
-    def get_single_book(self):
-        if self.book_id:
-            headers = {
-                "Authorization": f"Bearer {self.token}"
-            }
-            # Retrieve details of a specific book
-            response = self.client.get(f"/books/{self.book_id}", headers=headers)
-            if response.status_code == 200:
-                # print(f"Retrieved book with ID {self.book_id}: {response.json()}")
-                pass
-            else:
-                print(f"Failed to retrieve book {self.book_id} - {response.status_code}")
+    def get(self, path: str, name: str, **params):
+        self.request("GET", path, name, params=params)
+
+    # Reads
+    def list_authors(self):
+        self.get("/authors/", "/authors/", **self.page_params(self.catalog["authors"]))
+
+    def get_author(self):
+        self.get(f"/authors/{self.author_id()}", "/authors/{id}")
+
+    def author_stats(self):
+        self.get(f"/authors/{self.author_id()}/stats", "/authors/{id}/stats")
+
+    def author_books(self):
+        self.get(f"/authors/{self.author_id()}/books", "/authors/{id}/books")
+
+    def list_books(self):
+        self.get("/books/", "/books/", **self.page_params(self.catalog["books"]))
+
+    def filter_books(self):
+        params = {"author_id": self.author_id(), "sort": "-publish_date"}
+        if self.profile.cold:
+            params["published_after"] = f"{self.rng.randint(1950, 2020)}-01-01"
+        self.get("/books/", "/books/?author_id", **params)
+
+    def search_books(self):
+        query = words(self.rng, 2) if self.profile.cold else self.rng.choice(["river", "winter garden", "night"])
+        self.get("/books/search", "/books/search", q=query)
+
+    def get_book(self):
+        self.get(f"/books/{self.book_id()}", "/books/{id}")
+
+    # Writes touch only rows this user created, so the seeded catalog stays the same
+    def create_author(self):
+        payload = {"name": f"Load Author {self.rng.random():.6f}", "bio": words(self.rng, 8), "birth_date": "1980-01-01"}
+        author = self.request("POST", "/authors/", json=payload)
+        if author:
+            self.created_authors.append(author["id"])
+
+    def create_book(self):
+        author_id = self.created_authors[-1] if self.created_authors else self.author_id()
+        book = self.request("POST", "/books/", json=book_record(self.rng, author_id))
+        if book:
+            self.created_books.append(book["id"])
 
-    @task
     def update_book(self):
-        if self.book_id and self.author_id:
-            headers = {
-                "Authorization": f"Bearer {self.token}",
-                "Content-Type": "application/json"
-            }
-            # Update an existing book
-            payload = {
-                "title": "Updated Test Book",
-                "author_id": self.author_id,
-                "description": "An updated description for the test book.",
-                "published_date": "2024-02-01"
-            }
-            response = self.client.put(f"/books/{self.book_id}", json=payload, headers=headers)
-            if response.status_code == 200:
-                # print(f"Successfully updated book: {self.book_id}")
-                pass
-            else:
-                print(f"Failed to update book {self.book_id} - {response.status_code}")
+        if not self.created_books:
+            return self.create_book()
+        book_id = self.rng.choice(self.created_books)
+        # The update schema requires every field; publish_date (not published_date) is the column
+        payload = book_record(self.rng, self.created_authors[-1] if self.created_authors else self.author_id())
+        self.request("PUT", f"/books/{book_id}", "/books/{id}", json=payload)
 
-    @task
     def delete_book(self):
-        if self.book_id:
-            headers = {
-                "Authorization": f"Bearer {self.token}"
-            }
-            # Delete a book
-            response = self.client.delete(f"/books/{self.book_id}", headers=headers)
-            if response.status_code == 200:
-                # print(f"Successfully deleted book: {self.book_id}")
-                self.book_id = None  # Reset book_id after deletion
-            else:
-                print(f"Failed to delete book {self.book_id} - {response.status_code}")
-
+        if not self.created_books:
+            return self.create_book()
+        book_id = self.created_books.pop(self.rng.randrange(len(self.created_books)))
+        self.request("DELETE", f"/books/{book_id}", "/books/{id}")
@@ -0,0 +1,77 @@
+import pytest
+from contextlib import contextmanager
+from typing import NamedTuple
+from fakeredis import FakeAsyncRedis
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from app import database, tracing
+from app.database import get_db, get_async_db
+from app.main import app
+from app.models import Base
+
+DATABASE_FILE = "./test.db"
+
+class SQLiteDatabase(NamedTuple):
+    engine: Engine
+    async_engine: AsyncEngine
+    SessionLocal: sessionmaker
+    AsyncSessionLocal: async_sessionmaker
+
+@pytest.fixture(scope="session", autouse=True)
+def sqlite_db():
+    """Create the tables in one SQLite file and point the app's session dependencies at it."""
+    engine = create_engine(f"sqlite:///{DATABASE_FILE}")
+    # TestClient runs each request on its own event loop, so don't pool aiosqlite connections
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{DATABASE_FILE}", poolclass=NullPool)
+    db = SQLiteDatabase(
+        engine,
+        async_engine,
+        sessionmaker(autocommit=False, autoflush=False, bind=engine),
+        async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False),
+    )
+    Base.metadata.create_all(bind=engine)
+
+    async def override_get_async_db():
+        async with db.AsyncSessionLocal() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = lambda: db.SessionLocal()
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    yield db
+    app.dependency_overrides.pop(get_db)
+    app.dependency_overrides.pop(get_async_db)
+    Base.metadata.drop_all(bind=engine)
+    engine.dispose()
+
+@pytest.fixture(scope="session", autouse=True)
+def fake_redis():
+    # Routes talk to Redis through app.database.get_redis; swap in an in-memory server
+    database.redis = FakeAsyncRedis()
+    yield database.redis
+    database.redis = None
+
+@pytest.fixture
+def max_queries(monkeypatch):
+    """Fail the test if any request made inside the block runs more than ``limit`` SQL statements.
+
+        with max_queries(2):
+            client.get("/authors/")
+    """
+    monkeypatch.setattr(tracing, "QUERY_TRACE", True)
+
+    @contextmanager
+    def check(limit: int):
+        traces = []
+        collect = lambda request_line, trace: traces.append((request_line, trace))
+        tracing.REPORTERS.append(collect)
+        try:
+            yield traces
+        finally:
+            tracing.REPORTERS.remove(collect)
+        for request_line, trace in traces:
+            assert trace.count <= limit, f"{request_line} ran {trace.count} queries, expected at most {limit}:\n{trace.summary()}"
+
+    return check
@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+import pytest
+import redis.asyncio as aioredis
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeAsyncRedisConnection
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.config import settings
+from app.database import get_async_db
+from app.main import app
+from app import database, metrics
+
+client = TestClient(app)
+
+# Bearer token for authentication
+BEARER_TOKEN = "supersecrettoken123"
+
+def sample(name: str, **labels):
+    return metrics.REGISTRY.get_sample_value(name, labels) or 0
+
+def test_pool_options_follow_settings():
+    options = database.pool_options("mysql+aiomysql://user@db/books", database.TrackedAsyncQueuePool)
+    assert options["poolclass"] is database.TrackedAsyncQueuePool
+    assert (options["pool_size"], options["max_overflow"]) == (settings.db_pool_size, settings.db_max_overflow)
+    assert options["pool_pre_ping"] is settings.db_pool_pre_ping
+    # A single shared in-memory connection has no pool to size
+    assert database.pool_options("sqlite+aiosqlite://", database.TrackedAsyncQueuePool) == {}
+
+@pytest.mark.asyncio
+async def test_pool_tracks_waiting_checkouts(tmp_path):
+    pool_engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+        poolclass=database.TrackedAsyncQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.3,
+    )
+    waits_before = sample("db_pool_wait_seconds_count", pool="async")
+    try:
+        async with pool_engine.connect() as held:
+            await held.execute(text("SELECT 1"))
+            waiter = asyncio.create_task(pool_engine.connect().start())
+            await asyncio.sleep(0.1)
+            assert database.pool_stats(pool_engine.pool) == {"size": 1, "checked_out": 1, "overflow": 0, "waiting": 1}
+            assert sample("db_pool_waiting", pool="async") == 1
+            with pytest.raises(PoolTimeoutError):
+                await waiter
+        assert database.pool_stats(pool_engine.pool)["waiting"] == 0
+        assert sample("db_pool_checked_out", pool="async") == 0
+        # Only the blocked checkout waited; the first one opened a connection
+        assert sample("db_pool_wait_seconds_count", pool="async") == waits_before + 1
+    finally:
+        await pool_engine.dispose()
+
+def test_opening_connections_is_not_waiting():
+    def slow_connect():
+        time.sleep(0.2)
+        return create_engine("sqlite://").raw_connection().driver_connection
+
+    pool = database.TrackedQueuePool(slow_connect, pool_size=10, max_overflow=20)
+    # A cold burst that fits in pool + overflow: every checkout is busy connecting, none is queued
+    threads = [threading.Thread(target=lambda: pool.connect().close()) for _ in range(25)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    assert pool.waiting == 0
+    for thread in threads:
+        thread.join()
+    pool.dispose()
+
+@pytest.mark.asyncio
+async def test_redis_pool_tracks_waiting_commands():
+    pool = database.TrackedRedisPool(max_connections=1, timeout=1, connection_class=FakeAsyncRedisConnection, server=FakeServer())
+    redis = aioredis.Redis(connection_pool=pool)
+    await redis.set("pool:key", 1)
+    held = await pool.get_connection()
+    command = asyncio.create_task(redis.get("pool:key"))
+    await asyncio.sleep(0.05)
+    assert (pool.waiting, sample("redis_pool_waiting"), sample("redis_pool_in_use")) == (1, 1, 1)
+    await pool.release(held)
+    assert await command == b"1"
+    assert (pool.waiting, sample("redis_pool_waiting")) == (0, 0)
+    await pool.disconnect()
+
+def test_admission_control_sheds_load(monkeypatch):
+    headers = {"Authorization": f"Bearer {BEARER_TOKEN}"}
+    monkeypatch.setattr(settings, "admission_max_waiting", 5)
+    monkeypatch.setattr(settings, "admission_retry_after", 3)
+    monkeypatch.setattr(database, "all_pool_stats", lambda: {"database": {"waiting": 0}, "replica": {"waiting": 4}})
+    assert client.get("/authors/", headers=headers).status_code == 200
+
+    shed_before = sample("http_requests_shed_total", reason="pool_queue")
+    monkeypatch.setattr(database, "all_pool_stats", lambda: {"database": {"waiting": 0}, "replica": {"waiting": 5}})
+    response = client.get("/authors/", headers=headers)
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "3"
+    assert response.json() == {"detail": "Server is busy, retry later"}
+    assert sample("http_requests_shed_total", reason="pool_queue") == shed_before + 1
+    # Health checks and scrapes still answer
+    assert client.get("/").status_code == 200
+    assert client.get("/metrics").status_code == 200
+
+    monkeypatch.setattr(settings, "admission_max_waiting", 0)
+    assert client.get("/authors/", headers=headers).status_code == 200
+
+def test_pool_timeout_returns_503(monkeypatch):
+    async def exhausted_pool():
+        raise PoolTimeoutError("QueuePool limit of size 10 overflow 20 reached")
+        yield
+
+    monkeypatch.setitem(app.dependency_overrides, get_async_db, exhausted_pool)
+    response = client.get("/books/", headers={"Authorization": f"Bearer {BEARER_TOKEN}"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(settings.admission_retry_after)
+
+def test_pool_stats_endpoint():
+    response = client.get("/pool/stats", headers={"Authorization": f"Bearer {BEARER_TOKEN}"})
+    assert response.status_code == 200
+    assert set(response.json()["database"]) == {"size", "checked_out", "overflow", "waiting"}
+    assert "redis" in response.json()
@@ -1,24 +1,12 @@
 import pytest
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from app.database import get_db
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from app.main import app
-from app.models import Base
+from app.models import Author
 from unittest.mock import patch
 
-# Set up the testing database
-DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(DATABASE_URL)
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-# Create the database tables
-Base.metadata.create_all(bind=engine)
-
-# Dependency override for testing
-app.dependency_overrides[get_db] = lambda: TestingSessionLocal()
-
 client = TestClient(app)
 
 # Bearer token for authentication
@@ -45,7 +33,26 @@ def test_get_authors(create_author):
         mock_get_cache.return_value = None  # Simulate no cache
         response = client.get("/authors/", headers={"Authorization": f"Bearer {BEARER_TOKEN}"})
         assert response.status_code == 200
-        assert isinstance(response.json(), list)
+        assert isinstance(response.json()["items"], list)
+
+def test_get_authors_paginated(create_author, test_author_data):
+    headers = {"Authorization": f"Bearer {BEARER_TOKEN}"}
+    for _ in range(2):
+        assert client.post("/authors/", json=test_author_data, headers=headers).status_code == 200
+
+    first_page = client.get("/authors/", params={"limit": 2}, headers=headers).json()
+    assert len(first_page["items"]) == 2
+    assert first_page["total"] >= 3
+    assert first_page["next_cursor"] == first_page["items"][-1]["id"]
+
+    second_page = client.get("/authors/", params={"after": first_page["next_cursor"], "limit": 2}, headers=headers).json()
+    assert second_page["items"]
+    assert second_page["items"][0]["id"] > first_page["next_cursor"]
+
+    # Pages are served from the cache until a write invalidates them
+    assert client.get("/authors/", params={"limit": 2}, headers=headers).json() == first_page
+    client.post("/authors/", json=test_author_data, headers=headers)
+    assert client.get("/authors/", params={"limit": 2}, headers=headers).json()["total"] == first_page["total"] + 1
 
 def test_get_author(create_author):
     author_id = create_author["id"]
@@ -55,6 +62,23 @@ def test_get_author(create_author):
         assert response.status_code == 200
         assert response.json()["name"] == create_author["name"]
 
+def test_get_author_cached(create_author, sqlite_db):
+    author_id = create_author["id"]
+    headers = {"Authorization": f"Bearer {BEARER_TOKEN}"}
+    assert client.get(f"/authors/{author_id}", headers=headers).status_code == 200
+
+    # Change the row behind the API's back: the detail endpoint keeps serving the cached entry
+    db = sqlite_db.SessionLocal()
+    db.get(Author, author_id).bio = "Changed directly in the database."
+    db.commit()
+    db.close()
+    assert client.get(f"/authors/{author_id}", headers=headers).json()["bio"] == create_author["bio"]
+
+    # A write through the API refreshes the entry
+    updated_data = {"name": "Cached Author", "bio": "Updated through the API.", "birth_date": "1980-01-01"}
+    client.put(f"/authors/{author_id}", json=updated_data, headers=headers)
+    assert client.get(f"/authors/{author_id}", headers=headers).json()["bio"] == updated_data["bio"]
+
 def test_update_author(create_author):
     author_id = create_author["id"]
     updated_data = {
@@ -78,4 +102,128 @@ def test_delete_author(create_author):
 
         # Attempt to get the deleted author
         response = client.get(f"/authors/{author_id}", headers={"Authorization": f"Bearer {BEARER_TOKEN}"})
-        assert response.status_code == 404
\ No newline at end of file
+        assert response.status_code == 404
+
+def test_delete_author_evicts_cached_entries(test_author_data):
+    headers = {"Authorization": f"Bearer {BEARER_TOKEN}"}
+    author = client.post("/authors/", json=test_author_data, headers=headers).json()
+    assert client.get(f"/authors/{author['id']}", headers=headers).status_code == 200
+    total = client.get("/authors/", headers=headers).json()["total"]
+
+    client.delete(f"/authors/{author['id']}", headers=headers)
+    assert client.get(f"/authors/{author['id']}", headers=headers).status_code == 404
+    assert client.get("/authors/", headers=headers).json()["total"] == total - 1
+
+def test_bulk_authors(test_author_data):
+    headers = {"Authorization": f"Bearer {BEARER_TOKEN}"}
+    results = client.post("/authors/bulk", json=[dict(test_author_data, name=f"Bulk Author {i}") for i in range(3)], headers=headers).json()["results"]
+    ids = [result["id"] for result in results]
+    assert [result["status"] for result in results] == ["created"] * 3
+
+    results = client.patch("/authors/bulk", json=[{"id": ids[0], "bio": "Bulk updated"}, {"id": 999999, "name": "Missing"}], headers=headers).json()["results"]
+    assert [result["status"] for result in results] == ["updated", "error"]
+    assert client.get(f"/authors/{ids[0]}", headers=headers).json()["bio"] == "Bulk updated"
+
+    book = {"title": "Keeps author", "description": None, "publish_date": None, "author_id": ids[1]}
+    assert client.post("/books/", json=book, headers=headers).status_code == 200
+    results = client.request("DELETE", "/authors/bulk", json=ids, headers=headers).json()["results"]
+    assert [result["status"] for result in results] == ["deleted", "error", "deleted"]
+    assert results[1]["detail"] == "Cannot delete author with associated books"
+    assert client.get(f"/authors/{ids[0]}", headers=headers).status_code == 404
+
+def test_author_stats(test_author_data):
+    headers = {"Authorization": f"Bearer {BEARER_TOKEN}"}
+    author_id = client.post("/authors/", json=test_author_data, headers=headers).json()["id"]
+    other_id = client.post("/authors/", json=test_author_data, headers=headers).json()["id"]
+    assert client.get(f"/authors/{author_id}/stats", headers=headers).json() == {
+        "author_id": author_id, "book_count": 0, "first_publish_date": None, "last_publish_date": None,
+    }
+
+    book = {"title": "Stats", "description": None, "publish_date": "2001-01-01", "author_id": author_id}
+    first = client.post("/books/", json=book, headers=headers).json()
+    client.post("/books/bulk", json=[dict(book, publish_date="1999-06-01"), dict(book, publish_date=None)], headers=headers)
+    stats = client.get(f"/authors/{author_id}/stats", headers=headers).json()
+    assert (stats["book_count"], stats["first_publish_date"], stats["last_publish_date"]) == (3, "1999-06-01", "2001-01-01")
+    assert client.get(f"/authors/{author_id}", headers=headers).json()["book_count"] == 3
+
+    # Moving a book updates both authors
+    client.put(f"/books/{first['id']}", json=dict(book, author_id=other_id), headers=headers)
+    assert client.get(f"/authors/{author_id}/stats", headers=headers).json()["last_publish_date"] == "1999-06-01"
+    assert client.get(f"/authors/{other_id}/stats", headers=headers).json()["book_count"] == 1
+    response = client.delete(f"/authors/{other_id}", headers=headers)
+    assert response.status_code == 400
+    client.delete(f"/books/{first['id']}", headers=headers)
+    assert client.get(f"/authors/{other_id}/stats", headers=headers).json()["book_count"] == 0
+    assert client.delete(f"/authors/{other_id}", headers=headers).status_code == 200
+    assert client.get(f"/authors/{other_id}/stats", headers=headers).status_code == 404
+
+def test_author_include_books_and_fields(test_author_data):
+    headers = {"Authorization": f"Bearer {BEARER_TOKEN}"}
+    author_id = client.post("/authors/", json=test_author_data, headers=headers).json()["id"]
+    book = {"title": "Nested", "description": None, "publish_date": None, "author_id": author_id}
+    book_ids = [result["id"] for result in client.post("/books/bulk", json=[book] * 3, headers=headers).json()["results"]]
+
+    assert "books" not in client.get(f"/authors/{author_id}", headers=headers).json()
+    nested = client.get(f"/authors/{author_id}", params={"include": "books"}, headers=headers).json()["books"]
+    assert [book["id"] for book in nested] == book_ids
+    page = client.get("/authors/", params={"after": author_id - 1, "limit": 1, "include": "books", "books_limit": 2}, headers=headers).json()
+    assert [book["id"] for book in page["items"][0]["books"]] == book_ids[:2]
+
+    statements = []
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(Engine, "before_cursor_execute", capture)
+    try:
+        response = client.get(f"/authors/{author_id}", params={"fields": "name, book_count"}, headers=headers)
+    finally:
+        event.remove(Engine, "before_cursor_execute", capture)
+    assert response.json() == {"id": author_id, "name": test_author_data["name"], "book_count": 3}
+    select_clause = statements[0].split("FROM")[0]
+    assert "authors.name" in select_clause and "authors.bio" not in select_clause
+
+    assert client.get("/authors/", params={"fields": "name,password"}, headers=headers).status_code == 422
+
+def test_get_authors_by_ids(test_author_data):
+    headers = {"Authorization": f"Bearer {BEARER_TOKEN}"}
+    ids = [client.post("/authors/", json=dict(test_author_data, name=f"Batch Author {i}"), headers=headers).json()["id"] for i in range(2)]
+    client.post("/books/", json={"title": "Batch Nested", "description": None, "publish_date": None, "author_id": ids[1]}, headers=headers)
+
+    response = client.get("/authors/", params={"ids": f"{ids[1]},{ids[0]},999999", "fields": "name", "include": "books"}, headers=headers)
+    assert response.status_code == 200
+    items = response.json()["items"]
+    assert [(author["id"], author["name"]) for author in items] == [(ids[1], "Batch Author 1"), (ids[0], "Batch Author 0")]
+    assert "bio" not in items[0]
+    assert [book["title"] for book in items[0]["books"]] == ["Batch Nested"] and items[1]["books"] == []
+    assert response.json()["missing"] == [999999]
+    # Entries are shared with the single-author endpoint for the same view
+    with patch("app.crud.get_author") as mock_get_author:
+        assert client.get(f"/authors/{ids[0]}", params={"fields": "name", "include": "books"}, headers=headers).json()["name"] == "Batch Author 0"
+    mock_get_author.assert_not_called()
+
+def test_conditional_get(test_author_data):
+    headers = {"Authorization": f"Bearer {BEARER_TOKEN}"}
+    author_id = client.post("/authors/", json=test_author_data, headers=headers).json()["id"]
+    other_id = client.post("/authors/", json=test_author_data, headers=headers).json()["id"]
+    list_etag = client.get("/authors/", headers=headers).headers["etag"]
+    detail_etag = client.get(f"/authors/{author_id}", headers=headers).headers["etag"]
+
+    statements = []
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(Engine, "before_cursor_execute", capture)
+    try:
+        response = client.get("/authors/", headers={**headers, "If-None-Match": list_etag})
+        assert (response.status_code, response.content, response.headers["etag"]) == (304, b"", list_etag)
+        response = client.get(f"/authors/{author_id}", headers={**headers, "If-None-Match": f'"x", {detail_etag}'})
+        assert response.status_code == 304
+        assert statements == []  # The ETag comes with the cached entry
+    finally:
+        event.remove(Engine, "before_cursor_execute", capture)
+
+    # Another author's edit changes the collection version but not this author's
+    client.put(f"/authors/{other_id}", json=dict(test_author_data, bio="Edited"), headers=headers)
+    assert client.get("/authors/", headers={**headers, "If-None-Match": list_etag}).status_code == 200
+    assert client.get(f"/authors/{author_id}", headers={**headers, "If-None-Match": detail_etag}).status_code == 304
+    client.post("/books/", json={"title": "Bumps author", "description": None, "publish_date": None, "author_id": author_id}, headers=headers)
+    response = client.get(f"/authors/{author_id}", headers={**headers, "If-None-Match": detail_etag})
+    assert response.status_code == 200 and response.headers["etag"] != detail_etag
@@ -0,0 +1,21 @@
+import json
+from benchmarks import run
+
+def result(seconds: float) -> dict:
+    return {"median_s": seconds, "min_s": seconds, "loops": 1, "samples": 1}
+
+def test_compare_flags_regressions():
+    baseline = {"results": {"fast": result(1.0), "slow": result(1.0), "removed": result(1.0)}}
+    current = {"results": {"fast": result(1.1), "slow": result(1.5), "added": result(1.0)}}
+    comparison = {name: regressed for name, *_, regressed in run.compare(current, baseline, threshold=0.2)}
+    assert comparison == {"fast": False, "slow": True}
+
+def test_benchmarks_smoke(tmp_path):
+    output = tmp_path / "results.json"
+    argv = ["--rows", "20", "--samples", "1", "--min-time", "0", "--only", "GET /authors/", "--output", str(output)]
+    assert run.main(argv) == 0
+    results = json.loads(output.read_text())["results"]
+    assert set(results) == {"GET /authors/ cache miss[20 rows]", "GET /authors/ cache hit[20 rows]"}
+
+    # Comparing a run with itself finds nothing slower
+    assert run.main(argv + ["--baseline", str(output), "--threshold", "100"]) == 0
@@ -1,33 +1,18 @@
+import asyncio
+import itertools
 import pytest
+from datetime import date
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from app.database import get_db
+from sqlalchemy import event
+from app import crud, utils
 from app.main import app
-from app.models import Base
 from unittest.mock import patch
 
-# Set up the testing database
-DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(DATABASE_URL)
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-# Create the database tables
-Base.metadata.create_all(bind=engine)
-
-# Dependency override for testing
-app.dependency_overrides[get_db] = lambda: TestingSessionLocal()
-
 client = TestClient(app)
 
 # Bearer token for authentication
 BEARER_TOKEN = "supersecrettoken123"
 
-@pytest.fixture(scope="session", autouse=True)
-def teardown():
-    yield
-    Base.metadata.drop_all(bind=engine)
-
 @pytest.fixture(scope="module")
 def test_author_data():
     return {
@@ -81,9 +66,118 @@ def test_get_books(create_book):
     with patch("app.utils.get_cache", return_value=None), patch("app.utils.set_cache"):
         response = client.get("/books/", headers={"Authorization": f"Bearer {BEARER_TOKEN}"})
         assert response.status_code == 200
-        assert isinstance(response.json(), list)
-        assert len(response.json()) > 0  # Ensure there are books in the list
+        assert isinstance(response.json()["items"], list)
+        assert len(response.json()["items"]) > 0  # Ensure there are books in the list
+
+def test_get_books_paginated(create_book, test_book_data):
+    headers = {"Authorization": f"Bearer {BEARER_TOKEN}"}
+    for _ in range(2):
+        assert client.post("/books/", json=test_book_data, headers=headers).status_code == 200
+
+    first_page = client.get("/books/", params={"limit": 2}, headers=headers).json()
+    assert len(first_page["items"]) == 2
+    assert first_page["total"] >= 3
+    assert first_page["next_cursor"] == first_page["items"][-1]["id"]
+
+    last_page = client.get("/books/", params={"after": first_page["next_cursor"], "limit": 100}, headers=headers).json()
+    assert last_page["items"][0]["id"] > first_page["next_cursor"]
+    assert last_page["next_cursor"] is None
+
+    response = client.get("/books/", params={"limit": 0}, headers=headers)
+    assert response.status_code == 422
+
+def test_get_books_filtered(create_author, test_book_data):
+    headers = {"Authorization": f"Bearer {BEARER_TOKEN}"}
+    author = client.post("/authors/", json={"name": "Filter Author", "bio": None, "birth_date": None}, headers=headers).json()
+    dates = ["2001-05-01", None, "1999-01-01", "2001-05-01", "2010-12-31"]
+    books = [{**test_book_data, "publish_date": day, "author_id": author["id"]} for day in dates]
+    ids = [result["id"] for result in client.post("/books/bulk", json=books, headers=headers).json()["results"]]
 
+    def pages(**params):
+        found, after = [], None
+        while True:
+            params.update(author_id=author["id"], limit=2, **({"after": after} if after else {}))
+            page = client.get("/books/", params=params, headers=headers).json()
+            found += [book["id"] for book in page["items"]]
+            if page["next_cursor"] is None:
+                return found, page["total"]
+            after = page["next_cursor"]
+
+    assert pages() == (ids, 5)
+    assert pages(sort="-id") == (ids[::-1], 5)
+    # Undated books come first ascending and last descending; equal dates tie-break on id
+    assert pages(sort="publish_date") == ([ids[1], ids[2], ids[0], ids[3], ids[4]], 5)
+    assert pages(sort="-publish_date") == ([ids[4], ids[3], ids[0], ids[2], ids[1]], 5)
+    assert pages(published_after="2001-05-01", published_before="2005-01-01") == ([ids[0], ids[3]], 2)
+    assert pages(published_before="2001-05-01", sort="-publish_date") == ([ids[3], ids[0], ids[2]], 3)
+
+    # Moving a book out of the date range evicts the cached filtered pages
+    client.put(f"/books/{ids[0]}", json={**books[0], "publish_date": "1990-01-01"}, headers=headers)
+    assert pages(published_after="2001-05-01", published_before="2005-01-01") == ([ids[3]], 1)
+    # A date cursor carries its sort key: paging on from a deleted or re-dated book neither fails nor repeats rows
+    first = client.get("/books/", params={"author_id": author["id"], "sort": "publish_date", "limit": 2}, headers=headers).json()
+    assert [book["id"] for book in first["items"]] == [ids[1], ids[0]]
+    client.delete(f"/books/{ids[1]}", headers=headers)
+    client.put(f"/books/{ids[0]}", json={**books[0], "publish_date": "2020-01-01"}, headers=headers)
+    second = client.get("/books/", params={"author_id": author["id"], "sort": "publish_date", "limit": 2, "after": first["next_cursor"]}, headers=headers).json()
+    assert [book["id"] for book in second["items"]] == [ids[2], ids[3]]
+    for cursor in ["not-a-cursor", str(ids[0])]:
+        response = client.get("/books/", params={"sort": "publish_date", "after": cursor}, headers=headers)
+        assert response.status_code == 400
+    assert client.get("/books/", params={"after": first["next_cursor"]}, headers=headers).status_code == 400
+
+def test_create_evicts_only_the_count_and_tail_pages(create_book, test_book_data, max_queries):
+    headers = {"Authorization": f"Bearer {BEARER_TOKEN}"}
+    newest = client.post("/books/", json=test_book_data, headers=headers).json()["id"]
+    pages = [{"limit": 1}, {"after": newest, "limit": 1}, {"sort": "-id", "limit": 1}, {"sort": "-id", "after": newest, "limit": 1}]
+    before = [client.get("/books/", params=params, headers=headers).json() for params in pages]
+
+    created = client.post("/books/", json=test_book_data, headers=headers).json()["id"]
+    with max_queries(2) as traces:
+        after = [client.get("/books/", params=params, headers=headers).json() for params in pages]
+    # The count once, then only the pages new books land on: the last ascending, the first descending
+    assert [trace.count for _, trace in traces] == [1, 1, 1, 0]
+    assert after[0] == {**before[0], "total": before[0]["total"] + 1}
+    assert [book["id"] for book in after[1]["items"]] == [created]
+    assert [book["id"] for book in after[2]["items"]] == [created]
+    assert after[3] == {**before[3], "total": before[3]["total"] + 1}
+
+@pytest.mark.asyncio
+async def test_book_filter_query_plans(create_book, sqlite_db):
+    statements = []
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+    event.listen(sqlite_db.async_engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        combinations = itertools.product([None, create_book["author_id"]], [None, date(2000, 1, 1)], [None, date(2030, 1, 1)], ["id", "publish_date"])
+        for author_id, published_after, published_before, sort in combinations:
+            filters = {"author_id": author_id, "published_after": published_after, "published_before": published_before}
+            statements.clear()
+            async with sqlite_db.AsyncSessionLocal() as db:
+                after = create_book["id"] if sort == "id" else crud.encode_book_cursor(date(2001, 1, 1), create_book["id"])
+                await crud.get_books(db, after=after, limit=10, sort=sort, **filters)
+                await crud.count_books(db, **filters)
+            assert len(statements) == 2
+            page, count = statements
+
+            with sqlite_db.engine.connect() as connection:
+                plans = [
+                    " / ".join(row[3] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters))
+                    for statement, parameters in (page, count)
+                ]
+            dated = published_after is not None or published_before is not None
+            if author_id is not None:
+                # One author's rows through the leading column; date bounds narrow the range further
+                acceptable = ["ix_books_author_id_publish_date (author_id=?"] * 2
+            elif dated:
+                # Id-ordered pages may instead walk the primary key and stop at the limit
+                acceptable = ["ix_books_publish_date_id (publish_date" if sort == "publish_date" else "(rowid>?)", "ix_books_publish_date_id (publish_date"]
+            else:
+                acceptable = ["ix_books_publish_date_id" if sort == "publish_date" else "(rowid>?)", "ix_books_id"]
+            for plan, expected in zip(plans, acceptable):
+                assert expected in plan or (sort == "id" and dated and "ix_books_publish_date_id" in plan), f"{filters} sort={sort}: {plan}"
+    finally:
+        event.remove(sqlite_db.async_engine.sync_engine, "before_cursor_execute", capture)
 
 def test_get_book(create_book):
     book_id = create_book["id"]
@@ -105,6 +199,106 @@ def test_update_book(create_book):
         assert response.status_code == 200
         assert response.json()["title"] == updated_data["title"]
 
+def test_book_write_refreshes_author_caches(create_author, test_book_data):
+    author_id = create_author["id"]
+    headers = {"Authorization": f"Bearer {BEARER_TOKEN}"}
+    books_before = client.get(f"/authors/{author_id}/books", headers=headers).json()
+    assert len(client.get(f"/authors/{author_id}", params={"include": "books"}, headers=headers).json()["books"]) == len(books_before)
+
+    new_book = client.post("/books/", json=test_book_data, headers=headers).json()
+    assert client.get(f"/books/{new_book['id']}", headers=headers).json() == new_book
+    assert len(client.get(f"/authors/{author_id}/books", headers=headers).json()) == len(books_before) + 1
+    assert len(client.get(f"/authors/{author_id}", params={"include": "books"}, headers=headers).json()["books"]) == len(books_before) + 1
+
+    client.delete(f"/books/{new_book['id']}", headers=headers)
+    assert client.get(f"/books/{new_book['id']}", headers=headers).status_code == 404
+    assert len(client.get(f"/authors/{author_id}/books", headers=headers).json()) == len(books_before)
+
+def test_book_write_evicts_only_tagged_entries(create_author, test_author_data, test_book_data, fake_redis):
+    headers = {"Authorization": f"Bearer {BEARER_TOKEN}"}
+    other_author = client.post("/authors/", json=test_author_data, headers=headers).json()
+    pages = {
+        author["id"]: utils.page_cache_key("authors_list", author["id"] - 1, 1)
+        for author in (create_author, other_author)
+    }
+    for author_id in pages:
+        assert client.get("/authors/", params={"after": author_id - 1, "limit": 1}, headers=headers).json()["items"][0]["id"] == author_id
+    client.get(f"/authors/{other_author['id']}", headers=headers)
+
+    client.post("/books/", json=test_book_data, headers=headers)
+
+    cached = lambda key: asyncio.run(fake_redis.exists(key))
+    assert not cached(pages[create_author["id"]])
+    assert cached(pages[other_author["id"]])
+    assert cached(utils.author_cache_key(other_author["id"]))
+
+def test_bulk_books(create_author, test_book_data):
+    headers = {"Authorization": f"Bearer {BEARER_TOKEN}"}
+    books = [dict(test_book_data, title=f"Bulk Book {i}") for i in range(3)] + [dict(test_book_data, author_id=999999)]
+    response = client.post("/books/bulk", json=books, headers=headers)
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == ["created", "created", "created", "error"]
+    assert results[3]["detail"] == "Author not found"
+    ids = [result["id"] for result in results[:3]]
+    assert [client.get(f"/books/{book_id}", headers=headers).json()["title"] for book_id in ids] == ["Bulk Book 0", "Bulk Book 1", "Bulk Book 2"]
+
+    updates = [{"id": ids[0], "title": "Renamed"}, {"id": ids[1], "title": None}, {"id": 999999, "title": "Missing"}]
+    results = client.patch("/books/bulk", json=updates, headers=headers).json()["results"]
+    assert [result["status"] for result in results] == ["updated", "error", "error"]
+    book = client.get(f"/books/{ids[0]}", headers=headers).json()
+    assert book["title"] == "Renamed" and book["description"] == test_book_data["description"]
+
+    results = client.request("DELETE", "/books/bulk", json=ids + [999999], headers=headers).json()["results"]
+    assert [result["status"] for result in results] == ["deleted", "deleted", "deleted", "error"]
+    assert client.get(f"/books/{ids[0]}", headers=headers).status_code == 404
+
+    assert client.post("/books/bulk", json=[], headers=headers).status_code == 422
+
+def test_get_books_by_ids(create_author, test_book_data, fake_redis):
+    headers = {"Authorization": f"Bearer {BEARER_TOKEN}"}
+    books = [dict(test_book_data, title=f"Batch Book {i}") for i in range(3)]
+    ids = [result["id"] for result in client.post("/books/bulk", json=books, headers=headers).json()["results"]]
+    asyncio.run(fake_redis.delete(*[utils.book_cache_key(book_id) for book_id in ids]))
+    client.get(f"/books/{ids[1]}", headers=headers)  # One entry is already cached
+
+    response = client.get("/books/", params={"ids": f"{ids[2]},999999,{ids[0]},{ids[1]},{ids[2]}"}, headers=headers)
+    assert response.status_code == 200
+    assert [book["title"] for book in response.json()["items"]] == ["Batch Book 2", "Batch Book 0", "Batch Book 1"]
+    assert response.json()["missing"] == [999999]
+    # The misses were backfilled under the keys GET /books/{id} reads
+    assert asyncio.run(fake_redis.exists(*[utils.book_cache_key(book_id) for book_id in ids])) == 3
+    assert client.get(f"/books/{ids[0]}", headers=headers).json()["title"] == "Batch Book 0"
+
+    client.put(f"/books/{ids[0]}", json=dict(books[0], title="Batch Renamed"), headers=headers)
+    assert client.get("/books/", params={"ids": str(ids[0])}, headers=headers).json()["items"][0]["title"] == "Batch Renamed"
+
+    too_many = ",".join(str(book_id) for book_id in range(1, utils.MAX_BATCH_IDS + 2))
+    assert client.get("/books/", params={"ids": too_many}, headers=headers).status_code == 422
+    assert client.get("/books/", params={"ids": "1,two"}, headers=headers).status_code == 422
+
+def test_search_books(create_author, test_book_data):
+    headers = {"Authorization": f"Bearer {BEARER_TOKEN}"}
+    books = [
+        {**test_book_data, "title": "Quasar Atlas", "description": "Maps of the quasar sky"},
+        {**test_book_data, "title": "Field Notes", "description": "One quasar mention"},
+        {**test_book_data, "title": "Unrelated", "description": None},
+    ]
+    ids = [result["id"] for result in client.post("/books/bulk", json=books, headers=headers).json()["results"]]
+
+    page = client.get("/books/search", params={"q": "QUASAR", "limit": 1}, headers=headers).json()
+    assert [book["id"] for book in page["items"]] == [ids[0]]  # Title matches rank first
+    assert (page["total"], page["next_offset"]) == (2, 1)
+    page = client.get("/books/search", params={"q": "quasar", "offset": 1, "limit": 1}, headers=headers).json()
+    assert [book["id"] for book in page["items"]] == [ids[1]] and page["next_offset"] is None
+
+    # Renaming a book evicts cached results, and the index follows the edit
+    client.put(f"/books/{ids[2]}", json={**books[2], "title": "Quasar Quasar"}, headers=headers)
+    page = client.get("/books/search", params={"q": "quasar"}, headers=headers).json()
+    assert [book["id"] for book in page["items"]] == [ids[2], ids[0], ids[1]]
+    client.request("DELETE", "/books/bulk", json=ids, headers=headers)
+    assert client.get("/books/search", params={"q": "quasar"}, headers=headers).json()["total"] == 0
+
 def test_delete_book(create_book):
     book_id = create_book["id"]
     with patch("app.utils.get_cache", return_value=None), patch("app.utils.set_cache"):
@@ -0,0 +1,132 @@
+import asyncio
+import time
+import pytest
+import redis.asyncio as aioredis
+from fastapi.testclient import TestClient
+from app.breaker import CircuitBreaker
+from app.config import settings
+from app.main import app
+from app import database, metrics, utils
+
+client = TestClient(app)
+
+# Bearer token for authentication
+BEARER_TOKEN = "supersecrettoken123"
+HEADERS = {"Authorization": f"Bearer {BEARER_TOKEN}"}
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = CircuitBreaker("redis", failure_threshold=3, cooldown=5, clock=Clock())
+    monkeypatch.setattr(utils, "redis_breaker", breaker)
+    monkeypatch.setattr(utils, "_missed_tags", set())
+    return breaker
+
+@pytest.fixture
+def redis_down(monkeypatch):
+    # Nothing listens on port 1, so connecting is refused at once
+    monkeypatch.setattr(database, "redis", aioredis.Redis(host="127.0.0.1", port=1))
+
+def sample(name: str, **labels):
+    return metrics.REGISTRY.get_sample_value(name, labels) or 0
+
+def breaker_state() -> float:
+    return metrics.REGISTRY.get_sample_value("circuit_breaker_state", {"name": "redis"})
+
+def test_breaker_opens_probes_and_closes(breaker):
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_success()  # Only failures in a row count
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker_state() == 2
+    assert not breaker.allow()
+
+    breaker.clock.now = 5
+    assert breaker.allow()  # The probe
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    breaker.clock.now = 9
+    assert not breaker.allow()
+
+    breaker.clock.now = 10
+    assert breaker.allow()
+    breaker.release()  # A cancelled probe lets the next caller probe
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker_state() == 0
+    assert breaker.allow() and breaker.allow()
+
+def test_requests_fall_back_to_the_database_while_redis_is_down(breaker, redis_down):
+    author_id = client.post("/authors/", json={"name": "Breaker Author", "bio": None, "birth_date": None}, headers=HEADERS).json()["id"]
+    errors = sample("redis_errors_total", operation="get")
+    skipped = sample("redis_skipped_total", operation="get")
+
+    for _ in range(3):
+        response = client.get(f"/authors/{author_id}", headers=HEADERS)
+        assert response.status_code == 200
+        assert response.json()["name"] == "Breaker Author"
+        assert "etag" not in response.headers
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # Redis is no longer called at all
+    errors_when_open = sample("redis_errors_total", operation="get")
+    assert errors_when_open > errors
+    start = time.perf_counter()
+    assert client.get("/authors/", headers=HEADERS).status_code == 200
+    assert client.get(f"/authors/{author_id}", headers={**HEADERS, "If-None-Match": "*"}).status_code == 200
+    assert time.perf_counter() - start < 1
+    assert sample("redis_errors_total", operation="get") == errors_when_open
+    assert sample("redis_skipped_total", operation="get") > skipped
+
+class SlowRedis:
+    async def get(self, key):
+        await asyncio.sleep(1)
+
+@pytest.mark.asyncio
+async def test_slow_redis_times_out(breaker, monkeypatch):
+    monkeypatch.setattr(database, "redis", SlowRedis())
+    monkeypatch.setattr(settings, "redis_command_timeout", 0.05)
+    start = time.perf_counter()
+    assert await utils.get_cache("author:1") is None
+    assert time.perf_counter() - start < 0.5
+    assert breaker.failures == 1
+
+@pytest.mark.asyncio
+async def test_missed_invalidations_are_replayed(breaker, fake_redis, monkeypatch):
+    await utils.set_cache("author:991", {"id": 991}, tags=[utils.author_tag(991)])
+    with monkeypatch.context() as outage:
+        outage.setattr(database, "redis", aioredis.Redis(host="127.0.0.1", port=1))
+        await utils.invalidate_tags(utils.author_tag(991))
+    assert await fake_redis.exists("author:991")
+
+    # The first call that reaches Redis again evicts what the outage left behind
+    await utils.get_cache("author:992")
+    await asyncio.gather(*utils._background_tasks)
+    assert not await fake_redis.exists("author:991")
+    assert not utils._missed_tags
+
+@pytest.mark.asyncio
+async def test_failed_eviction_script_is_replayed(breaker, fake_redis, monkeypatch):
+    await utils.set_cache("author:996", {"id": 996}, tags=[utils.author_tag(996)])
+    with monkeypatch.context() as broken:
+        broken.setattr(utils, "INVALIDATE_SCRIPT", "return redis.call('no-such-command')")
+        await utils.invalidate_tags(utils.author_tag(996))
+    assert utils._missed_tags == {utils.author_tag(996)}
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    await utils.get_cache("author:997")
+    await asyncio.gather(*utils._background_tasks)
+    assert not await fake_redis.exists("author:996")
@@ -0,0 +1,227 @@
+import asyncio
+import json
+import time
+import pytest
+from starlette.requests import Request
+from app import codecs, schemas, utils
+from app.local_cache import LocalCache
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_rebuild_once():
+    calls = []
+
+    async def loader(db):
+        calls.append(db)
+        await asyncio.sleep(0.05)
+        return [{"id": 1}]
+
+    results = await asyncio.gather(*[utils.get_or_build_cache("single_flight_test", loader, "session") for _ in range(20)])
+
+    assert len(calls) == 1
+    assert all(utils.decode_entry(result) == [{"id": 1}] for result in results)
+    assert utils.decode_entry(await utils.get_or_build_cache("single_flight_test", loader, "session")) == [{"id": 1}]
+    assert len(calls) == 1
+
+@pytest.mark.asyncio
+async def test_waits_for_rebuild_in_other_worker(fake_redis):
+    # Another worker holds the rebuild lock and publishes the value shortly after
+    await fake_redis.set(utils.rebuild_lock_key("locked_test"), "other-worker")
+
+    async def other_worker():
+        await asyncio.sleep(0.1)
+        await utils.set_cache("locked_test", "from other worker")
+
+    async def loader(db):
+        raise AssertionError("the database must not be queried while another worker rebuilds")
+
+    publisher = asyncio.create_task(other_worker())
+    assert utils.decode_entry(await utils.get_or_build_cache("locked_test", loader, None)) == "from other worker"
+    await publisher
+
+@pytest.mark.asyncio
+async def test_rebuild_keeps_a_lock_taken_over_by_another_worker(fake_redis):
+    lock_key = utils.rebuild_lock_key("lock_takeover_test")
+
+    async def loader(db):
+        # Our lock expires mid-build and another worker takes it
+        await fake_redis.set(lock_key, "other-worker")
+        return "value"
+
+    await utils.get_or_build_cache("lock_takeover_test", loader, None)
+    assert await fake_redis.get(lock_key) == b"other-worker"
+
+    # Our own lock is still released
+    await fake_redis.delete(lock_key, "lock_takeover_test")
+    await utils.get_or_build_cache("lock_takeover_test", lambda db: asyncio.sleep(0, "value"), None)
+    assert not await fake_redis.exists(lock_key)
+
+@pytest.mark.asyncio
+async def test_stale_entry_served_while_refreshing(monkeypatch):
+    class FakeSession:
+        async def __aenter__(self):
+            return "background session"
+
+        async def __aexit__(self, *exc):
+            return False
+
+    monkeypatch.setattr(utils, "CACHE_SOFT_TTL", 30)
+    monkeypatch.setattr(utils.database, "AsyncSessionLocal", FakeSession)
+    await utils.set_cache("stale_test", utils.encode_entry("old", built_at=time.time() - 60))
+
+    async def loader(db):
+        assert db == "background session"
+        return "new"
+
+    assert utils.decode_entry(await utils.get_or_build_cache("stale_test", loader, None)) == "old"
+    await asyncio.gather(*utils._background_tasks)
+    assert utils.decode_entry(await utils.get_or_build_cache("stale_test", loader, None)) == "new"
+
+def test_local_cache_lru_ttl_and_size_eviction(monkeypatch):
+    cache = LocalCache(max_entries=2, max_bytes=100, ttl=30)
+    cache.set("a", 1, 10)
+    cache.set("b", 2, 10)
+    assert cache.get("a") == 1  # "b" is now least recently used
+    cache.set("c", 3, 10)
+    assert cache.get("b") is None
+    cache.set("d", 4, 90)  # Over the byte budget: evicts down to fit
+    assert cache.get("a") is None and cache.get("d") == 4
+    cache.set("huge", 5, 101)
+    assert cache.get("huge") is None
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 31)
+    assert cache.get("d") is None
+    assert cache.stats()["evictions"] == 2
+
+@pytest.mark.asyncio
+async def test_local_tier_evicted_by_other_workers(monkeypatch, fake_redis):
+    monkeypatch.setattr(utils, "local_cache", LocalCache(max_entries=10, max_bytes=10_000, ttl=30))
+    await utils.set_cache("two_tier_test", {"name": "cached"})
+    # Served from the local tier even though Redis no longer has it
+    await fake_redis.delete("two_tier_test")
+    assert utils.decode_entry(await utils.get_cache("two_tier_test")) == {"name": "cached"}
+    assert utils.local_cache_stats()["hits"] == 1
+
+    utils.start_invalidation_listener()
+    try:
+        await asyncio.sleep(0.05)  # Let the listener subscribe
+        await fake_redis.publish(utils.CACHE_INVALIDATION_CHANNEL, json.dumps({"origin": "other-worker", "keys": ["two_tier_test"]}))
+        await asyncio.sleep(0.05)
+        assert await utils.get_cache("two_tier_test") is None
+    finally:
+        await utils.stop_invalidation_listener()
+
+@pytest.mark.asyncio
+async def test_rebuild_racing_a_write_is_not_cached(fake_redis):
+    async def loader(db):
+        # A write commits and invalidates while the old rows are being read
+        await utils.invalidate_tags(utils.author_tag(993))
+        return {"id": 993, "name": "old"}
+
+    entry = await utils.get_or_build_cache("author:993", loader, None, tags=[utils.author_tag(993)], version_tag=utils.author_tag(993))
+    # Served with the version it was read at, so its ETag won't match the new one
+    assert entry.version != (await utils.current_versions(utils.author_tag(993)))[0]
+    assert not await fake_redis.exists("author:993")
+
+@pytest.mark.asyncio
+async def test_page_rebuild_survives_writes_to_other_rows(fake_redis):
+    async def loader(db):
+        # Another author is edited while the page is being read
+        await utils.invalidate_tags(utils.author_tag(999))
+        return [{"id": 997}, {"id": 998}]
+
+    tags = [utils.author_tag(997), utils.author_tag(998)]
+    entry = await utils.get_or_build_cache("authors_list:race", loader, None, tags=tags, version_tag=utils.AUTHORS_TAG)
+    assert await fake_redis.exists("authors_list:race")
+    # Its ETag is still the version it was read at
+    assert entry.version != (await utils.current_versions(utils.AUTHORS_TAG))[0]
+
+    async def racing_loader(db):
+        await utils.invalidate_tags(utils.author_tag(998))
+        return [{"id": 997}, {"id": 998}]
+
+    await utils.get_or_build_cache("authors_list:race2", racing_loader, None, tags=tags, version_tag=utils.AUTHORS_TAG)
+    assert not await fake_redis.exists("authors_list:race2")
+
+@pytest.mark.asyncio
+async def test_versions_cached_in_local_tier(monkeypatch, fake_redis):
+    monkeypatch.setattr(utils, "local_cache", LocalCache(max_entries=10, max_bytes=10_000, ttl=30))
+    tag = utils.author_tag(994)
+    version = (await utils.current_versions(tag))[0]
+    await fake_redis.incr(utils.version_key(tag))  # Unseen until this worker hears of it
+    assert await utils.current_versions(tag) == [version]
+
+    await utils.invalidate_tags(tag)
+    assert (await utils.current_versions(tag))[0] == version.split(".")[0] + ".2"
+
+@pytest.mark.asyncio
+async def test_invalidation_script_evicts_bumps_and_publishes(monkeypatch, fake_redis):
+    monkeypatch.setattr(utils, "local_cache", LocalCache(max_entries=10, max_bytes=10_000, ttl=30))
+    tag = utils.author_tag(995)
+    await utils.set_cache("author:995", {"id": 995}, tags=[tag])
+    version = (await utils.current_versions(tag))[0]
+    pubsub = fake_redis.pubsub()
+    await pubsub.subscribe(utils.CACHE_INVALIDATION_CHANNEL)
+    try:
+        await utils.invalidate_tags(tag)
+        for _ in range(5):
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=0.2)
+            if message is not None:
+                break
+    finally:
+        await pubsub.aclose()
+
+    assert not await fake_redis.exists("author:995", utils.tag_members_key(tag))
+    assert utils.local_cache.get("author:995") is None
+    assert (await utils.current_versions(tag))[0] != version
+    data = json.loads(message["data"])
+    assert data["origin"] == utils.WORKER_ID
+    assert sorted(data["keys"]) == sorted(["author:995", *utils.version_keys(tag)])
+
+@pytest.mark.asyncio
+async def test_invalidating_thousands_of_tags(fake_redis):
+    tags = [utils.book_tag(id) for id in range(100_000, 110_001)]
+    await utils.set_cache("book:100000", {"id": 100000}, tags=[tags[0]])
+    await utils.set_cache("book:110000", {"id": 110000}, tags=[tags[-1]])
+    await utils.invalidate_tags(*tags)
+    assert not await fake_redis.exists("book:100000", "book:110000", utils.tag_members_key(tags[-1]))
+
+def make_request(**headers):
+    return Request({"type": "http", "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]})
+
+@pytest.mark.parametrize("codec", sorted(codecs.CODECS))
+def test_cached_response_codecs(monkeypatch, codec):
+    monkeypatch.setattr(utils, "CACHE_CODEC", codec)
+    book = {"id": 1, "title": "Cached", "description": None, "publish_date": "2024-01-01", "author_id": 1}
+    entry = utils.unpack_entry(utils.pack_entry(utils.encode_entry(book, schemas.Book)))
+    assert utils.decode_entry(entry) == book
+
+    # Clients that accept the stored representation get the cached bytes untouched
+    stored = utils.cached_response(entry, make_request(accept="application/json, application/msgpack", accept_encoding="gzip, zstd"))
+    assert stored.body == entry.body
+    assert stored.headers.get("content-encoding") == codecs.get_codec(codec).content_encoding
+
+    # Everyone else gets plain JSON
+    plain = utils.cached_response(entry, make_request())
+    assert plain.headers["content-type"] == "application/json"
+    assert "content-encoding" not in plain.headers
+    assert json.loads(plain.body) == book
+
+@pytest.mark.asyncio
+async def test_pages_stay_json_for_splicing(monkeypatch):
+    monkeypatch.setattr(utils, "CACHE_CODEC", "gzip")
+
+    async def load_page(db):
+        return {"items": [{"id": 1}], "next_cursor": None}
+
+    async def count(db):
+        return 1
+
+    page = await utils.get_or_build_cache("pages_json_test:after=0:limit=1", load_page, None, codec=utils.PAGE_CODEC)
+    total = await utils.get_or_build_count("pages_json_test", count, None)
+    assert (page.codec, total.codec) == ("json", "json")
+    response = utils.page_response(page, total, make_request(accept_encoding="gzip"))
+    assert response.body == page.body[:-1] + b',"total":1}'
+    assert "content-encoding" not in response.headers
+    # Other entries still use CACHE_CODEC
+    assert utils.encode_entry({"id": 1}).codec == "gzip"
@@ -0,0 +1,42 @@
+import random
+from datetime import date
+from sqlalchemy import create_engine, func, select
+from app import models
+from benchmarks import dataset
+
+def test_book_counts_are_skewed_and_capped():
+    counts = dataset.book_counts(random.Random(1), authors=1000, books=20000, skew=1.0, max_per_author=500)
+    assert sum(counts) == 20000
+    assert max(counts) == 500
+    assert sorted(counts)[len(counts) // 2] < 20  # The median author is well below the mean
+
+    even = dataset.book_counts(random.Random(1), authors=10, books=25, skew=0, max_per_author=100)
+    assert sorted(even) == [2] * 5 + [3] * 5
+
+def test_generated_catalog_is_consistent(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'catalog.db'}")
+    dataset.tune_for_bulk_load(engine)
+    models.Base.metadata.create_all(engine)
+    dates = dataset.DateRange(date(1990, 1, 1), date(2020, 12, 31), "uniform", career_years=10)
+
+    counts = dataset.book_counts(random.Random(7), authors=50, books=400, skew=1.2, max_per_author=100)
+    assert dataset.load(engine, counts, random.Random(7), dates, batch_size=64) == (50, 400)
+    # A second load appends after the existing ids
+    assert dataset.load(engine, counts, random.Random(7), dates) == (50, 400)
+
+    with engine.connect() as connection:
+        assert connection.scalar(select(func.count()).select_from(models.Book)) == 800
+        assert connection.scalar(select(func.max(models.Author.id))) == 100
+        stats = connection.execute(
+            select(models.Book.author_id, func.count(), func.min(models.Book.publish_date), func.max(models.Book.publish_date))
+            .group_by(models.Book.author_id)
+        ).all()
+        authors = {author.id: author for author in connection.execute(select(models.Author).order_by(models.Author.id))}
+        assert sum(author.book_count for author in authors.values()) == 800
+        for author_id, count, first, last in stats:
+            author = authors[author_id]
+            assert (author.book_count, author.first_publish_date, author.last_publish_date) == (count, first, last)
+            assert date(1990, 1, 1) <= first <= last <= date(2020, 12, 31)
+        # The same seed generates the same catalog
+        assert [author.book_count for author in list(authors.values())[:50]] == [author.book_count for author in list(authors.values())[50:]]
+    engine.dispose()
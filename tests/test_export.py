@@ -0,0 +1,40 @@
+import csv
+import io
+import json
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.routers import export
+
+client = TestClient(app)
+
+# Bearer token for authentication
+BEARER_TOKEN = "supersecrettoken123"
+
+@pytest.fixture(scope="module")
+def create_books():
+    headers = {"Authorization": f"Bearer {BEARER_TOKEN}"}
+    author = client.post("/authors/", json={"name": "Export Author", "bio": None, "birth_date": "1970-05-01"}, headers=headers).json()
+    books = [{"title": f"Export Book {i}", "description": "Exported", "publish_date": "2024-03-01", "author_id": author["id"]} for i in range(5)]
+    results = client.post("/books/bulk", json=books, headers=headers).json()["results"]
+    return [result["id"] for result in results]
+
+def test_export_books_ndjson(create_books, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_BATCH_SIZE", 2)  # Several partitions
+    response = client.get("/export/books", params={"since": create_books[0]}, headers={"Authorization": f"Bearer {BEARER_TOKEN}"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == create_books[1:]
+    assert rows[0]["publish_date"] == "2024-03-01"
+
+def test_export_books_csv_columns(create_books):
+    response = client.get("/export/books", params={"format": "csv", "columns": "id,title"}, headers={"Authorization": f"Bearer {BEARER_TOKEN}"})
+    assert response.status_code == 200
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == ["id", "title"]
+    assert [str(create_books[-1]), "Export Book 4"] in rows[1:]
+
+def test_export_authors_rejects_unknown_columns():
+    response = client.get("/export/authors", params={"columns": "id,password"}, headers={"Authorization": f"Bearer {BEARER_TOKEN}"})
+    assert response.status_code == 422
@@ -0,0 +1,87 @@
+import csv
+import json
+import logging
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app import importer
+
+client = TestClient(app)
+
+BEARER_TOKEN = "supersecrettoken123"
+
+def test_import_authors_csv():
+    data = "name,bio,birth_date\nImported One,,1990-01-01\n,Missing name,\nImported Two,\"Multi\nline bio\",not-a-date\nImported Three,Bio,\n"
+    response = client.post(
+        "/import/authors",
+        params={"batch_size": 2},
+        files={"file": ("authors.csv", data, "text/csv")},
+        headers={"Authorization": f"Bearer {BEARER_TOKEN}"},
+    )
+    assert response.status_code == 200
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [event["processed"] for event in events[:-1]] == [2, 4]  # One progress line per batch
+    report = events[-1]
+    assert (report["processed"], report["inserted"], report["failed"]) == (4, 2, 2)
+    assert [error["line"] for error in report["errors"]] == [3, 5]
+    assert report["errors"][0]["detail"].startswith("name:")
+
+def test_import_books_ndjson_resolves_authors():
+    headers = {"Authorization": f"Bearer {BEARER_TOKEN}"}
+    author = client.post("/authors/", json={"name": "Import Author", "bio": None, "birth_date": None}, headers=headers).json()
+    books_before = client.get("/books/", headers=headers).json()["total"]
+    lines = [
+        json.dumps({"title": "Imported Book", "description": None, "publish_date": "2024-01-01", "author_id": author["id"]}),
+        json.dumps({"title": "Orphan", "description": None, "publish_date": None, "author_id": 999999}),
+        "{not json",
+    ]
+    response = client.post("/import/books", files={"file": ("books.ndjson", "\n".join(lines), "application/x-ndjson")}, headers=headers)
+    report = json.loads(response.text.splitlines()[-1])
+    assert (report["inserted"], report["failed"]) == (1, 2)
+    errors = {error["line"]: error["detail"] for error in report["errors"]}
+    assert "Author 999999 not found" in errors[2]
+    assert errors[3].startswith("Invalid JSON")
+    # The import evicted the cached book count
+    assert client.get("/books/", headers=headers).json()["total"] == books_before + 1
+
+@pytest.mark.asyncio
+async def test_import_cli(tmp_path, caplog, sqlite_db):
+    caplog.set_level(logging.INFO, logger="app.importer")
+    path = tmp_path / "authors.ndjson"
+    path.write_text("\n".join(json.dumps({"name": f"CLI Author {i}", "bio": None, "birth_date": None}) for i in range(5)))
+    async with sqlite_db.AsyncSessionLocal() as db:
+        report = await importer.run_import(db, "authors", str(path), importer.detect_format(str(path)), batch_size=2)
+    assert (report.processed, report.inserted, report.failed) == (5, 5, 0)
+    assert "processed=5 inserted=5" in caplog.text
+
+def test_import_reports_undecodable_and_malformed_rows():
+    headers = {"Authorization": f"Bearer {BEARER_TOKEN}"}
+    data = b"name,bio,birth_date\nGood One,,\nBad \xff Bytes,,\nHuge," + b"x" * (csv.field_size_limit() + 1) + b",\nGood Two,,\n"
+    response = client.post("/import/authors", files={"file": ("authors.csv", data, "text/csv")}, headers=headers)
+    report = json.loads(response.text.splitlines()[-1])
+    assert (report["processed"], report["inserted"], report["failed"]) == (4, 2, 2)
+    assert [(error["line"], error["detail"].split(":")[0]) for error in report["errors"]] == [(3, "Invalid UTF-8"), (4, "Invalid CSV")]
+
+    data = b'{"name": "Good NDJSON", "bio": null, "birth_date": null}\n{"name": "Bad \xc3\x28"}\n'
+    response = client.post("/import/authors", files={"file": ("authors.ndjson", data, "application/x-ndjson")}, headers=headers)
+    report = json.loads(response.text.splitlines()[-1])
+    assert (report["inserted"], report["errors"]) == (1, [{"line": 2, "detail": "Invalid UTF-8"}])
+
+def test_failed_import_still_invalidates(monkeypatch):
+    headers = {"Authorization": f"Bearer {BEARER_TOKEN}"}
+    total = client.get("/authors/", headers=headers).json()["total"]
+    import_batch = importer.import_batch
+    calls = []
+
+    async def fail_second_batch(*args):
+        calls.append(args)
+        if len(calls) == 2:
+            raise RuntimeError("database went away")
+        return await import_batch(*args)
+
+    monkeypatch.setattr(importer, "import_batch", fail_second_batch)
+    data = "name,bio,birth_date\nCommitted,,\nLost,,\n"
+    with pytest.raises(RuntimeError):
+        client.post("/import/authors", params={"batch_size": 1}, files={"file": ("authors.csv", data, "text/csv")}, headers=headers)
+    # The committed first batch isn't hidden behind a cached count
+    assert client.get("/authors/", headers=headers).json()["total"] == total + 1
@@ -0,0 +1,42 @@
+from collections import Counter
+from benchmarks import load_profiles
+from benchmarks.load_profiles import PROFILES, TOTAL, evaluate_slos, schedule
+
+def test_schedule_is_exact_and_reproducible():
+    weights = PROFILES["read-heavy"].weights
+    order = schedule(weights, "42:0")
+    assert Counter(order) == weights
+    assert schedule(weights, "42:0") == order
+    assert schedule(weights, "42:1") != order
+
+def test_read_heavy_mix_is_mostly_reads():
+    weights = PROFILES["read-heavy"].weights
+    writes = sum(weight for name, weight in weights.items() if name.split("_")[0] in {"create", "update", "delete"})
+    assert writes / sum(weights.values()) <= 0.05
+
+def test_seed_records_are_deterministic():
+    profile = PROFILES["read-heavy"]._replace(authors=3, books_per_author=2)
+    assert list(load_profiles.author_records(profile, 7)) == list(load_profiles.author_records(profile, 7))
+    books = list(load_profiles.book_records(profile, 7, [10, 11, 12]))
+    assert [book["author_id"] for book in books] == [10, 10, 11, 11, 12, 12]
+    assert books == list(load_profiles.book_records(profile, 7, [10, 11, 12]))
+
+def stats(requests=100, error_rate=0.0, p50=10, p95=50, p99=100):
+    return {"requests": requests, "error_rate": error_rate, "p50_ms": p50, "p95_ms": p95, "p99_ms": p99}
+
+def test_evaluate_slos():
+    endpoints = {
+        "GET /books/{id}": stats(p95=40),
+        "GET /books/search": stats(p95=400),
+        "POST /books/": stats(error_rate=0.05),
+        "DELETE /books/{id}": stats(requests=0, p95=10000),
+        TOTAL: stats(p95=300),
+    }
+    slos = {"p95_ms": {"*": 350, "GET /books/search": 500}, "error_rate": {"*": 0.01}}
+    assert evaluate_slos(endpoints, slos) == ["POST /books/: error_rate 0.05 > 0.01"]
+
+    slos["p95_ms"][TOTAL] = 200
+    assert evaluate_slos(endpoints, slos) == [f"{TOTAL}: p95_ms 300 > 200", "POST /books/: error_rate 0.05 > 0.01"]
+
+def test_evaluate_slos_fails_runs_without_requests():
+    assert evaluate_slos({TOTAL: stats(requests=0)}, {}) == ["No requests were made"]
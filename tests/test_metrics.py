@@ -0,0 +1,53 @@
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app import crud, metrics
+
+client = TestClient(app)
+
+# Bearer token for authentication
+BEARER_TOKEN = "supersecrettoken123"
+
+def sample(name: str, **labels):
+    return metrics.REGISTRY.get_sample_value(name, labels) or 0
+
+def test_request_and_cache_metrics():
+    headers = {"Authorization": f"Bearer {BEARER_TOKEN}"}
+    author_id = client.post("/authors/", json={"name": "Metrics Author", "bio": None, "birth_date": None}, headers=headers).json()["id"]
+    requests_before = sample("http_request_duration_seconds_count", method="GET", route="/authors/{id}", status="200")
+    misses_before = sample("cache_lookups_total", family="author:{id}", result="miss")
+    hits_before = sample("cache_lookups_total", family="author:{id}", result="hit")
+
+    for _ in range(2):
+        assert client.get(f"/authors/{author_id}", headers=headers).status_code == 200
+    assert sample("http_request_duration_seconds_count", method="GET", route="/authors/{id}", status="200") == requests_before + 2
+    assert sample("cache_lookups_total", family="author:{id}", result="miss") == misses_before + 1
+    assert sample("cache_lookups_total", family="author:{id}", result="hit") == hits_before + 1
+    assert sample("redis_command_duration_seconds_count", operation="get") > 0
+    assert sample("http_requests_in_progress", method="GET") == 0
+
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_request_duration_seconds_bucket{le="0.005",method="GET",route="/authors/{id}",status="200"}' in response.text
+
+@pytest.mark.asyncio
+async def test_query_metrics(sqlite_db):
+    metrics.instrument_engine(sqlite_db.async_engine.sync_engine)
+    before = sample("db_query_duration_seconds_count", operation="SELECT")
+    async with sqlite_db.AsyncSessionLocal() as db:
+        await crud.count_authors(db)
+        await crud.get_author(db, 1)
+    assert sample("db_query_duration_seconds_count", operation="SELECT") == before + 2
+
+def test_key_family():
+    assert metrics.key_family("author:7:books") == "author:{id}:books"
+    assert metrics.key_family("books_list:author_id=3:after=0:limit=50") == "books_list"
+    assert metrics.key_family("authors_list:count") == "authors_list:count"
+    assert metrics.key_family("books_list:author_id=3:count") == "books_list:count"
+
+def test_client_values_add_no_key_families():
+    headers = {"Authorization": f"Bearer {BEARER_TOKEN}"}
+    client.get("/books/", params={"after": "1:junk0"}, headers=headers)
+    client.get("/books/search", params={"q": "a:rand0"}, headers=headers)
+    families = {sample.labels["family"] for metric in metrics.REGISTRY.collect() if metric.name == "cache_lookups" for sample in metric.samples}
+    assert not {family for family in families if "junk0" in family or "rand0" in family}
@@ -0,0 +1,90 @@
+import asyncio
+import time
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+from app.config import settings
+from app.main import app
+from app.models import Base
+from app import database, metrics, utils
+
+# Bearer token for authentication
+BEARER_TOKEN = "supersecrettoken123"
+HEADERS = {"Authorization": f"Bearer {BEARER_TOKEN}"}
+
+@pytest.fixture
+def replica(tmp_path, monkeypatch):
+    """A second SQLite file standing in for a replica that hasn't caught up yet."""
+    path = tmp_path / "replica.db"
+    Base.metadata.create_all(bind=create_engine(f"sqlite:///{path}"))
+    replica_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+    monkeypatch.setattr(database, "ReplicaSessionLocal", async_sessionmaker(bind=replica_engine, autoflush=False, expire_on_commit=False))
+    yield replica_engine
+
+def sample(name: str, **labels):
+    return metrics.REGISTRY.get_sample_value(name, labels) or 0
+
+def test_reads_go_to_the_replica_except_right_after_a_write(replica):
+    writer, reader = TestClient(app), TestClient(app)
+    response = writer.post("/authors/", json={"name": "Replica Author", "bio": None, "birth_date": None}, headers=HEADERS)
+    assert response.status_code == 200
+    assert database.PRIMARY_READS_COOKIE in response.cookies
+    author_id = response.json()["id"]
+
+    replica_reads = sample("db_read_sessions_total", target="replica")
+    # Another client reads the replica, which doesn't have the row yet
+    assert reader.get(f"/authors/{author_id}", headers=HEADERS).status_code == 404
+    assert sample("db_read_sessions_total", target="replica") == replica_reads + 1
+
+    # The writer reads its own write from the primary
+    primary_reads = sample("db_read_sessions_total", target="primary")
+    assert writer.get(f"/authors/{author_id}", headers=HEADERS).json()["name"] == "Replica Author"
+    assert sample("db_read_sessions_total", target="primary") == primary_reads + 1
+
+def test_writer_skips_pages_other_clients_cached_from_the_replica(replica):
+    writer, reader = TestClient(app), TestClient(app)
+    author_id = writer.post("/authors/", json={"name": "Cached Elsewhere", "bio": None, "birth_date": None}, headers=HEADERS).json()["id"]
+    page = {"after": author_id - 1, "limit": 1}
+
+    # Right after the write's eviction, another client caches the page from the lagging replica
+    assert reader.get("/authors/", params=page, headers=HEADERS).json()["items"] == []
+    assert reader.get("/authors/", params=page, headers=HEADERS).json()["items"] == []
+    # The writer still reads its own write, and replaces the stale entry
+    assert [author["id"] for author in writer.get("/authors/", params=page, headers=HEADERS).json()["items"]] == [author_id]
+    assert [author["id"] for author in reader.get("/authors/", params=page, headers=HEADERS).json()["items"]] == [author_id]
+
+@pytest.mark.asyncio
+async def test_eviction_repeats_after_the_read_your_writes_window(replica, fake_redis, monkeypatch):
+    monkeypatch.setattr(settings, "read_your_writes_seconds", 0.1)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        author_id = (await client.post("/authors/", json={"name": "Evicted Twice", "bio": None, "birth_date": None}, headers=HEADERS)).json()["id"]
+        client.cookies.clear()  # Read as another client
+        assert (await client.get("/authors/", params={"after": author_id - 1, "limit": 1}, headers=HEADERS)).json()["items"] == []
+        key = utils.page_cache_key("authors_list", author_id - 1, 1)
+        assert await fake_redis.exists(key)
+        await asyncio.sleep(0.2)
+        assert not await fake_redis.exists(key)
+
+def test_failed_writes_and_reads_set_no_cookie(replica):
+    client = TestClient(app)
+    assert database.PRIMARY_READS_COOKIE not in client.post("/authors/", json={"bio": None}, headers=HEADERS).cookies
+    assert database.PRIMARY_READS_COOKIE not in client.get("/authors/", headers=HEADERS).cookies
+
+def test_no_cookie_without_a_replica(monkeypatch):
+    monkeypatch.setattr(database, "ReplicaSessionLocal", None)
+    response = TestClient(app).post("/authors/", json={"name": "Primary Only", "bio": None, "birth_date": None}, headers=HEADERS)
+    assert response.status_code == 200
+    assert database.PRIMARY_READS_COOKIE not in response.cookies
+
+def request_with_cookie(value: str) -> Request:
+    return Request({"type": "http", "headers": [(b"cookie", f"{database.PRIMARY_READS_COOKIE}={value}".encode())]})
+
+def test_read_your_writes_window_expires():
+    assert database.reads_from_primary(request_with_cookie(f"{time.time() + settings.read_your_writes_seconds:.3f}"))
+    assert not database.reads_from_primary(request_with_cookie(f"{time.time() - 1:.3f}"))
+    assert not database.reads_from_primary(request_with_cookie("garbage"))
+    assert not database.reads_from_primary(Request({"type": "http", "headers": []}))
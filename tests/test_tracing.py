@@ -0,0 +1,57 @@
+import pytest
+from datetime import date
+from fastapi.testclient import TestClient
+from app.main import app
+from app import crud, tracing
+from unittest.mock import patch
+
+client = TestClient(app)
+
+# Bearer token for authentication
+BEARER_TOKEN = "supersecrettoken123"
+
+@pytest.fixture(scope="module")
+def catalog():
+    headers = {"Authorization": f"Bearer {BEARER_TOKEN}"}
+    authors = [{"name": f"Traced Author {i}", "bio": None, "birth_date": None} for i in range(5)]
+    author_ids = [result["id"] for result in client.post("/authors/bulk", json=authors, headers=headers).json()["results"]]
+    books = [{"title": f"Traced {i}", "description": None, "publish_date": "2020-01-01", "author_id": author_id} for i, author_id in enumerate(author_ids * 3)]
+    book_ids = [result["id"] for result in client.post("/books/bulk", json=books, headers=headers).json()["results"]]
+    return {"author": author_ids[0], "book": book_ids[0], "book_cursor": crud.encode_book_cursor(date(2020, 1, 1), book_ids[0]), "authors": ",".join(map(str, author_ids)), "books": ",".join(map(str, book_ids))}
+
+# Statements per endpoint on a cache miss; growing with the page size would be an N+1
+QUERY_BUDGETS = [
+    ("/authors/", 2),  # Page, count
+    ("/authors/?include=books", 3),  # Page, count, one selectinload IN query
+    ("/authors/?include=books&books_limit=1", 3),  # Page, count, one windowed IN query
+    ("/authors/?fields=name", 2),
+    ("/authors/{author}", 1),
+    ("/authors/{author}?include=books", 2),
+    ("/authors/{author}/stats", 1),
+    ("/authors/{author}/books", 1),
+    ("/books/", 2),
+    ("/books/?author_id={author}&sort=-publish_date", 2),
+    ("/books/?sort=publish_date&after={book_cursor}", 2),  # The cursor carries the date: no row lookup
+    ("/books/{book}", 1),
+    ("/books/?ids={books}", 1),  # One IN query for every id
+    ("/authors/?ids={authors}&include=books&books_limit=1", 2),  # Authors, then one windowed IN query
+    ("/books/search?q=traced", 2),  # Index load on first use, then one IN query
+]
+
+@pytest.mark.parametrize("path, limit", QUERY_BUDGETS)
+def test_query_budget(path, limit, catalog, max_queries):
+    with patch("app.utils.get_cache", return_value=None), patch("app.utils.get_cache_many", side_effect=lambda keys: [None] * len(keys)), \
+            patch("app.utils.set_cache"), max_queries(limit) as traces:
+        response = client.get(path.format(**catalog), headers={"Authorization": f"Bearer {BEARER_TOKEN}"})
+    assert response.status_code == 200
+    assert int(response.headers["x-query-count"]) == traces[0][1].count
+    assert float(response.headers["x-db-time"]) >= 0
+
+def test_repeated_statements_are_logged(caplog):
+    trace = tracing.QueryTrace()
+    for _ in range(tracing.N_PLUS_ONE_THRESHOLD):
+        trace.record("SELECT books.id FROM books WHERE books.author_id = ?", 0.001)
+    trace.record("SELECT 1", tracing.SLOW_QUERY_MS / 1000)
+    tracing.log_trace("GET /authors/", trace)
+    assert "Possible N+1 in GET /authors/: 5 executions" in caplog.text
+    assert "Slow query" in caplog.text and "SELECT 1" in caplog.text
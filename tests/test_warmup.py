@@ -0,0 +1,67 @@
+import asyncio
+import httpx
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.config import settings
+from app.main import app
+from app import database, metrics, warmup
+
+# Bearer token for authentication
+BEARER_TOKEN = "supersecrettoken123"
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(warmup, "state", warmup.WarmupState())
+
+def asgi_client():
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+def cache_hits(family: str) -> float:
+    return sum(metrics.REGISTRY.get_sample_value("cache_lookups_total", {"family": family, "result": result}) or 0 for result in ("hit", "local_hit"))
+
+@pytest.mark.asyncio
+async def test_ready_after_warm_up(tmp_path):
+    pool_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}", poolclass=database.TrackedAsyncQueuePool, pool_size=10)
+    async with asgi_client() as client:
+        response = await client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["status"] == "warming_up"
+
+        # The write evicts cached author pages, so the warm-up has to rebuild them
+        await client.post("/authors/", json={"name": "Warm Author", "bio": None, "birth_date": None}, headers={"Authorization": f"Bearer {BEARER_TOKEN}"})
+        await warmup.run(app, engines=[pool_engine], paths=["/authors/", "/books/"])
+        # The pool keeps the connections warm-up opened
+        assert pool_engine.pool.checkedin() == min(settings.warmup_db_connections, settings.db_pool_size)
+
+        response = await client.get("/ready")
+        assert response.status_code == 200
+        assert response.json()["status"] == "ready"
+        assert response.json()["pages"] == {"/authors/": 200, "/books/": 200}
+
+        # The first real request finds the page cached
+        hits = cache_hits("authors_list")
+        assert (await client.get("/authors/", headers={"Authorization": f"Bearer {BEARER_TOKEN}"})).status_code == 200
+        assert cache_hits("authors_list") == hits + 1
+    await pool_engine.dispose()
+
+@pytest.mark.asyncio
+async def test_failed_warm_up_is_retried_and_not_ready(tmp_path, monkeypatch):
+    monkeypatch.setattr(warmup, "RETRY_SECONDS", 0.01)
+    unreachable = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'missing' / 'books.db'}")
+    task = asyncio.create_task(warmup.run(app, engines=[unreachable], paths=[]))
+    try:
+        await asyncio.sleep(0.2)
+        assert warmup.state.attempts >= 2
+        assert "OperationalError" in warmup.state.error
+        async with asgi_client() as client:
+            assert (await client.get("/ready")).status_code == 503
+    finally:
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await unreachable.dispose()
+
+def test_disabled_warm_up_is_ready_at_once(monkeypatch):
+    monkeypatch.setattr(settings, "warmup_enabled", False)
+    warmup.start(app)
+    assert warmup.state.ready